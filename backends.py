@@ -0,0 +1,158 @@
+# backends.py
+# Storage backends the SQL reports run against. The default is a local SQLite
+# file built straight from the cleaned dataset, so reports, benchmarks and CI
+# work without a database server. SQL Server (as loaded by load_products.py)
+# is the other option. Both hand out DB-API connections through lease() and
+# name their SQL dialect for reports.run_category_report().
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from dataset import CLEANED_CSV, CLEANED_PARQUET, cleaned_source, iter_cleaned, source_signature, to_parameter_rows
+from category_summary import mark_products_changed, refresh_category_summary
+from instrumentation import stage
+from reports import ensure_report_indexes
+
+LOCAL_DB = "banggood_products.sqlite"
+LOCAL_LOAD_CHUNK_SIZE = 100_000
+PRODUCT_COLUMNS = ['category', 'name', 'price_raw', 'rating_raw', 'reviews_raw', 'url']
+
+# Same columns as the SQL Server table. url is the key there too: a url seen
+# twice keeps its last row and rows without a url are not loaded.
+SQLITE_SCHEMA = """
+CREATE TABLE Products (
+    category    TEXT,
+    name        TEXT,
+    price_raw   REAL,
+    rating_raw  REAL,
+    reviews_raw INTEGER,
+    url         TEXT NOT NULL PRIMARY KEY
+);
+CREATE TABLE load_info (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class SqliteBackend:
+    """
+    Local report database, rebuilt from the cleaned dataset whenever that
+    changes. The rebuild happens in a temporary file that is then renamed over
+    the old database, so readers never see a half-loaded table.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, path=LOCAL_DB, parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV,
+                 chunksize=LOCAL_LOAD_CHUNK_SIZE):
+        self.path = path
+        self.parquet_path = parquet_path
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self._load_lock = threading.Lock()
+
+    def loaded_signature(self):
+        if not os.path.exists(self.path):
+            return None
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("SELECT value FROM load_info WHERE key = 'source'").fetchone()
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def is_stale(self):
+        source = cleaned_source(self.parquet_path, self.csv_path)
+        return self.loaded_signature() != source_signature(source)
+
+    def load(self):
+        """Rebuilds the database from the cleaned dataset and returns the row count."""
+        started = time.perf_counter()
+        source = cleaned_source(self.parquet_path, self.csv_path)
+        signature = source_signature(source)
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # Scratch file until the rename below, so durability does not matter yet
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(SQLITE_SCHEMA)
+            for chunk in iter_cleaned(self.chunksize, PRODUCT_COLUMNS, self.parquet_path, self.csv_path):
+                chunk = chunk[chunk['url'].notna()]
+                conn.executemany("INSERT OR REPLACE INTO Products VALUES (?, ?, ?, ?, ?, ?)",
+                                 to_parameter_rows(chunk, PRODUCT_COLUMNS))
+            conn.execute("INSERT INTO load_info VALUES ('source', ?)", (signature,))
+            conn.commit()
+            # Built after the load, like load_products.py does on SQL Server
+            ensure_report_indexes(conn, self.dialect)
+            mark_products_changed(conn, self.dialect)
+            refresh_category_summary(conn, self.dialect)
+            conn.commit()
+            conn.execute("ANALYZE")
+            rows = conn.execute("SELECT COUNT(*) FROM Products").fetchone()[0]
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.path)
+        print(f"Loaded {rows} products from {source} into {self.path} in {time.perf_counter() - started:.1f}s")
+        return rows
+
+    def refresh(self):
+        """Reloads the database if the cleaned dataset changed; True if it did."""
+        with self._load_lock:
+            if self.is_stale():
+                with stage('load', backend=self.dialect) as event:
+                    event['rows'] = self.load()
+                return True
+            return False
+
+    @contextmanager
+    def lease(self):
+        """Yields a connection to an up-to-date local database."""
+        self.refresh()
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+class SqlServerBackend:
+    """SQL Server Products table (see load_products.py) behind a connection pool."""
+
+    dialect = 'sqlserver'
+
+    def __init__(self, server, database, username=None, password=None, size=None):
+        # pyodbc and the ODBC driver are only needed when this backend is used
+        from db_pool import DB_POOL_SIZE, ConnectionPool, connection_string
+
+        self.pool = ConnectionPool(connection_string(server, database, username, password),
+                                   size=size or DB_POOL_SIZE)
+
+    def lease(self):
+        return self.pool.lease()
+
+    def close(self):
+        self.pool.close()
+
+BACKENDS = {
+    'sqlite': SqliteBackend,
+    'sqlserver': SqlServerBackend,
+}
+DEFAULT_BACKEND = 'sqlite'
+
+def get_backend(name=DEFAULT_BACKEND, **options):
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}") from None
+    return backend_class(**options)
@@ -0,0 +1,330 @@
+# benchmark.py
+# End-to-end pipeline benchmark on a synthetic catalog (see synthetic_catalog.py),
+# so it runs without the live site or a SQL Server. Each stage is timed on its
+# own: scrape (listing pages from a local HTTP stand-in through scrapper.py),
+# clean (clean_data.clean_streaming), load (the local SQLite report backend),
+# aggregate (reports.run_category_report) and render (the visuals.py charts).
+# Results can be saved as a baseline and later runs compared against it.
+import argparse
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psutil
+
+from backends import SqliteBackend
+from clean_data import clean_streaming
+from dataset import load_cleaned
+from product_sink import ProductSink
+from reports import TOP_N, run_category_report
+from scrapper import LxmlExtractor, PageFetcher, create_http_session, plan_pagination, scrape_listing_page
+from synthetic_catalog import SYNTHETIC_SELECTORS, CatalogServer, SyntheticCatalog
+
+BENCHMARK_DIR = "banggood_benchmark"  # Scratch files of a run, one subdirectory per size
+BASELINE_FILE = "benchmark_baseline.json"
+RESULTS_FILE = "benchmark_results.json"  # Written into BENCHMARK_DIR after every run
+STAGES = ('scrape', 'clean', 'load', 'aggregate', 'render')
+DEFAULT_SIZES = ('10k',)
+SCRAPE_PAGES = 200  # Listing pages fetched per size; the whole of a 10M catalog would take hours
+SCRAPE_WORKERS = 8
+AGGREGATE_QUERIES = 20  # Report queries timed for the latency percentiles
+RSS_SAMPLE_INTERVAL = 0.02  # Seconds between memory samples
+REGRESSION_TOLERANCE = 0.25  # A metric may grow by this fraction before it counts as a regression
+MIN_COMPARED_SECONDS = 0.05  # Timings below this are too noisy to compare
+COMPARED_METRICS = ('seconds', 'peak_rss_mb', 'p95_ms')
+
+def parse_size(text):
+    """'10k', '2.5M' or '10000' -> number of products."""
+    text = text.strip().lower().replace('_', '')
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if multiplier != 1 else text
+    return int(float(number) * multiplier)
+
+def format_size(products):
+    for suffix, unit in (('M', 1_000_000), ('k', 1_000)):
+        if products >= unit and products % unit == 0:
+            return f"{products // unit}{suffix}"
+    return str(products)
+
+class PeakRss:
+    """Samples the process RSS from a background thread while the block runs."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.start = self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True, name="rss-sampler")
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def latency_percentiles(latencies):
+    if not latencies:
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+            'max_ms': round(max(latencies) * 1000, 3)}
+
+def run_stage(name, stage, *args):
+    """
+    Runs stage(*args), which returns (items processed, per-item latencies in
+    seconds or None), and returns its timing and memory figures.
+    """
+    print(f"\n=== {name} ===")
+    with PeakRss() as rss:
+        started = time.perf_counter()
+        items, latencies = stage(*args)
+        seconds = time.perf_counter() - started
+    result = {
+        'seconds': round(seconds, 4),
+        'items': items,
+        'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': round(rss.peak / 2**20, 1),
+        'rss_growth_mb': round((rss.peak - rss.start) / 2**20, 1),
+    }
+    result.update(latency_percentiles(latencies))
+    print(f"{name}: {items:,} items in {seconds:.2f}s, peak RSS {result['peak_rss_mb']} MB"
+          + (f", p95 {result['p95_ms']} ms" if latencies else ""))
+    return result
+
+# --- Stages ---
+
+def _no_browser():
+    raise RuntimeError("Synthetic listing pages are static; no browser should be needed")
+
+def scrape_stage(catalog, sink_dir, max_pages=SCRAPE_PAGES, workers=SCRAPE_WORKERS):
+    """
+    Crawls up to max_pages listing pages (spread over the categories) from a
+    local CatalogServer the way crawler.py does: page 1 of each category first,
+    then the planned remaining pages concurrently. Latency is per page.
+    """
+    # Explicit selectors and base URL: the synthetic pages need no config.py
+    extractor = LxmlExtractor(SYNTHETIC_SELECTORS, base_url=catalog.base_url)
+    local = threading.local()
+    latencies = []
+    pages_per_category = max(1, max_pages // len(catalog.category_names))
+
+    def fetch(category_name, url):
+        fetcher = getattr(local, 'fetcher', None)
+        if fetcher is None:
+            fetcher = local.fetcher = PageFetcher(session=create_http_session(), driver_factory=_no_browser,
+                                                  extractor=extractor)
+        started = time.perf_counter()
+        doc, products = scrape_listing_page(fetcher, url, category_name)
+        sink.write(products)
+        latencies.append(time.perf_counter() - started)
+        return doc, len(products)
+
+    with CatalogServer(catalog) as server, ProductSink(sink_dir) as sink, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        start_urls = {name: urls[0] for name, urls in server.start_urls().items()}
+        first_pages = dict(zip(start_urls, executor.map(lambda item: fetch(*item), start_urls.items())))
+
+        remaining = []
+        for name, (doc, _) in first_pages.items():
+            page_urls = plan_pagination(doc, start_urls[name], pages_per_category, extractor) or [start_urls[name]]
+            remaining.extend((name, url) for url in page_urls[1:])
+        scraped = sum(count for _, count in first_pages.values())
+        scraped += sum(count for _, count in executor.map(lambda item: fetch(*item), remaining))
+
+    expected = sum(len(catalog.product_ids(category, page))
+                   for category in range(len(catalog.category_names))
+                   for page in range(1, min(pages_per_category, catalog.pages(category)) + 1))
+    if scraped != expected:
+        print(f"WARNING: scraped {scraped:,} products, the pages hold {expected:,}")
+    print(f"Scraped {len(latencies)} pages ({scraped:,} products)")
+    return scraped, latencies
+
+def clean_stage(raw_path, paths):
+    stats = clean_streaming(raw_path, output_file=paths['cleaned_csv'], parquet_file=paths['cleaned_parquet'],
+                            state_file=paths['clean_state'])
+    return stats['rows'], None
+
+def load_stage(backend):
+    return backend.load(), None
+
+def aggregate_stage(backend, queries=AGGREGATE_QUERIES, top_n=TOP_N):
+    latencies = []
+    with backend.lease() as conn:
+        for _ in range(queries):
+            started = time.perf_counter()
+            report = run_category_report(conn, top_n=top_n, dialect=backend.dialect)
+            latencies.append(time.perf_counter() - started)
+    if not report.from_summary:
+        print("WARNING: the report did not use the materialized summary")
+    return queries, latencies
+
+def render_stage(paths, output_dir):
+    """
+    The visuals.py batch report (whole dataset plus every category), rendered
+    in this process so its memory is measured too. Latency is per chart.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import seaborn as sns
+    from visuals import ALL_SCOPE, CHARTS, REPORT_COLUMNS, prepare_report, render_chart_files, scope_slugs
+
+    sns.set(style="whitegrid")
+    df = load_cleaned(REPORT_COLUMNS, paths['cleaned_parquet'], paths['cleaned_csv'])
+    reports = {ALL_SCOPE: prepare_report(df)}
+    for category, group in df.groupby('category', observed=True):
+        reports[category] = prepare_report(group)
+
+    latencies = []
+    slugs = scope_slugs(reports)
+    for scope, report in reports.items():
+        scope_dir = os.path.join(output_dir, slugs[scope])
+        os.makedirs(scope_dir, exist_ok=True)
+        for chart in CHARTS:
+            _, seconds = render_chart_files(chart, report[chart], os.path.join(scope_dir, chart), ('png',))
+            latencies.append(seconds)
+    return len(latencies), latencies
+
+# --- Runs and baselines ---
+
+def benchmark_size(products, stages=STAGES, workdir=BENCHMARK_DIR, scrape_pages=SCRAPE_PAGES,
+                   scrape_workers=SCRAPE_WORKERS, queries=AGGREGATE_QUERIES, seed=0):
+    """Runs the selected stages on a fresh catalog of `products` products; returns their results."""
+    run_dir = os.path.join(workdir, format_size(products))
+    if os.path.exists(run_dir):
+        shutil.rmtree(run_dir)
+    os.makedirs(run_dir)
+    paths = {
+        'raw_csv': os.path.join(run_dir, "raw.csv"),
+        'scraped': os.path.join(run_dir, "scraped"),
+        'cleaned_csv': os.path.join(run_dir, "cleaned.csv"),
+        'cleaned_parquet': os.path.join(run_dir, "cleaned.parquet"),
+        'clean_state': os.path.join(run_dir, "clean_state.parquet"),
+        'database': os.path.join(run_dir, "products.sqlite"),
+        'reports': os.path.join(run_dir, "reports"),
+    }
+    catalog = SyntheticCatalog(products, seed=seed)
+    backend = SqliteBackend(paths['database'], paths['cleaned_parquet'], paths['cleaned_csv'])
+    results = {'products': products, 'stages': {}}
+
+    started = time.perf_counter()
+    catalog.write_raw_csv(paths['raw_csv'])
+    results['generate_seconds'] = round(time.perf_counter() - started, 4)
+    print(f"Generated {products:,} synthetic products in {results['generate_seconds']:.1f}s")
+
+    stage_calls = {
+        'scrape': (scrape_stage, catalog, paths['scraped'], scrape_pages, scrape_workers),
+        'clean': (clean_stage, paths['raw_csv'], paths),
+        'load': (load_stage, backend),
+        'aggregate': (aggregate_stage, backend, queries),
+        'render': (render_stage, paths, paths['reports']),
+    }
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        if stage in ('load', 'aggregate', 'render') and not os.path.exists(paths['cleaned_parquet']):
+            # Later stages read the cleaned output
+            run_stage('clean (setup)', *stage_calls['clean'])
+        if stage == 'aggregate' and backend.is_stale():
+            backend.load()
+        results['stages'][stage] = run_stage(stage, *stage_calls[stage])
+    return results
+
+def environment():
+    return {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'memory_gb': round(psutil.virtual_memory().total / 2**30, 1),
+    }
+
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Returns (size, stage, metric, baseline value, new value) for every metric
+    that grew by more than `tolerance` against a baseline run of the same size.
+    """
+    regressions = []
+    for size, run in results['runs'].items():
+        base_run = baseline.get('runs', {}).get(size)
+        if base_run is None:
+            continue
+        for stage, figures in run['stages'].items():
+            base_figures = base_run['stages'].get(stage, {})
+            for metric in COMPARED_METRICS:
+                old, new = base_figures.get(metric), figures.get(metric)
+                if old is None or new is None:
+                    continue
+                noise_floor = {'seconds': MIN_COMPARED_SECONDS, 'p95_ms': MIN_COMPARED_SECONDS * 1000}.get(metric, 0)
+                if max(old, new) < noise_floor:
+                    continue
+                if new > old * (1 + tolerance):
+                    regressions.append((size, stage, metric, old, new))
+    return regressions
+
+def print_summary(results):
+    print(f"\n{'size':>6} {'stage':<10} {'seconds':>9} {'items/s':>12} {'peak MB':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9}")
+    for size, run in results['runs'].items():
+        for stage, figures in run['stages'].items():
+            cells = [figures.get(key) for key in ('seconds', 'items_per_second', 'peak_rss_mb', 'p50_ms', 'p95_ms',
+                                                  'p99_ms')]
+            print(f"{size:>6} {stage:<10} " + " ".join(f"{'-' if v is None else v:>{w}}"
+                                                       for v, w in zip(cells, (9, 12, 9, 9, 9, 9))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic catalog.")
+    parser.add_argument("--sizes", nargs='+', default=list(DEFAULT_SIZES),
+                        help="Catalog sizes to run, e.g. 10k 100k 1M 10M")
+    parser.add_argument("--stages", nargs='+', choices=STAGES, default=list(STAGES), help="Stages to time")
+    parser.add_argument("--scrape-pages", type=int, default=SCRAPE_PAGES, help="Listing pages scraped per size")
+    parser.add_argument("--scrape-workers", type=int, default=SCRAPE_WORKERS, help="Concurrent page fetches")
+    parser.add_argument("--queries", type=int, default=AGGREGATE_QUERIES, help="Report queries timed per size")
+    parser.add_argument("--workdir", default=BENCHMARK_DIR, help="Scratch directory for generated files")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="Allowed growth over the baseline, as a fraction")
+    args = parser.parse_args()
+
+    results = environment()
+    results['runs'] = {}
+    for size in args.sizes:
+        products = parse_size(size)
+        print(f"\n##### {products:,} products #####")
+        results['runs'][format_size(products)] = benchmark_size(
+            products, args.stages, args.workdir, args.scrape_pages, args.scrape_workers, args.queries)
+
+    print_summary(results)
+    os.makedirs(args.workdir, exist_ok=True)
+    results_path = os.path.join(args.workdir, RESULTS_FILE)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {results_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved as baseline {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        for size, stage, metric, old, new in regressions:
+            print(f"REGRESSION {size} {stage} {metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
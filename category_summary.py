@@ -0,0 +1,170 @@
+# category_summary.py
+# Materialized per-category aggregates for the reports. CategorySummary holds
+# one row per category with the same values reports.py would compute from
+# Products; ReportInfo records which products version it was built from, when
+# it was refreshed and how many rows it covers. Loads bump the products version
+# and refresh only the categories they touched, so reports read the summary in
+# constant time and fall back to a scan of Products only while it is stale.
+# Changes made to Products outside the loaders do not bump the version; run
+# this module to refresh after them. --if-stale also notices rows inserted or
+# deleted that way (by the Products row count), but not rows updated in place.
+import argparse
+import time
+import uuid
+
+from reports import (DIALECTS, REPORT_INFO_TABLE, SUMMARY_SELECT_SQL, SUMMARY_TABLE, summary_is_fresh,
+                     table_exists)
+
+SUMMARY_COLUMNS = ['category', 'average_price', 'average_rating', 'product_count', 'stock_availability_percentage']
+
+# SQLite accepts the SQL Server column types (with numeric/text affinity)
+TABLE_DEFINITIONS = {
+    SUMMARY_TABLE: """(
+    category                      NVARCHAR(255) NULL,
+    average_price                 FLOAT NULL,
+    average_rating                FLOAT NULL,
+    product_count                 INT NOT NULL,
+    stock_availability_percentage DECIMAL(10,2) NULL
+)""",
+    REPORT_INFO_TABLE: """(
+    info_key   NVARCHAR(64) NOT NULL PRIMARY KEY,
+    info_value NVARCHAR(400) NULL
+)""",
+}
+
+def ensure_summary_tables(conn, dialect='sqlserver'):
+    cursor = conn.cursor()
+    try:
+        for table, definition in TABLE_DEFINITIONS.items():
+            if dialect == 'sqlserver':
+                cursor.execute(f"IF OBJECT_ID('{table}', 'U') IS NULL CREATE TABLE {table} {definition}")
+            else:
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} {definition}")
+    finally:
+        cursor.close()
+
+def _set_info(cursor, key, value):
+    cursor.execute(f"DELETE FROM {REPORT_INFO_TABLE} WHERE info_key = ?", (key,))
+    cursor.execute(f"INSERT INTO {REPORT_INFO_TABLE} (info_key, info_value) VALUES (?, ?)", (key, str(value)))
+
+def _get_info(cursor):
+    cursor.execute(f"SELECT info_key, info_value FROM {REPORT_INFO_TABLE}")
+    return {key: value for key, value in cursor.fetchall()}
+
+def mark_products_changed(conn, dialect='sqlserver'):
+    """
+    Records that Products was (re)loaded, which makes the summary stale until
+    the next refresh. Does not commit, so it can share the load's transaction.
+    """
+    ensure_summary_tables(conn, dialect)
+    version = uuid.uuid4().hex
+    cursor = conn.cursor()
+    try:
+        _set_info(cursor, 'products_version', version)
+        _set_info(cursor, 'products_loaded_at', time.strftime('%Y-%m-%d %H:%M:%S'))
+    finally:
+        cursor.close()
+    return version
+
+def refresh_category_summary(conn, dialect='sqlserver', categories=None):
+    """
+    Recomputes the summary rows of `categories` (every category when None) from
+    Products and marks the summary as matching the current products version.
+    Returns summary_status(). Does not commit.
+    """
+    if dialect not in DIALECTS:
+        raise ValueError(f"Unknown SQL dialect '{dialect}', expected one of {DIALECTS}")
+    ensure_summary_tables(conn, dialect)
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        insert_sql = f"INSERT INTO {SUMMARY_TABLE} ({', '.join(SUMMARY_COLUMNS)}) " + SUMMARY_SELECT_SQL[dialect]
+        if categories is None:
+            cursor.execute(f"DELETE FROM {SUMMARY_TABLE}")
+            cursor.execute(insert_sql.format(where=''))
+        else:
+            categories = sorted(set(categories))
+            if categories:
+                where = f"WHERE category IN ({', '.join('?' * len(categories))})"
+                cursor.execute(f"DELETE FROM {SUMMARY_TABLE} {where}", categories)
+                cursor.execute(insert_sql.format(where=where), categories)
+
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(product_count), 0) FROM {SUMMARY_TABLE}")
+        category_count, product_count = cursor.fetchone()
+        info = _get_info(cursor)
+        if 'products_version' not in info:
+            # Products loaded by hand: start versioning from this refresh
+            info['products_version'] = uuid.uuid4().hex
+            _set_info(cursor, 'products_version', info['products_version'])
+        _set_info(cursor, 'summary_version', info['products_version'])
+        _set_info(cursor, 'summary_refreshed_at', time.strftime('%Y-%m-%d %H:%M:%S'))
+        _set_info(cursor, 'summary_categories', category_count)
+        _set_info(cursor, 'summary_products', product_count)
+        _set_info(cursor, 'summary_refresh_seconds', f"{time.perf_counter() - started:.3f}")
+        _set_info(cursor, 'summary_refreshed_categories', 'all' if categories is None else len(categories))
+    finally:
+        cursor.close()
+    return summary_status(conn, dialect)
+
+def summary_status(conn, dialect='sqlserver'):
+    """
+    Refresh bookkeeping from ReportInfo plus whether the summary is fresh, or
+    None if no summary was ever built.
+    """
+    cursor = conn.cursor()
+    try:
+        if not table_exists(cursor, REPORT_INFO_TABLE, dialect):
+            return None
+        info = _get_info(cursor)
+        if 'summary_version' not in info:
+            return None
+        status = {
+            'fresh': summary_is_fresh(cursor, dialect),
+            'refreshed_at': info.get('summary_refreshed_at'),
+            'products_loaded_at': info.get('products_loaded_at'),
+            'categories': int(info.get('summary_categories', 0)),
+            'products': int(info.get('summary_products', 0)),
+            'refresh_seconds': float(info.get('summary_refresh_seconds', 0)),
+            'refreshed_categories': info.get('summary_refreshed_categories'),
+        }
+    finally:
+        cursor.close()
+    return status
+
+def products_row_count(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM Products")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    # Scheduled refresh, e.g. from cron after Products was changed outside load_products.py
+    from backends import BACKENDS, DEFAULT_BACKEND, get_backend
+
+    parser = argparse.ArgumentParser(description="Refresh the materialized per-category summary.")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND, help="Report database")
+    parser.add_argument('--server', default='DESKTOP-09847JI', help="SQL Server instance (sqlserver backend)")
+    parser.add_argument('--database', default='BanggoodProducts', help="SQL Server database (sqlserver backend)")
+    parser.add_argument('--if-stale', action='store_true', help="Only refresh when the summary is stale")
+    args = parser.parse_args()
+
+    if args.backend == 'sqlserver':
+        backend = get_backend('sqlserver', server=args.server, database=args.database, size=1)
+    else:
+        backend = get_backend(args.backend)
+    try:
+        with backend.lease() as conn:
+            status = summary_status(conn, backend.dialect)
+            # A changed row count means Products was edited without bumping products_version
+            if args.if_stale and status is not None and status['fresh'] \
+                    and products_row_count(conn) == status['products']:
+                print(f"Summary is fresh (refreshed at {status['refreshed_at']})")
+            else:
+                status = refresh_category_summary(conn, backend.dialect)
+                conn.commit()
+                print(f"Refreshed summary: {status['categories']} categories, {status['products']} products "
+                      f"in {status['refresh_seconds']:.2f}s")
+    finally:
+        backend.close()
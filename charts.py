@@ -0,0 +1,149 @@
+# charts.py
+# The dashboard's exploratory charts as plain functions: each takes the data it
+# plots and returns a matplotlib Figure. figure_png() renders a figure to PNG
+# bytes and frees it, so callers can cache the image instead of redrawing.
+# Scatter plots switch to a per-category sample or a hexbin density above
+# SCATTER_ROW_LIMIT rows, so their render time does not grow with the data.
+import io
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from features import is_defined
+
+PNG_DPI = 100
+SCATTER_ROW_LIMIT = 20_000  # Most markers a scatter plot draws before switching modes
+MIN_SAMPLE_PER_CATEGORY = 200  # Sampling keeps at least this many rows of small categories
+HEXBIN_GRID_SIZE = 60
+SCATTER_MODES = ('auto', 'points', 'sample', 'hexbin')
+
+def figure_png(fig, dpi=PNG_DPI):
+    """Renders a figure to PNG bytes and closes it."""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+def top_reviewed_products(df, n=10):
+    return df.nlargest(n, "reviews_raw")
+
+def best_value_products(df, per_category=5):
+    """Lowest price per rating point, per category (unrated products, whose ratio is undefined, are left out)."""
+    return (
+        df[is_defined(df, "price_to_rating")]
+          .sort_values(by="price_to_rating", ascending=True)
+          .groupby("category", observed=True)
+          .head(per_category)
+    )
+
+def stratified_sample(df, limit=SCATTER_ROW_LIMIT, seed=0):
+    """
+    At most about `limit` rows, sampled per category in proportion to its size,
+    keeping at least MIN_SAMPLE_PER_CATEGORY rows (or all) of each category.
+    """
+    if len(df) <= limit:
+        return df
+    counts = df["category"].value_counts()
+    counts = counts[counts > 0]
+    quotas = np.maximum(np.round(counts * (limit / len(df))), MIN_SAMPLE_PER_CATEGORY)
+    quotas = np.minimum(quotas, counts).astype(int)
+    parts = [
+        group.sample(n=quotas[category], random_state=seed)
+        for category, group in df.groupby("category", observed=True)
+        if category in quotas.index
+    ]
+    return pd.concat(parts) if parts else df.iloc[:0]
+
+def price_boxplot(df):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    sns.boxplot(
+        data=df,
+        x="category",
+        y="price_raw",
+        ax=ax
+    )
+    ax.set_title("Price Distribution per Category")
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Price")
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+    return fig
+
+def resolve_scatter_mode(rows, mode='auto', limit=SCATTER_ROW_LIMIT):
+    """'points' up to `limit` rows; above it 'auto' means a per-category sample."""
+    if mode not in SCATTER_MODES:
+        raise ValueError(f"Unknown scatter mode '{mode}', expected one of {SCATTER_MODES}")
+    if rows <= limit:
+        return 'points'
+    return 'sample' if mode == 'auto' else mode
+
+def category_scatter(df, x, y, title, xlabel, ylabel, mode='auto', limit=SCATTER_ROW_LIMIT):
+    """
+    Scatter of y against x colored by category, or a bounded stand-in for large
+    frames (see resolve_scatter_mode). The title says how many products it shows.
+    """
+    mode = resolve_scatter_mode(len(df), mode, limit)
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    if mode == 'hexbin':
+        data = df[[x, y]].dropna()
+        collection = ax.hexbin(data[x], data[y], gridsize=HEXBIN_GRID_SIZE, bins="log", mincnt=1, cmap="viridis")
+        fig.colorbar(collection, ax=ax, label="Products per bin")
+        title = f"{title} ({len(data):,} products binned)"
+    else:
+        data = stratified_sample(df, limit) if mode == 'sample' else df
+        sns.scatterplot(
+            data=data,
+            x=x,
+            y=y,
+            hue="category",
+            ax=ax,
+            # Smaller, edge-free markers keep a dense sample readable and quick to draw
+            **({"s": 8, "linewidth": 0} if mode == 'sample' else {})
+        )
+        if mode == 'sample':
+            title = f"{title} ({len(data):,} of {len(df):,} products, sampled per category)"
+        if ax.get_legend() is not None:
+            ax.legend(title="Category", bbox_to_anchor=(1.05, 1), loc="upper left")
+
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    return fig
+
+def rating_vs_price(df, mode='auto'):
+    return category_scatter(df, "price_raw", "rating_raw", "Rating vs Price Correlation", "Price", "Rating", mode)
+
+def top_reviewed_bar(top_reviewed):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    sns.barplot(
+        data=top_reviewed,
+        x="reviews_raw",
+        y="name",
+        ax=ax
+    )
+    ax.set_title("Top 10 Reviewed Products")
+    ax.set_xlabel("Number of Reviews")
+    ax.set_ylabel("Product Name")
+    return fig
+
+def best_value_bar(best_value):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(
+        data=best_value,
+        x="price_to_rating",
+        y="name",
+        hue="category",
+        ax=ax
+    )
+    ax.set_title("Best Value Products (Lowest Price per Rating) – Top 5 per Category")
+    ax.set_xlabel("Price per Rating")
+    ax.set_ylabel("Product Name")
+    return fig
+
+def price_vs_reviews(df, mode='auto'):
+    return category_scatter(df, "price_raw", "reviews_raw", "Price vs Number of Reviews", "Price",
+                            "Number of Reviews", mode)
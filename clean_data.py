@@ -1,50 +1,447 @@
+import argparse
+import os
+import re
+import tempfile
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset import CLEANED_CSV, CLEANED_PARQUET, CLEANED_SCHEMA, open_cleaned_writer, to_cleaned_table
+from features import add_features
+from instrumentation import PROFILERS, configure, stage
+from product_identity import key_hashes, last_occurrences, product_keys
+from product_sink import RAW_DATASET_DIR, crawl_is_complete, iter_products, list_crawls, raw_parts
+
+RAW_INPUT_FILE = "banggood_products_raw.csv"
+CLEANED_OUTPUT_FILE = CLEANED_CSV
+CHUNK_SIZE = 100_000  # Rows held in memory at a time
+CLEAN_STATE_FILE = "banggood_products_clean_state.parquet"  # Per-URL row hashes for incremental runs
+
+_NON_NUMERIC = re.compile(r'[^0-9.]')
+_INT64_MAX = np.iinfo(np.int64).max
+
+def parse_price(series):
+    """
+    Vectorized equivalent of replace({r'[^0-9.]': ''}, regex=True) followed by
+    pd.to_numeric(errors='coerce'), dtype included. Every distinct price string
+    is parsed once with a precompiled pattern and the results are broadcast back
+    through factorize codes, since scraped prices repeat heavily.
+    """
+    if is_numeric_dtype(series):
+        return series  # Nothing to strip, same as the regex replace
+
+    codes, uniques = pd.factorize(series)  # Missing values get code -1
+    values = np.full(len(uniques) + 1, np.nan)  # Last slot serves code -1
+    all_integers = True
+    for i, raw in enumerate(uniques):
+        if isinstance(raw, str):
+            digits = _NON_NUMERIC.sub('', raw)
+            if digits.isdigit() and int(digits) <= _INT64_MAX:
+                values[i] = int(digits)
+                continue
+            all_integers = False
+            try:
+                values[i] = float(digits)
+            except ValueError:
+                pass  # e.g. '' or '1.2.3', which to_numeric also turns into NaN
+        else:
+            all_integers = all_integers and isinstance(raw, (int, np.integer))
+            try:
+                values[i] = float(raw)
+            except (TypeError, ValueError):
+                all_integers = False
+
+    parsed = values[codes]
+    if all_integers and (codes >= 0).all():
+        # to_numeric keeps integer-looking strings as int64
+        parsed = parsed.astype(np.int64)
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+def parse_rating(series):
+    return pd.to_numeric(series, errors='coerce')
+
+def _common_dtype(dtypes):
+    """dtype pandas would infer for the whole column, given the dtype seen in each chunk."""
+    if all(is_numeric_dtype(dtype) for dtype in dtypes):
+        return np.result_type(*dtypes)
+    return object
+
+def scan_raw(path, chunksize=CHUNK_SIZE, spill_dir=None, dedupe=True, parts=None):
+    """
+    Pass 1: streams the raw data once to learn what a whole-file read would see:
+    the columns, each column's dtype, and the exact price/rating means.
+
+    Parsed prices/ratings are spilled to a disk-backed array (NaN stored as 0,
+    like pandas does) so the means are summed in the same order as Series.mean()
+    on the full column, giving bit-identical imputation values in fixed memory.
+
+    With dedupe, product keys (product_identity.product_key) are hashed too and
+    'keep' marks the last row of every product, e.g. the newest crawl when part
+    files from several crawls share a directory; the means cover those rows only.
+
+    The part files read are listed once up front and returned as 'parts'; the
+    second pass must read exactly those, since a running crawl adds new ones.
+    """
+    parts = parts if parts is not None else raw_parts(path)
+    columns = None
+    chunk_dtypes = {}
+    rows = 0
+    spill_dir = spill_dir or tempfile.mkdtemp(prefix="clean_data_")
+    spill_paths = {column: os.path.join(spill_dir, f"{column}.f64") for column in ('price_raw', 'rating_raw')}
+    spill_files = {column: open(p, "wb") for column, p in spill_paths.items()}
+    keys_path = os.path.join(spill_dir, "keys.u64")
+    keys_file = open(keys_path, "wb")
+
+    try:
+        for chunk in iter_products(path, chunksize, parts=parts):
+            if columns is None:
+                columns = list(chunk.columns)
+            rows += len(chunk)
+
+            parsed = {}
+            if 'price_raw' in chunk.columns:
+                parsed['price_raw'] = parse_price(chunk['price_raw'])
+            if 'rating_raw' in chunk.columns:
+                parsed['rating_raw'] = parse_rating(chunk['rating_raw'])
+
+            for column in chunk.columns:
+                series = parsed.get(column, chunk[column])
+                chunk_dtypes.setdefault(column, []).append(series.dtype)
+
+            for column, series in parsed.items():
+                series.to_numpy(dtype=np.float64).tofile(spill_files[column])
+            if dedupe and 'url' in chunk.columns:
+                key_hashes(product_keys(chunk['url'])).tofile(keys_file)
+    finally:
+        for f in spill_files.values():
+            f.close()
+        keys_file.close()
+
+    keep = np.ones(rows, dtype=bool)
+    if os.path.getsize(keys_path):
+        keep = last_occurrences(np.fromfile(keys_path, dtype=np.uint64))
+    os.remove(keys_path)
+
+    means = {}
+    for column, spill_path in spill_paths.items():
+        values = np.fromfile(spill_path, dtype=np.float64) if os.path.getsize(spill_path) else None
+        os.remove(spill_path)
+        if values is None:
+            means[column] = np.nan
+            continue
+        if not keep.all():
+            values = values[keep]
+        valid = ~np.isnan(values)
+        count = int(valid.sum())
+        # Summed with NaN as 0 in row order, as Series.mean() does
+        means[column] = np.where(valid, values, 0.0).sum() / count if count else np.nan
+    os.rmdir(spill_dir)
+
+    dtypes = {column: _common_dtype(seen) for column, seen in chunk_dtypes.items()}
+    return {
+        'columns': columns or [],
+        'parts': parts,
+        'rows': rows,
+        'keep': keep,
+        'duplicates': int(rows - keep.sum()),
+        'dtypes': dtypes,
+        'price_mean': means['price_raw'],
+        'rating_mean': means['rating_raw'],
+    }
+
+def clean_chunk(df, price_mean, rating_mean, dtypes=None):
+    """
+    Cleans one chunk of raw rows with precomputed (global) imputation means and
+    adds the derived features. dtypes (from scan_raw) keeps every chunk's
+    columns typed the way a whole-file read would have typed them.
+    """
+    dtypes = dtypes or {}
+
+    # 1. Clean the 'price_raw' column: Remove currency symbols and convert to float
+    if 'price_raw' in df.columns:
+        df['price_raw'] = parse_price(df['price_raw'])
+
+    # 2. Clean the 'rating_raw' column: Convert to float, handle missing values
+    if 'rating_raw' in df.columns:
+        df['rating_raw'] = parse_rating(df['rating_raw'])
+
+    # 3. Handle missing values in 'price_raw', 'rating_raw', and 'reviews_raw'
+    if 'price_raw' in df.columns:
+        df['price_raw'] = df['price_raw'].fillna(price_mean)  # Replace NaN prices with the mean price
+    if 'rating_raw' in df.columns:
+        df['rating_raw'] = df['rating_raw'].fillna(rating_mean)  # Replace NaN ratings with the mean rating
+    # Fill missing reviews with 0 if 'reviews_raw' exists
+    if 'reviews_raw' in df.columns:
+        df['reviews_raw'] = df['reviews_raw'].fillna(0)  # Replace NaN reviews with 0
+    else:
+        df['reviews_raw'] = 0  # If no reviews column exists, set it to 0
+
+    for column, dtype in dtypes.items():
+        if column in df.columns and dtype is not object and df[column].dtype != dtype:
+            # A chunk without NaNs reads as int64 where the full column is float64
+            df[column] = df[column].astype(dtype)
+
+    # 4. Create Derived Features (price_to_rating, price_to_review; see features.FEATURES)
+    add_features(df)
+    return df
+
+def clean_streaming(raw_input, output_file=CLEANED_OUTPUT_FILE, chunksize=CHUNK_SIZE, parquet_file=CLEANED_PARQUET,
+                    state_file=CLEAN_STATE_FILE, dedupe=True):
+    """
+    Two-pass, fixed-memory cleaning pipeline. Pass 1 (scan_raw) computes the
+    global means and dtypes; pass 2 cleans chunk by chunk and appends to a
+    temporary CSV that replaces output_file only once it is complete. With
+    dedupe only the last raw row of each product is kept.
+
+    The same chunks are also streamed into a typed, compressed Parquet file
+    (dataset.CLEANED_SCHEMA) unless parquet_file is None. Rewriting the store
+    invalidates the incremental state_file, so the next incremental run rebuilds it.
+    Returns scan_raw's stats ('rows' counts the raw rows) plus 'rows_written'.
+    """
+    stats = scan_raw(raw_input, chunksize, dedupe=dedupe)
+    keep = stats['keep']
+    if stats['duplicates']:
+        print(f"Dropping {stats['duplicates']} duplicate raw rows (same product, older listing)")
+
+    # Print out the columns to check if 'price_raw' exists
+    print("Columns in the DataFrame:", pd.Index(stats['columns']))
+    if 'price_raw' not in stats['columns']:
+        print("'price_raw' column is missing!")
+    if 'rating_raw' not in stats['columns']:
+        print("'rating_raw' column is missing!")
+    if 'reviews_raw' not in stats['columns']:
+        print("'reviews_raw' column is missing! Filling missing reviews with 0.")
+
+    # Columns that are text in any chunk are read as text in every chunk
+    text_columns = {column: str for column, dtype in stats['dtypes'].items()
+                    if dtype is object and column not in ('price_raw', 'rating_raw')}
+
+    tmp_file = f"{output_file}.tmp"
+    tmp_parquet = f"{parquet_file}.tmp" if parquet_file else None
+    parquet_writer = open_cleaned_writer(tmp_parquet) if parquet_file else None
+    rows = 0
+    offset = 0
+    preview = None
+    try:
+        for chunk in iter_products(raw_input, chunksize, dtype=text_columns or None, parts=stats['parts']):
+            chunk_keep = keep[offset:offset + len(chunk)]
+            offset += len(chunk)
+            if not chunk_keep.all():
+                chunk = chunk[chunk_keep]
+            cleaned = clean_chunk(chunk, stats['price_mean'], stats['rating_mean'], stats['dtypes'])
+            cleaned.to_csv(tmp_file, mode="w" if rows == 0 else "a", header=rows == 0,
+                           index=False, encoding="utf-8")
+            if parquet_writer is not None:
+                parquet_writer.write_table(to_cleaned_table(cleaned))
+            if preview is None:
+                preview = cleaned.head()
+            rows += len(cleaned)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    os.replace(tmp_file, output_file)
+    if parquet_file:
+        # Replaced after the CSV so the Parquet copy is never older than it
+        os.replace(tmp_parquet, parquet_file)
+    if parquet_file and state_file and os.path.exists(state_file):
+        # The incremental state described the previous output; rebuild it next time
+        os.remove(state_file)
+
+    # Display the cleaned DataFrame (optional)
+    print("Cleaned DataFrame:")
+    print(preview)
+    print(f"Cleaned {rows} rows (mean price {stats['price_mean']}, mean rating {stats['rating_mean']})")
+    stats['rows_written'] = rows
+    return stats
+
+# --- Incremental mode ---
+
+def _row_hashes(chunk):
+    """Hash of every raw field of each row, independent of the dtypes pandas inferred."""
+    columns = sorted(chunk.columns)
+    return pd.util.hash_pandas_object(chunk[columns].astype(str), index=False).to_numpy()
+
+def load_clean_state(state_file=CLEAN_STATE_FILE):
+    """Returns (state DataFrame, previous means) or (None, {}) if there is no state yet."""
+    if not os.path.exists(state_file):
+        return None, {}
+    table = pq.read_table(state_file)
+    metadata = table.schema.metadata or {}
+    means = {key.decode(): float(value) for key, value in metadata.items() if key.decode().endswith('_mean')}
+    return table.to_pandas(), means
+
+def save_clean_state(state, price_mean, rating_mean, state_file=CLEAN_STATE_FILE):
+    table = pa.Table.from_pandas(state, preserve_index=False)
+    table = table.replace_schema_metadata({'price_mean': repr(float(price_mean)),
+                                           'rating_mean': repr(float(rating_mean))})
+    tmp_file = f"{state_file}.tmp"
+    pq.write_table(table, tmp_file)
+    os.replace(tmp_file, state_file)
+
+def write_cleaned_store(df, output_file=CLEANED_OUTPUT_FILE, parquet_file=CLEANED_PARQUET):
+    """Atomically rewrites the cleaned CSV and Parquet files from a DataFrame."""
+    tmp_file = f"{output_file}.tmp"
+    df.to_csv(tmp_file, index=False, encoding="utf-8")
+    tmp_parquet = f"{parquet_file}.tmp"
+    pq.write_table(to_cleaned_table(df), tmp_parquet, compression="zstd")
+    os.replace(tmp_file, output_file)
+    os.replace(tmp_parquet, parquet_file)
+
+def incremental_parts(raw_input):
+    """
+    The raw files an incremental run reads, and whether they list every live
+    product. For a sink directory that is the latest crawl when it was marked
+    complete (each crawl re-emits its unchanged pages, so it is a full
+    snapshot); otherwise every part, without reporting deletions.
+    """
+    if not os.path.isdir(raw_input):
+        return [raw_input], True
+    crawls = list_crawls(raw_input)
+    if crawls:
+        crawl_id, parts = list(crawls.items())[-1]
+        if crawl_is_complete(raw_input, crawl_id):
+            return parts, True
+    return raw_parts(raw_input), False
+
+def clean_incremental(raw_input, output_file=CLEANED_OUTPUT_FILE, parquet_file=CLEANED_PARQUET,
+                      state_file=CLEAN_STATE_FILE, chunksize=CHUNK_SIZE):
+    """
+    Cleans only raw rows that are new or changed since the last incremental run
+    and merges them into the existing cleaned store, keyed by product url (the
+    last raw row wins when several rows are the same product, see product_identity).
+
+    The state file keeps each url's raw row hash and parsed price/rating, so the
+    imputation means are recomputed over the current rows every run, and rows
+    that were imputed before are re-filled when a mean moves.
+    Returns a summary dict of added/changed/deleted/unchanged/re-imputed rows.
+    """
+    state, previous_means = load_clean_state(state_file)
+    if state is None or not os.path.exists(output_file):
+        print("No incremental state found, cleaning every row.")
+        state = pd.DataFrame({'url': pd.Series(dtype=object), 'row_hash': pd.Series(dtype=np.uint64),
+                              'price_parsed': pd.Series(dtype=np.float64),
+                              'rating_parsed': pd.Series(dtype=np.float64)})
+        store = pd.DataFrame(columns=CLEANED_SCHEMA.names)
+    else:
+        # Merged against the full-precision CSV; the Parquet copy holds float32
+        # values, which would otherwise leak float32 noise back into the CSV
+        store = pd.read_csv(output_file)
+
+    # Pass 1: url + row hash of every raw row (read as text so hashes are stable);
+    # pass 2 reads the same part files, whatever a running crawl adds meanwhile
+    parts, complete = incremental_parts(raw_input)
+    keys = []
+    for chunk_no, chunk in enumerate(iter_products(raw_input, chunksize, dtype=str, parts=parts)):
+        keys.append(pd.DataFrame({
+            'url': chunk['url'].to_numpy(),
+            'row_hash': _row_hashes(chunk),
+            'chunk': chunk_no,
+            'position': np.arange(len(chunk)),
+        }))
+    raw_keys = pd.concat(keys, ignore_index=True) if keys else pd.DataFrame(columns=['url', 'row_hash', 'chunk', 'position'])
+    missing_url = raw_keys['url'].isna()
+    if missing_url.any():
+        print(f"Skipping {int(missing_url.sum())} raw rows without a url")
+    raw_keys = raw_keys[~missing_url]
+    raw_keys = raw_keys[last_occurrences(key_hashes(product_keys(raw_keys['url'])))]
+
+    # Inner merge only, so the uint64 hashes never pass through float NaN columns
+    known = raw_keys['url'].isin(state['url'])
+    added = raw_keys[~known]
+    # Only a complete crawl lists every live product; otherwise a missing url may just not be crawled yet
+    deleted = state.loc[~state['url'].isin(raw_keys['url']), ['url']] if complete else state.iloc[:0][['url']]
+    both = raw_keys[known].merge(state[['url', 'row_hash']], on='url', suffixes=('', '_old'))
+    updated = both[both['row_hash'] != both['row_hash_old']]
+    changed = pd.concat([added, updated[raw_keys.columns]])
+
+    # Pass 2: re-read only the chunks that hold new or changed rows
+    positions = changed.groupby('chunk')['position'].apply(list).to_dict()
+    changed_parts = []
+    if positions:
+        for chunk_no, chunk in enumerate(iter_products(raw_input, chunksize, dtype=str, parts=parts)):
+            if chunk_no in positions:
+                changed_parts.append(chunk.iloc[positions[chunk_no]])
+    changed_raw = pd.concat(changed_parts, ignore_index=True) if changed_parts else pd.DataFrame(columns=['url'])
+    changed_raw = changed_raw.merge(changed[['url', 'row_hash']], on='url', how='left')
+
+    price_parsed = (parse_price(changed_raw['price_raw']) if 'price_raw' in changed_raw.columns
+                    else pd.Series(np.nan, index=changed_raw.index)).astype(np.float64)
+    rating_parsed = (parse_rating(changed_raw['rating_raw']) if 'rating_raw' in changed_raw.columns
+                     else pd.Series(np.nan, index=changed_raw.index)).astype(np.float64)
+
+    # Keep the global statistics current: means over every live row
+    removed_urls = set(deleted['url']) | set(updated['url'])
+    state = pd.concat([
+        state[~state['url'].isin(removed_urls)],
+        pd.DataFrame({'url': changed_raw['url'], 'row_hash': changed_raw['row_hash'].astype(np.uint64),
+                      'price_parsed': price_parsed, 'rating_parsed': rating_parsed}),
+    ], ignore_index=True)
+    price_mean = state['price_parsed'].mean()
+    rating_mean = state['rating_parsed'].mean()
+
+    # Clean just the new/changed rows and merge them into the existing store
+    new_rows = changed_raw.drop(columns=['row_hash'])
+    if len(new_rows):
+        if 'reviews_raw' in new_rows.columns:
+            new_rows['reviews_raw'] = pd.to_numeric(new_rows['reviews_raw'], errors='coerce')
+        new_rows = clean_chunk(new_rows, price_mean, rating_mean)
+    new_rows = new_rows.reindex(columns=CLEANED_SCHEMA.names)
+
+    store = store[~store['url'].isin(removed_urls)]
+    frames = [frame for frame in (store, new_rows) if len(frame)]
+    store = pd.concat(frames, ignore_index=True) if frames else new_rows
+
+    # Rows imputed earlier follow the current means
+    parsed = store[['url']].merge(state[['url', 'price_parsed', 'rating_parsed']], on='url', how='left')
+    reimpute_price = parsed['price_parsed'].isna().to_numpy()
+    reimpute_rating = parsed['rating_parsed'].isna().to_numpy()
+    store.loc[reimpute_price, 'price_raw'] = price_mean
+    store.loc[reimpute_rating, 'rating_raw'] = rating_mean
+    reimputed = reimpute_price | reimpute_rating
+    store.loc[reimputed] = add_features(store.loc[reimputed].copy())
+
+    means_moved = bool(previous_means) and (previous_means.get('price_mean') != price_mean
+                                            or previous_means.get('rating_mean') != rating_mean)
+    write_cleaned_store(store, output_file, parquet_file)
+    save_clean_state(state, price_mean, rating_mean, state_file)
+
+    summary = {
+        'added': len(added),
+        'changed': len(updated),
+        'deleted': len(deleted),
+        'unchanged': len(both) - len(updated),
+        'reimputed': int(reimputed.sum()) if means_moved else 0,
+        'rows': len(store),
+    }
+    print(f"Incremental clean: {summary['added']} added, {summary['changed']} changed, "
+          f"{summary['deleted']} deleted, {summary['unchanged']} unchanged "
+          f"({summary['reimputed']} imputed rows refreshed, {summary['rows']} rows in store)")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the scraped Banggood products.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only clean new/changed rows (keyed by url) and merge them into the existing output")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="Raw rows processed per chunk")
+    parser.add_argument("--profile", choices=PROFILERS, help="Also dump a cProfile or sampling profile of the run")
+    args = parser.parse_args()
+    configure(profile=args.profile)
+
+    # Load the scraped data: prefer the crawler's streamed part files (complete
+    # batches only, so this also works mid-crawl), else the single raw CSV
+    raw_input = RAW_DATASET_DIR if os.path.isdir(RAW_DATASET_DIR) else RAW_INPUT_FILE
+
+    with stage('clean', mode='incremental' if args.incremental else 'full') as event:
+        if args.incremental:
+            result = clean_incremental(raw_input, CLEANED_OUTPUT_FILE, CLEANED_PARQUET, CLEAN_STATE_FILE, args.chunksize)
+            event['rows'] = result['rows']  # Rows in the merged store
+        else:
+            result = clean_streaming(raw_input, CLEANED_OUTPUT_FILE, args.chunksize, CLEANED_PARQUET)
+            event['rows'] = result['rows_written']
 
-# Load the scraped data into a pandas DataFrame
-df = pd.read_csv("banggood_products_raw.csv")
-
-# Print out the columns to check if 'price_raw' exists
-print("Columns in the DataFrame:", df.columns)
-
-# 1. Clean the 'price_raw' column: Remove currency symbols and convert to float
-if 'price_raw' in df.columns:
-    df['price_raw'] = df['price_raw'].replace({r'[^0-9.]': ''}, regex=True)  # Remove non-numeric characters
-    df['price_raw'] = pd.to_numeric(df['price_raw'], errors='coerce')  # Convert to float, set errors to NaN if any
-else:
-    print("'price_raw' column is missing!")
-
-# 2. Clean the 'rating_raw' column: Convert to float, handle missing values
-if 'rating_raw' in df.columns:
-    df['rating_raw'] = pd.to_numeric(df['rating_raw'], errors='coerce')  # Convert ratings to float, set errors to NaN
-else:
-    print("'rating_raw' column is missing!")
-
-# 3. Handle missing values in 'price_raw', 'rating_raw', and 'reviews_raw'
-df['price_raw'].fillna(df['price_raw'].mean(), inplace=True)  # Replace NaN prices with the mean price
-df['rating_raw'].fillna(df['rating_raw'].mean(), inplace=True)  # Replace NaN ratings with the mean rating
-# Fill missing reviews with 0 if 'reviews_raw' exists
-if 'reviews_raw' in df.columns:
-    df['reviews_raw'].fillna(0, inplace=True)  # Replace NaN reviews with 0
-else:
-    print("'reviews_raw' column is missing! Filling missing reviews with 0.")
-    df['reviews_raw'] = 0  # If no reviews column exists, set it to 0
-
-# 4. Create Derived Features
-# 4.1 Create Price-to-Rating Ratio (how much does each unit of rating cost?)
-df['price_to_rating'] = df['price_raw'] / df['rating_raw']
-df['price_to_rating'].fillna(0, inplace=True)  # Handle NaN values by replacing with 0
-
-# 4.2 Create Price-to-Review Ratio (how much does each review cost?)
-df['price_to_review'] = df['price_raw'] / df['reviews_raw']
-df['price_to_review'].fillna(0, inplace=True)  # Handle NaN values by replacing with 0
-
-# Display the cleaned DataFrame (optional)
-print("Cleaned DataFrame:")
-print(df.head())
-
-# Save the cleaned data with derived features to a new CSV file
-output_cleaned_file = "banggood_products_cleaned.csv"
-df.to_csv(output_cleaned_file, index=False, encoding="utf-8")
-
-# Notify that the data has been saved
-print(f"Cleaned data saved to {output_cleaned_file}")
+    # Notify that the data has been saved
+    print(f"Cleaned data saved to {CLEANED_OUTPUT_FILE} and {CLEANED_PARQUET}")
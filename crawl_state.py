@@ -0,0 +1,183 @@
+# crawl_state.py
+# Local SQLite record of every listing page the crawler has fetched: when, its
+# content hash, HTTP validators and the products / pagination it produced.
+# It lets an interrupted crawl resume where it stopped, and lets a re-crawl
+# skip parsing pages that have not changed since the previous crawl: their
+# stored products are written out again, so every crawl's output is complete.
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+STATE_DB = "crawl_state.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    crawl_id    TEXT PRIMARY KEY,
+    started_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url           TEXT PRIMARY KEY,
+    category      TEXT,
+    crawl_id      TEXT,
+    fetched_at    REAL,
+    content_hash  TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    next_url      TEXT,
+    planned_urls  TEXT,
+    product_urls  TEXT,
+    products      TEXT,
+    changed       INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_pages_crawl ON pages (crawl_id);
+"""
+
+def content_hash(content):
+    """Stable hash of a page body (bytes or str)."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+class CrawlState:
+    """
+    Thread-safe crawl state store shared by all crawler workers.
+
+    Call begin_crawl() before fetching; it resumes the last crawl if that one
+    never finished. Call finish_crawl() once every page was fetched.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self.crawl_id = None
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if 'products' not in columns:
+            # State written before the page rows were stored; such pages count as changed
+            self._conn.execute("ALTER TABLE pages ADD COLUMN products TEXT")
+
+    def begin_crawl(self, resume=True):
+        with self._lock:
+            row = None
+            if resume:
+                row = self._conn.execute(
+                    "SELECT crawl_id FROM crawls WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+                ).fetchone()
+            if row is not None:
+                self.crawl_id = row['crawl_id']
+                self.resumed = True
+            else:
+                self.crawl_id = uuid.uuid4().hex
+                self.resumed = False
+                self._conn.execute("INSERT INTO crawls (crawl_id, started_at) VALUES (?, ?)",
+                                   (self.crawl_id, time.time()))
+            return self.crawl_id
+
+    def finish_crawl(self):
+        with self._lock:
+            self._conn.execute("UPDATE crawls SET finished_at = ? WHERE crawl_id = ?", (time.time(), self.crawl_id))
+
+    def get_page(self, url):
+        with self._lock:
+            return self._conn.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+
+    def is_done(self, url):
+        """True if the current crawl already fetched (or confirmed unchanged) this page."""
+        page = self.get_page(url)
+        return page is not None and page['crawl_id'] == self.crawl_id
+
+    def is_unchanged(self, url, page_hash):
+        """True if the page has this hash and its products are stored, so it need not be parsed."""
+        page = self.get_page(url)
+        return page is not None and page['products'] is not None and page['content_hash'] == page_hash
+
+    def conditional_headers(self, url):
+        """
+        If-None-Match / If-Modified-Since headers from the previous fetch of a
+        page; none while its products are not stored, since a 304 could not be served.
+        """
+        page = self.get_page(url)
+        headers = {}
+        if page is not None and page['products'] is not None:
+            if page['etag']:
+                headers['If-None-Match'] = page['etag']
+            if page['last_modified']:
+                headers['If-Modified-Since'] = page['last_modified']
+        return headers
+
+    def record_page(self, url, category, page_hash, products, next_url=None, etag=None, last_modified=None):
+        """Stores a freshly parsed page, with its product records, as fetched by the current crawl."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO pages (url, category, crawl_id, fetched_at, content_hash, etag, last_modified,
+                                   next_url, product_urls, products, changed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (url) DO UPDATE SET
+                    category = excluded.category, crawl_id = excluded.crawl_id,
+                    fetched_at = excluded.fetched_at, content_hash = excluded.content_hash,
+                    etag = excluded.etag, last_modified = excluded.last_modified,
+                    next_url = excluded.next_url, planned_urls = NULL,
+                    product_urls = excluded.product_urls, products = excluded.products, changed = 1
+                """,
+                (url, category, self.crawl_id, time.time(), page_hash, etag, last_modified,
+                 next_url, json.dumps([product['url'] for product in products]), json.dumps(products)),
+            )
+
+    def mark_unchanged(self, url):
+        """Stamps a page whose content matched the previous crawl as done by this crawl."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET crawl_id = ?, fetched_at = ?, changed = 0 WHERE url = ?",
+                (self.crawl_id, time.time(), url),
+            )
+
+    def record_plan(self, url, planned_urls):
+        """Remembers the page list planned from a category's first page."""
+        with self._lock:
+            self._conn.execute("UPDATE pages SET planned_urls = ? WHERE url = ?", (json.dumps(planned_urls), url))
+
+    def planned_pages(self, url):
+        page = self.get_page(url)
+        if page is None or not page['planned_urls']:
+            return None
+        return json.loads(page['planned_urls'])
+
+    def next_page_url(self, url):
+        page = self.get_page(url)
+        return page['next_url'] if page is not None else None
+
+    def stored_products(self, url):
+        """The product records of a page's last parse ([] if none were stored)."""
+        page = self.get_page(url)
+        if page is None or not page['products']:
+            return []
+        return json.loads(page['products'])
+
+    def product_urls(self, url):
+        page = self.get_page(url)
+        if page is None or not page['product_urls']:
+            return []
+        return json.loads(page['product_urls'])
+
+    def summary(self):
+        """Page counts for the current crawl: fetched and changed vs unchanged."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS pages, COALESCE(SUM(changed), 0) AS changed FROM pages WHERE crawl_id = ?",
+                (self.crawl_id,),
+            ).fetchone()
+        return {'pages': row['pages'], 'changed': row['changed'], 'unchanged': row['pages'] - row['changed']}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
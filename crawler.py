@@ -0,0 +1,283 @@
+# crawler.py
+# Concurrent crawl orchestrator: spreads every (category, start URL) pair from
+# config.CATEGORIES over a bounded pool of workers. Each worker thread owns its
+# own HTTP session and leases a pooled browser only for pages that need one;
+# politeness comes from one token bucket per host shared by all workers instead
+# of per-worker sleeps.
+import argparse
+import functools
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from crawl_state import STATE_DB, CrawlState
+from driver_pool import POOL_SIZE, DriverPool
+from instrumentation import PROFILERS, configure, in_stage, stage
+from product_history import record_raw
+from product_sink import BATCH_SIZE, FORMATS, RAW_DATASET_DIR, ProductSink
+from scrapper import (DEFAULT_EXTRACTOR, EXTRACTORS, PageFetcher, create_http_session, get_extractor,
+                      plan_pagination, scrape_category_with_pagination, scrape_listing_page, site_config)
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Workers mostly wait on the network
+REQUESTS_PER_SECOND = 1.0  # Total request rate allowed against a single host
+BURST = 1  # Requests a host bucket may issue back to back after being idle
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() reserves one token and sleeps until it is
+    due, so concurrent callers are spaced out at `rate` tokens per second.
+    """
+
+    def __init__(self, rate, capacity=BURST):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token even if it is not there yet; the debt is paid by sleeping
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class HostRateLimiter:
+    """Keeps one TokenBucket per host so every worker shares the same request budget."""
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND, burst=BURST):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_second, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def wait(self, url):
+        """Blocks until a request to the URL's host is allowed."""
+        return self.bucket_for(url).acquire()
+
+def build_work_items(categories):
+    """
+    Flattens a {category: [start urls]} map into (category, start url) pairs.
+    A start URL listed more than once is only crawled once, for its first category.
+    """
+    work_items = []
+    seen = set()
+    for category_name, start_urls in categories.items():
+        for start_url in start_urls:
+            url = start_url.strip()
+            if url in seen:
+                print(f"Skipping duplicate start URL {start_url} ({category_name})")
+                continue
+            seen.add(url)
+            work_items.append((category_name, start_url))
+    return work_items
+
+def crawl_categories(categories=None, max_pages=5, workers=DEFAULT_WORKERS,
+                     requests_per_second=REQUESTS_PER_SECOND, use_http=True, browsers=POOL_SIZE,
+                     prefetch=True, extractor=DEFAULT_EXTRACTOR, sink=None, state=None):
+    """
+    Crawls all categories concurrently and returns the scraped product dicts.
+    With a sink (product_sink.ProductSink) products are streamed to it page by
+    page instead, and the returned list is empty.
+
+    Pages that need a browser lease one of `browsers` shared Chrome instances,
+    started on first use. use_http=False forces every page through the browsers.
+
+    With prefetch, the first listing page of each start URL is used to plan the
+    whole page list (scrapper.plan_pagination) and the remaining pages are fetched
+    concurrently; the last planned page continues through 'Next Page' links, in
+    case the page links only showed a window of the pages. Start URLs whose
+    pagination cannot be inferred are walked through their 'Next Page' links
+    one by one.
+
+    extractor names the scrapper.EXTRACTORS engine used to parse pages, or is
+    an engine instance (e.g. one built with explicit selectors).
+
+    With a crawl_state.CrawlState (begin_crawl() already called) pages finished
+    by an interrupted run are skipped and pages unchanged since the last crawl
+    are not re-parsed. With a sink a page only counts as fetched once its
+    products are in a complete part file, so pages whose products were still
+    buffered when a run died are fetched again. The crawl is only marked
+    finished if no page failed, so failed pages are retried by the next run.
+    """
+    if categories is None:
+        categories = site_config().CATEGORIES
+
+    work_items = build_work_items(categories)
+    rate_limiter = HostRateLimiter(requests_per_second)
+    driver_pool = DriverPool(size=browsers, warm=not use_http)
+    extraction_engine = get_extractor(extractor) if isinstance(extractor, str) else extractor
+    local = threading.local()
+    fetchers = []
+    fetchers_lock = threading.Lock()
+
+    def worker_fetcher():
+        # Each worker thread lazily builds its own session and reuses it
+        fetcher = getattr(local, 'fetcher', None)
+        if fetcher is None:
+            fetcher = PageFetcher(session=create_http_session() if use_http else None,
+                                  driver_pool=driver_pool, extractor=extraction_engine, state=state)
+            local.fetcher = fetcher
+            with fetchers_lock:
+                fetchers.append(fetcher)
+        return fetcher
+
+    def crawl_sequential(category_name, start_url, pages):
+        products = scrape_category_with_pagination(
+            None, start_url, category_name, max_pages=pages,
+            fetcher=worker_fetcher(), rate_limiter=rate_limiter, sink=sink, raise_errors=True,
+        )
+        return products, []
+
+    def crawl_first_page(category_name, start_url):
+        # Returns the page's products plus the follow-up tasks it makes possible
+        print(f"Fetching Page 1 for {category_name}: {start_url}")
+        doc, products = scrape_listing_page(worker_fetcher(), start_url, category_name, rate_limiter, sink)
+        if doc is None:
+            # Already fetched by this crawl or unchanged: the state knows its pagination
+            page_urls = state.planned_pages(start_url)
+            next_page_url = state.next_page_url(start_url)
+        elif not products:
+            print(f"No product containers found on {start_url}. Check selectors.")
+            return products, []
+        else:
+            page_urls = plan_pagination(doc, start_url, max_pages, extraction_engine)
+            next_page_url = extraction_engine.next_page_url(doc, start_url)
+            if page_urls is not None and state is not None:
+                # Queued behind the page's own record, which waits for its products to reach disk
+                record_plan = functools.partial(state.record_plan, start_url, page_urls)
+                if sink is not None:
+                    sink.after_written(record_plan)
+                else:
+                    record_plan()
+
+        if page_urls is not None:
+            page_urls = page_urls[:max_pages]
+            print(f"Planned {len(page_urls)} pages for {category_name}: {start_url}")
+            follow_ups = [(crawl_page, (category_name, url)) for url in page_urls[1:-1]]
+            if len(page_urls) > 1:
+                # The page links may only show a window of pages, so the last planned
+                # page goes on through 'Next Page' links while max_pages allows
+                follow_ups.append((crawl_sequential, (category_name, page_urls[-1], max_pages - len(page_urls) + 1)))
+            return products, follow_ups
+
+        if next_page_url and max_pages > 1:
+            return products, [(crawl_sequential, (category_name, next_page_url, max_pages - 1))]
+        return products, []
+
+    def crawl_page(category_name, url):
+        print(f"Fetching {url} for {category_name}")
+        _, products = scrape_listing_page(worker_fetcher(), url, category_name, rate_limiter, sink)
+        return products, []
+
+    all_products = []
+    product_count = 0
+    failures = 0
+    started = time.perf_counter()
+    print(f"Crawling {len(work_items)} start URLs with {workers} workers "
+          f"at {requests_per_second} requests/sec per host")
+
+    first_task = crawl_first_page if prefetch else (lambda category_name, start_url:
+                                                    crawl_sequential(category_name, start_url, max_pages))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            pending = {executor.submit(in_stage(first_task), category_name, start_url): (category_name, start_url)
+                       for category_name, start_url in work_items}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    category_name, url = pending.pop(future)
+                    try:
+                        products, follow_ups = future.result()
+                    except Exception as e:
+                        print(f"Crawl failed for {category_name} ({url}): {e}")
+                        failures += 1
+                        continue
+                    # With a sink the tasks already wrote their products to it
+                    product_count += len(products)
+                    if sink is None:
+                        all_products.extend(products)
+                    for task, task_args in follow_ups:
+                        pending[executor.submit(in_stage(task), *task_args)] = (category_name, task_args[1])
+    finally:
+        for fetcher in fetchers:
+            fetcher.close()
+        driver_pool.close()
+        if sink is not None:
+            sink.flush()
+
+    elapsed = time.perf_counter() - started
+    if sink is not None:
+        product_count = sink.rows_written
+    print(f"Crawled {product_count} products in {elapsed:.1f}s")
+    if sink is not None and failures == 0:
+        sink.mark_complete()
+    if state is not None:
+        page_summary = state.summary()
+        print(f"Pages this crawl: {page_summary['pages']} "
+              f"({page_summary['changed']} changed, {page_summary['unchanged']} unchanged)")
+        if failures == 0:
+            state.finish_crawl()
+        else:
+            print(f"{failures} tasks failed; the next run will resume this crawl")
+    pool_stats = driver_pool.stats()
+    if pool_stats['leases']:
+        print(f"Browser pool: {pool_stats['leases']} leases, {pool_stats['created']} started, "
+              f"{pool_stats['recycled']} recycled, avg wait {pool_stats['wait_avg']:.2f}s")
+    return all_products
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl all configured Banggood categories concurrently.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of concurrent workers")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Max requests per second per host")
+    parser.add_argument("--max-pages", type=int, default=5, help="Max listing pages per start URL")
+    parser.add_argument("--browsers", type=int, default=POOL_SIZE, help="Headless Chrome instances shared by the workers")
+    parser.add_argument("--selenium", action="store_true", help="Load every page in Chrome instead of HTTP first")
+    parser.add_argument("--no-prefetch", action="store_true", help="Follow 'Next Page' links instead of planning pages up front")
+    parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default=DEFAULT_EXTRACTOR, help="Page extraction engine")
+    parser.add_argument("--output", default=RAW_DATASET_DIR, help="Directory the raw product batches are streamed to")
+    parser.add_argument("--format", choices=FORMATS, default='csv', help="Part file format")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Products per flushed batch")
+    parser.add_argument("--state", default=STATE_DB, help="SQLite crawl state used to resume and skip unchanged pages")
+    parser.add_argument("--no-resume", action="store_true", help="Start a new crawl even if the last one was interrupted")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the crawl in the product price history")
+    parser.add_argument("--profile", choices=PROFILERS, help="Also dump a cProfile or sampling profile of the run")
+    args = parser.parse_args()
+    configure(profile=args.profile)
+
+    state = CrawlState(args.state)
+    state.begin_crawl(resume=not args.no_resume)
+    if state.resumed:
+        print(f"Resuming interrupted crawl {state.crawl_id}")
+
+    with stage('crawl', extractor=args.extractor) as event, \
+            ProductSink(args.output, fmt=args.format, batch_size=args.batch_size) as sink:
+        crawl_categories(max_pages=args.max_pages, workers=args.workers,
+                         requests_per_second=args.rate, use_http=not args.selenium,
+                         browsers=args.browsers, prefetch=not args.no_prefetch,
+                         extractor=args.extractor, sink=sink, state=state)
+        sink.flush()
+        event['rows'] = sink.rows_written
+    state.close()
+    print(f"Raw data streamed to {args.output} ({sink.parts_written} part files, "
+          f"{sink.duplicates_skipped} duplicate listings skipped)")
+    if not args.no_history:
+        record_raw(args.output)
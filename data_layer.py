@@ -0,0 +1,143 @@
+# data_layer.py
+# One shared, read-only copy of the cleaned dataset per process. The data is
+# kept as an uncompressed Arrow IPC file next to the cleaned output and memory
+# mapped, so the bytes live in the OS page cache rather than in each viewer's
+# session. A background thread watches the cleaned file's version (see
+# dataset.cleaned_version) and swaps in a new snapshot when clean_data.py
+# writes one; readers holding the old snapshot keep using it until they finish.
+import glob
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset import CLEANED_CSV, CLEANED_PARQUET, cleaned_source, source_signature, to_cleaned_table
+
+ARROW_CACHE_PREFIX = "banggood_products_cleaned"
+RELOAD_INTERVAL = 5.0  # Seconds between checks for a new cleaned dataset
+
+def arrow_cache_path(version, directory="."):
+    # One file per version: a memory-mapped file cannot be replaced in place on Windows
+    digest = hashlib.sha1(version.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(directory, f"{ARROW_CACHE_PREFIX}.{digest}.arrow")
+
+def build_arrow_cache(source, path):
+    """Writes the cleaned dataset at `source` (Parquet or CSV) as an uncompressed Arrow IPC file."""
+    if source.endswith('.parquet'):
+        table = pq.read_table(source)
+    else:
+        table = to_cleaned_table(pd.read_csv(source))
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def open_arrow_cache(path, columns=None):
+    """Memory-maps an Arrow IPC file; the table's buffers point into the mapping."""
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.column_names])
+    return table
+
+class DataSnapshot:
+    """
+    One version of the dataset: the memory-mapped Arrow table, a pandas view of
+    it (treat as read-only) and lazily built objects derived from it.
+    """
+
+    def __init__(self, version, table, df):
+        self.version = version
+        self.table = table
+        self.df = df
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def derived(self, name, build):
+        """build(df) once per snapshot, e.g. an index over this version's rows."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self.df)
+            return self._derived[name]
+
+class SharedDataset:
+    """
+    The cleaned dataset shared by every session. Use one snapshot() for a
+    whole request, so its figures all come from the same version.
+    """
+
+    def __init__(self, columns=None, prepare=None, reload_interval=RELOAD_INTERVAL,
+                 parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV, cache_dir="."):
+        self.columns = columns
+        self.prepare = prepare
+        self.parquet_path = parquet_path
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._snapshot = self._load(self._current_version())
+
+        self._stop = threading.Event()
+        self._watcher = None
+        if reload_interval:
+            self._watcher = threading.Thread(target=self._watch, args=(reload_interval,), daemon=True,
+                                             name="shared-dataset-reload")
+            self._watcher.start()
+
+    def _current_version(self):
+        source = cleaned_source(self.parquet_path, self.csv_path)
+        return source, source_signature(source)
+
+    def _load(self, source_version):
+        source, version = source_version
+        path = arrow_cache_path(version, self.cache_dir)
+        if not os.path.exists(path):
+            build_arrow_cache(source, path)
+        table = open_arrow_cache(path, self.columns)
+        # split_blocks lets null-free numeric columns stay views of the mapped buffers
+        df = table.to_pandas(split_blocks=True)
+        if self.prepare is not None:
+            df = self.prepare(df)
+        return DataSnapshot(version, table, df)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def check_for_update(self):
+        """Loads and swaps in a new snapshot if the cleaned dataset changed; True if it did."""
+        with self._reload_lock:
+            source_version = self._current_version()
+            if source_version[1] == self._snapshot.version:
+                return False
+            started = time.perf_counter()
+            self._snapshot = self._load(source_version)
+            self.reloads += 1
+            print(f"Reloaded cleaned dataset ({len(self._snapshot.df)} rows) in {time.perf_counter() - started:.1f}s")
+            self._remove_old_caches()
+            return True
+
+    def _remove_old_caches(self):
+        current = arrow_cache_path(self._snapshot.version, self.cache_dir)
+        for path in glob.glob(os.path.join(self.cache_dir, f"{ARROW_CACHE_PREFIX}.*.arrow")):
+            if os.path.abspath(path) != os.path.abspath(current):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still mapped by an old snapshot (Windows); retried after the next reload
+                    pass
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                # e.g. the cleaner is between writes; try again on the next tick
+                print(f"Dataset reload failed, keeping version {self._snapshot.version}: {e}")
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,101 @@
+# dataset.py
+# The cleaned product dataset as written by clean_data.py: a CSV plus a typed,
+# compressed Parquet copy. Consumers go through load_cleaned(), which prefers
+# the Parquet file and only reads the columns they ask for.
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from features import FEATURES
+
+CLEANED_CSV = "banggood_products_cleaned.csv"
+CLEANED_PARQUET = "banggood_products_cleaned.parquet"
+PARQUET_COMPRESSION = "zstd"
+
+CLEANED_SCHEMA = pa.schema([
+    ('category', pa.dictionary(pa.int32(), pa.string())),
+    ('name', pa.string()),
+    ('price_raw', pa.float32()),
+    ('rating_raw', pa.float32()),
+    ('reviews_raw', pa.int32()),
+    ('url', pa.string()),
+] + [(name, pa.float32()) for name in FEATURES])
+
+def to_cleaned_table(df):
+    """Converts a cleaned DataFrame (or chunk) to an Arrow table with CLEANED_SCHEMA."""
+    df = df.copy()
+    for field in CLEANED_SCHEMA:
+        if field.name not in df.columns:
+            df[field.name] = None
+    # Review counts can come through as float (NaN-filled) or text; store whole numbers
+    df['reviews_raw'] = pd.to_numeric(df['reviews_raw'], errors='coerce').fillna(0).astype('int32')
+    for column in ('category', 'name', 'url'):
+        df[column] = df[column].astype('string')
+    return pa.Table.from_pandas(df[CLEANED_SCHEMA.names], schema=CLEANED_SCHEMA, preserve_index=False)
+
+def open_cleaned_writer(path=CLEANED_PARQUET):
+    """ParquetWriter for streaming cleaned chunks into one file (row group per chunk)."""
+    return pq.ParquetWriter(path, CLEANED_SCHEMA, compression=PARQUET_COMPRESSION)
+
+def _parquet_is_current(parquet_path, csv_path):
+    if not os.path.exists(parquet_path):
+        return False
+    # A CSV written after the Parquet file (e.g. by an older cleaner) wins
+    return not os.path.exists(csv_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)
+
+def cleaned_source(parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV):
+    """Path of the file load_cleaned() would read: the Parquet copy when current, else the CSV."""
+    return parquet_path if _parquet_is_current(parquet_path, csv_path) else csv_path
+
+def source_signature(path):
+    """Identifies one version of a data file (path, mtime and size)."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+def cleaned_version(parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV):
+    """Version of the cleaned dataset load_cleaned() would read; changes whenever it is rewritten."""
+    return source_signature(cleaned_source(parquet_path, csv_path))
+
+def load_cleaned(columns=None, parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV):
+    """
+    Loads the cleaned dataset, reading only `columns` (those that exist).
+    Uses the typed Parquet file when it is current, otherwise the CSV.
+    """
+    if _parquet_is_current(parquet_path, csv_path):
+        if columns is not None:
+            available = set(pq.read_schema(parquet_path).names)
+            columns = [column for column in columns if column in available]
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    if columns is None:
+        return pd.read_csv(csv_path)
+    wanted = set(columns)
+    return pd.read_csv(csv_path, usecols=lambda column: column in wanted)
+
+def iter_cleaned(chunksize=100_000, columns=None, parquet_path=CLEANED_PARQUET, csv_path=CLEANED_CSV):
+    """Like load_cleaned, but yields DataFrames of at most chunksize rows."""
+    if _parquet_is_current(parquet_path, csv_path):
+        parquet = pq.ParquetFile(parquet_path)
+        if columns is not None:
+            columns = [column for column in columns if column in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    wanted = None if columns is None else set(columns)
+    usecols = None if wanted is None else (lambda column: column in wanted)
+    yield from pd.read_csv(csv_path, chunksize=chunksize, usecols=usecols)
+
+def to_parameter_rows(df, columns):
+    """
+    Rows of `columns` as tuples of plain Python values (None for missing) for
+    DB-API executemany. Review counts are sent as integers.
+    """
+    df = df.reindex(columns=columns)
+    if 'reviews_raw' in df.columns:
+        df['reviews_raw'] = pd.to_numeric(df['reviews_raw'], errors='coerce').round().astype('Int64')
+    # object dtype turns numpy scalars into plain Python values
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
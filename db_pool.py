@@ -0,0 +1,88 @@
+# db_pool.py
+# Pool of open SQL Server connections shared by main.py, the loader and the
+# Streamlit dashboard. Connections are reused across reports instead of being
+# opened per query, checked before they are handed out after sitting idle, and
+# replaced when they fail or get old.
+import time
+from contextlib import contextmanager
+
+import pyodbc
+
+from resource_pool import ResourcePool
+
+ODBC_DRIVER = 'ODBC Driver 17 for SQL Server'
+DB_POOL_SIZE = 4  # Open connections kept by the pool
+CONNECT_TIMEOUT = 15  # Seconds pyodbc waits for a new connection
+LEASE_TIMEOUT = 30  # Seconds a caller waits for a free connection before giving up
+HEALTH_CHECK_AFTER = 30  # Ping connections that sat idle longer than this (seconds)
+MAX_CONNECTION_AGE = 30 * 60  # Replace connections older than this (seconds)
+
+def connection_string(server, database, username=None, password=None, driver=ODBC_DRIVER):
+    """ODBC connection string; Windows authentication unless a SQL login is given."""
+    conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
+    if username:
+        return conn_str + f"UID={username};PWD={password or ''}"
+    return conn_str + "Trusted_Connection=yes"
+
+class PooledConnection:
+    """A pooled pyodbc connection plus the timestamps used for health checks."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+    def is_alive(self):
+        try:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def close(self):
+        try:
+            self.conn.close()
+        except pyodbc.Error as e:
+            print(f"Error while closing pooled connection: {e}")
+
+class ConnectionPool(ResourcePool):
+    """Leases open connections (PooledConnection.conn) to report queries."""
+
+    kind = 'database connection'
+    broken_errors = (pyodbc.Error,)
+
+    def __init__(self, conn_str, size=DB_POOL_SIZE, max_age=MAX_CONNECTION_AGE,
+                 health_check_after=HEALTH_CHECK_AFTER, connect_timeout=CONNECT_TIMEOUT):
+        super().__init__(size, LEASE_TIMEOUT)
+        self.conn_str = conn_str
+        self.max_age = max_age
+        self.health_check_after = health_check_after
+        self.connect_timeout = connect_timeout
+
+    def _create_resource(self):
+        return PooledConnection(pyodbc.connect(self.conn_str, timeout=self.connect_timeout))
+
+    def _is_usable(self, pooled):
+        now = time.monotonic()
+        if self.max_age and now - pooled.created_at >= self.max_age:
+            return False
+        return now - pooled.returned_at < self.health_check_after or pooled.is_alive()
+
+    def _release(self, pooled):
+        try:
+            # Leave no open transaction behind for the next caller
+            pooled.conn.rollback()
+        except pyodbc.Error:
+            return False
+        pooled.returned_at = time.monotonic()
+        return True
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Yields an open pyodbc connection, blocking until one is free."""
+        with super().lease(timeout) as pooled:
+            yield pooled.conn
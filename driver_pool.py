@@ -0,0 +1,80 @@
+# driver_pool.py
+# Pool of warm headless Chrome instances leased to scraping tasks. The
+# chromedriver binary is resolved once (see scrapper.resolve_driver_path) and
+# every browser is recycled after a page budget or memory ceiling so long
+# crawls do not accumulate leaked renderer memory.
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from resource_pool import ResourcePool
+from scrapper import initialize_driver
+
+POOL_SIZE = 2  # Warm browser instances kept by the pool
+MAX_PAGES_PER_DRIVER = 50  # Recycle a browser after this many page loads
+MAX_DRIVER_MEMORY_MB = 1024  # Recycle a browser whose process tree exceeds this RSS
+LEASE_TIMEOUT = 300  # Seconds a task waits for a free browser before giving up
+
+class PooledDriver:
+    """A pooled WebDriver plus the bookkeeping used to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.monotonic()
+
+    def memory_mb(self):
+        """Resident memory of chromedriver and every Chrome process it spawned."""
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0.0
+
+        total = 0
+        for proc in processes:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    def close(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error while quitting pooled driver: {e}")
+
+class DriverPool(ResourcePool):
+    """Leases PooledDriver instances to scraping tasks; the caller counts lease.pages."""
+
+    kind = 'browser'
+
+    def __init__(self, size=POOL_SIZE, max_pages=MAX_PAGES_PER_DRIVER, max_memory_mb=MAX_DRIVER_MEMORY_MB,
+                 headless=True, warm=True, driver_factory=None):
+        super().__init__(size, LEASE_TIMEOUT)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._factory = driver_factory or (lambda: initialize_driver(headless=headless))
+        if warm:
+            self.warm_up()
+
+    def _create_resource(self):
+        return PooledDriver(self._factory())
+
+    def warm_up(self):
+        """Starts browsers in parallel until the pool holds `size` idle instances."""
+        missing = self.size - self._idle.qsize() - self.in_use
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            for pooled in executor.map(lambda _: self._create(), range(missing)):
+                self._idle.put(pooled)
+
+    def _should_recycle(self, pooled):
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return True
+        if self.max_memory_mb and pooled.memory_mb() >= self.max_memory_mb:
+            return True
+        return False
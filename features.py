@@ -0,0 +1,64 @@
+# features.py
+# The derived product metrics, each defined once. clean_data.py computes them
+# into the cleaned output (see dataset.CLEANED_SCHEMA) and consumers read the
+# stored columns instead of recomputing them. A ratio whose denominator is 0 or
+# missing is undefined: it is stored as the feature's fill value, never inf.
+from collections import namedtuple
+
+import numpy as np
+
+Feature = namedtuple('Feature', ['name', 'numerator', 'denominator', 'fill', 'description'])
+
+FEATURES = {
+    feature.name: feature for feature in (
+        Feature('price_to_rating', 'price_raw', 'rating_raw', 0.0,
+                "How much each unit of rating costs; lower is better value"),
+        Feature('price_to_review', 'price_raw', 'reviews_raw', 0.0,
+                "How much each review costs"),
+    )
+}
+
+def _float_column(df, column, cache):
+    # Each input column is converted once, however many features use it
+    if column not in cache:
+        cache[column] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return cache[column]
+
+def defined(numerator, denominator):
+    """Where numerator / denominator is a real number (no NaN input, no zero denominator)."""
+    return (denominator != 0) & ~np.isnan(denominator) & ~np.isnan(numerator)
+
+def compute_features(df, names=None):
+    """
+    Computes the named features (default: all) from df's columns in one pass
+    over shared input arrays. Returns {name: float64 array}.
+    """
+    cache = {}
+    results = {}
+    for name in names or FEATURES:
+        feature = FEATURES[name]
+        numerator = _float_column(df, feature.numerator, cache)
+        denominator = _float_column(df, feature.denominator, cache)
+        values = np.full(len(df), feature.fill, dtype=np.float64)
+        # Divides only where defined, so no inf or warnings are produced to be cleaned up later
+        np.divide(numerator, denominator, out=values, where=defined(numerator, denominator))
+        results[name] = values
+    return results
+
+def add_features(df, names=None):
+    """Adds (or overwrites) the feature columns on df and returns it."""
+    for name, values in compute_features(df, names).items():
+        df[name] = values
+    return df
+
+def ensure_features(df, names=None):
+    """Adds only the features df does not have yet, e.g. for output written by an older clean_data.py."""
+    missing = [name for name in names or FEATURES
+               if name not in df.columns and {FEATURES[name].numerator, FEATURES[name].denominator} <= set(df.columns)]
+    return add_features(df, missing) if missing else df
+
+def is_defined(df, name):
+    """Boolean mask of the rows where the stored feature is a real ratio rather than its fill value."""
+    feature = FEATURES[name]
+    cache = {}
+    return defined(_float_column(df, feature.numerator, cache), _float_column(df, feature.denominator, cache))
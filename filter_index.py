@@ -0,0 +1,69 @@
+# filter_index.py
+# Index behind the dashboard's category / price / rating filters. Built once
+# per dataset version: row positions are partitioned by category and sorted by
+# price, so a filter is a binary search for the price range, a rating check on
+# just that slice, and a take() of the matching rows instead of masking (and
+# copying) the whole frame.
+import numpy as np
+import pandas as pd
+
+class FilterIndex:
+    """Precomputed lookups that answer the dashboard's category/price/rating filters on df."""
+
+    def __init__(self, df, category_column='category', price_column='price_raw', rating_column='rating_raw'):
+        self.size = len(df)
+        prices = df[price_column].to_numpy()
+        ratings = df[rating_column].to_numpy()
+        codes, uniques = pd.factorize(df[category_column], sort=True)
+
+        # Category code first, price second; NaN prices sort last, so the
+        # price searches below never include them (like the >= / <= masks)
+        order = np.lexsort((prices, codes))
+        sorted_codes = codes[order]
+        sorted_prices = prices[order]
+        sorted_ratings = ratings[order]
+
+        # Each category is a view into the sorted arrays (rows without a category only show under All)
+        self._partitions = {}
+        for code, category in enumerate(uniques):
+            start = np.searchsorted(sorted_codes, code, side='left')
+            stop = np.searchsorted(sorted_codes, code, side='right')
+            self._partitions[category] = (order[start:stop], sorted_prices[start:stop], sorted_ratings[start:stop])
+        # Sorted by name (categorical columns factorize in dictionary order)
+        self.categories = sorted(self._partitions, key=str)
+
+        all_order = np.argsort(prices, kind='stable')
+        self._all = (all_order, prices[all_order], ratings[all_order])
+
+        self.price_bounds = (np.nanmin(prices), np.nanmax(prices)) if self.size else (0.0, 0.0)
+        self.rating_bounds = (np.nanmin(ratings), np.nanmax(ratings)) if self.size else (0.0, 0.0)
+
+    def positions(self, category=None, price_range=None, rating_range=None):
+        """
+        Row positions (ascending, i.e. in frame order) matching the filters.
+        category None means all categories; ranges are inclusive (low, high)
+        and None skips that filter.
+        """
+        if category is None:
+            rows, prices, ratings = self._all
+        elif category in self._partitions:
+            rows, prices, ratings = self._partitions[category]
+        else:
+            return np.empty(0, dtype=np.intp)
+
+        if price_range is not None:
+            # Bounds in the column's dtype, as the comparisons in a pandas mask use them
+            low, high = (prices.dtype.type(bound) for bound in price_range)
+            start = np.searchsorted(prices, low, side='left')
+            stop = np.searchsorted(prices, high, side='right')
+            rows, ratings = rows[start:stop], ratings[start:stop]
+
+        if rating_range is not None:
+            rows = rows[(ratings >= rating_range[0]) & (ratings <= rating_range[1])]
+        return np.sort(rows)
+
+    def filter(self, df, category=None, price_range=None, rating_range=None):
+        """The rows of df (the frame the index was built from) matching the filters."""
+        if len(df) != self.size:
+            raise ValueError(f"FilterIndex was built for {self.size} rows, got a frame with {len(df)}")
+        return df.take(self.positions(category, price_range, rating_range))
@@ -0,0 +1,253 @@
+# instrumentation.py
+# Lightweight timing for the pipeline. stage() wraps a whole step (crawl, clean,
+# load, report, render) and records its wall time, row count and RSS change;
+# span() records the finer events inside one (a listing page, a SQL query, a
+# dashboard section). Every record is appended to PIPELINE_LOG as one JSON line.
+# With profiling switched on (--profile or PIPELINE_PROFILE) each stage also
+# leaves a cProfile dump or a folded-stack sampling profile in PROFILE_DIR.
+import cProfile
+import collections
+import contextvars
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import psutil
+
+PIPELINE_LOG = os.environ.get("PIPELINE_LOG", "banggood_products_pipeline.jsonl")  # Empty disables the log
+PROFILE_MODE = os.environ.get("PIPELINE_PROFILE") or None
+PROFILE_DIR = os.environ.get("PIPELINE_PROFILE_DIR", "banggood_products_profiles")
+PROFILERS = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of the 'sample' profiler
+RECENT_EVENTS = 1000  # Events kept in memory for recent_events()
+
+RUN_ID = uuid.uuid4().hex[:12]  # Ties together the records of one process
+
+_settings = {'log_path': PIPELINE_LOG, 'profile': PROFILE_MODE, 'profile_dir': PROFILE_DIR}
+_write_lock = threading.Lock()
+_recent = collections.deque(maxlen=RECENT_EVENTS)
+# Open stages (innermost last) and the outermost one's profiler, per thread /
+# context: concurrent Streamlit sessions each see only their own stages
+_stages = contextvars.ContextVar('stages', default=())
+_profiler = contextvars.ContextVar('profiler', default=None)
+
+def configure(log_path=None, profile=None, profile_dir=None):
+    """Overrides the environment defaults, e.g. from a script's --profile option."""
+    if profile is not None and profile not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profile}', expected one of {PROFILERS}")
+    if log_path is not None:
+        _settings['log_path'] = log_path
+    if profile is not None:
+        _settings['profile'] = profile
+    if profile_dir is not None:
+        _settings['profile_dir'] = profile_dir
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / 2**20
+
+def log_event(event):
+    """Stamps an event dict and appends it to the JSON log."""
+    event.setdefault('ts', time.strftime("%Y-%m-%dT%H:%M:%S"))
+    event.setdefault('run_id', RUN_ID)
+    stages = _stages.get()
+    if stages and 'stage' not in event and event.get('event') != 'stage':
+        event['stage'] = stages[-1]
+    _recent.append(event)
+    log_path = _settings['log_path']
+    if log_path:
+        line = json.dumps(event, default=str)
+        with _write_lock:
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    return event
+
+def recent_events(kind=None):
+    """Events recorded by this process (newest last), optionally of one kind."""
+    return [event for event in list(_recent) if kind is None or event.get('event') == kind]
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread (the crawl's worker threads
+    included) every SAMPLE_INTERVAL seconds and writes the counts in
+    folded-stack format (flamegraph.pl, speedscope), each stack rooted at its
+    thread's name. Unlike cProfile it adds no per-call overhead, so timings
+    stay representative.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    # Pool workers ('ThreadPoolExecutor-0_3') share one root, so their stacks add up
+                    thread_name = re.sub(r'_\d+$', '', names.get(thread_id, str(thread_id)))
+                    self.counts[";".join([thread_name] + stack[::-1])] += 1
+
+    def enable(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ThreadedProfile:
+    """
+    cProfile for the stage's thread plus the tasks it hands to worker threads
+    through in_stage(), which a plain cProfile.Profile does not see. Each
+    worker thread keeps one profile, enabled only while such a task runs; the
+    profiles are merged when dumped.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self._thread_profiles = {}
+        self._lock = threading.Lock()
+        self._enabled = False
+
+    def enable(self):
+        self._enabled = True
+        profile = cProfile.Profile()
+        profile.enable()
+        self.profiles.append(profile)
+
+    @contextmanager
+    def profile_thread(self):
+        """Profiles the calling worker thread for the duration of the block."""
+        with self._lock:
+            profile = self._thread_profiles.get(threading.get_ident()) if self._enabled else None
+            if profile is None and self._enabled:
+                profile = self._thread_profiles[threading.get_ident()] = cProfile.Profile()
+                self.profiles.append(profile)
+        try:
+            profile.enable()
+        except (AttributeError, ValueError):
+            # Not enabled, or Python 3.12+, where the stage's profile already sees every thread
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+
+    def disable(self):
+        # Worker profiles are disabled by their own threads (cProfile only
+        # stops the calling thread); here the stage's own profile is stopped
+        # and no further worker task is profiled
+        self._enabled = False
+        self.profiles[0].disable()
+
+    def dump_stats(self, path):
+        with self._lock:
+            pstats.Stats(*self.profiles).dump_stats(path)
+
+def _start_profiler():
+    mode = _settings['profile']
+    if mode is None:
+        return None
+    profiler = ThreadedProfile() if mode == 'cprofile' else SamplingProfiler()
+    profiler.enable()
+    return profiler
+
+def _dump_profile(profiler, name):
+    profiler.disable()
+    os.makedirs(_settings['profile_dir'], exist_ok=True)
+    extension = 'prof' if isinstance(profiler, ThreadedProfile) else 'folded'
+    path = os.path.join(_settings['profile_dir'], f"{RUN_ID}-{name}.{extension}")
+    profiler.dump_stats(path)
+    return path
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Times one pipeline stage. Yields the event dict, so the caller can add
+    figures such as event['rows'] before it is logged.
+    """
+    event = {'event': 'stage', 'name': name, **fields}
+    outermost = not _stages.get()
+    stages_token = _stages.set(_stages.get() + (name,))
+    rss_before = _rss_mb()
+    # Only the outermost stage is profiled; its profile covers the nested ones
+    profiler = _start_profiler() if outermost else None
+    profiler_token = _profiler.set(profiler) if outermost else None
+    started = time.perf_counter()
+    try:
+        yield event
+    except BaseException as e:
+        event['error'] = repr(e)
+        raise
+    finally:
+        event['seconds'] = round(time.perf_counter() - started, 4)
+        if profiler is not None:
+            event['profile'] = _dump_profile(profiler, name)
+        rss_after = _rss_mb()
+        event['rss_mb'] = round(rss_after, 1)
+        event['rss_delta_mb'] = round(rss_after - rss_before, 1)
+        if profiler_token is not None:
+            _profiler.reset(profiler_token)
+        _stages.reset(stages_token)
+        log_event(event)
+        rows = f", {event['rows']:,} rows" if isinstance(event.get('rows'), int) else ""
+        print(f"[{name}] {event['seconds']:.2f}s{rows}, RSS {event['rss_mb']:.0f} MB ({event['rss_delta_mb']:+.0f} MB)")
+
+def in_stage(fn):
+    """
+    Wraps fn to run under the caller's open stages, e.g. as a ThreadPoolExecutor
+    task: its spans are attributed to the stage and, when the stage is being
+    profiled with cProfile, its calls are profiled too.
+    """
+    stages = _stages.get()
+    profiler = _profiler.get()
+
+    def run(*args, **kwargs):
+        stages_token = _stages.set(stages)
+        try:
+            if isinstance(profiler, ThreadedProfile):
+                with profiler.profile_thread():
+                    return fn(*args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            _stages.reset(stages_token)
+    return run
+
+@contextmanager
+def span(kind, name, **fields):
+    """
+    Times one event inside a stage (kind 'page', 'query', 'render', ...) and
+    logs it. Cheap enough to wrap every page or query; no memory or profiling.
+    """
+    event = {'event': kind, 'name': name, **fields}
+    started = time.perf_counter()
+    try:
+        yield event
+    except BaseException as e:
+        event['error'] = repr(e)
+        raise
+    finally:
+        event['seconds'] = round(time.perf_counter() - started, 6)
+        log_event(event)
@@ -0,0 +1,214 @@
+# load_products.py
+# Loads the cleaned dataset into the SQL Server Products table that main.py and
+# the dashboard report on. Rows are streamed in batches into a session temp
+# table with fast_executemany, then upserted by product url with one MERGE.
+# The reporting indexes are dropped for the load and built once afterwards,
+# and the materialized category summary is refreshed for the touched categories.
+import argparse
+import time
+
+import pyodbc
+
+from category_summary import mark_products_changed, refresh_category_summary, summary_status
+from dataset import iter_cleaned, to_parameter_rows
+from db_pool import ConnectionPool, connection_string
+from instrumentation import PROFILERS, configure, stage
+from reports import TOP_REVIEWED_INDEX, ensure_report_indexes
+
+LOAD_BATCH_SIZE = 50_000  # Rows sent to the server per executemany call
+LOAD_COLUMNS = ['category', 'name', 'price_raw', 'rating_raw', 'reviews_raw', 'url']
+CATEGORY_LENGTH = 255
+NAME_LENGTH = 1000
+URL_LENGTH = 850  # Longest NVARCHAR that still fits a nonclustered index key
+
+CREATE_PRODUCTS_SQL = f"""
+IF OBJECT_ID('Products', 'U') IS NULL
+BEGIN
+    CREATE TABLE Products (
+        product_id  INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_Products PRIMARY KEY,
+        category    NVARCHAR({CATEGORY_LENGTH}) NULL,
+        name        NVARCHAR({NAME_LENGTH}) NULL,
+        price_raw   FLOAT NULL,
+        rating_raw  FLOAT NULL,
+        reviews_raw INT NULL,
+        url         NVARCHAR({URL_LENGTH}) NOT NULL
+    );
+    CREATE UNIQUE INDEX UX_Products_url ON Products (url);
+END
+"""
+
+CREATE_STAGING_SQL = f"""
+CREATE TABLE #ProductsStaging (
+    seq         INT IDENTITY(1,1) NOT NULL,
+    category    NVARCHAR({CATEGORY_LENGTH}) NULL,
+    name        NVARCHAR({NAME_LENGTH}) NULL,
+    price_raw   FLOAT NULL,
+    rating_raw  FLOAT NULL,
+    reviews_raw INT NULL,
+    url         NVARCHAR({URL_LENGTH}) NOT NULL
+);
+"""
+
+INSERT_STAGING_SQL = (
+    "INSERT INTO #ProductsStaging (category, name, price_raw, rating_raw, reviews_raw, url) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# Parameter sizes matching the staging columns, so fast_executemany does not
+# have to guess (or re-bind) buffer sizes from the first rows
+STAGING_INPUT_SIZES = [
+    (pyodbc.SQL_WVARCHAR, CATEGORY_LENGTH, 0),
+    (pyodbc.SQL_WVARCHAR, NAME_LENGTH, 0),
+    (pyodbc.SQL_DOUBLE, 0, 0),
+    (pyodbc.SQL_DOUBLE, 0, 0),
+    (pyodbc.SQL_INTEGER, 0, 0),
+    (pyodbc.SQL_WVARCHAR, URL_LENGTH, 0),
+]
+
+# A url that appears more than once keeps its last row. Rows whose values did
+# not change are left alone (EXCEPT compares NULLs as equal).
+MERGE_SQL = """
+SET NOCOUNT ON;
+DECLARE @actions TABLE (action NVARCHAR(10), new_category NVARCHAR(255), old_category NVARCHAR(255));
+
+MERGE Products AS target
+USING (
+    SELECT category, name, price_raw, rating_raw, reviews_raw, url
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY url ORDER BY seq DESC) AS copy
+        FROM #ProductsStaging
+    ) staged
+    WHERE copy = 1
+) AS source
+ON target.url = source.url
+WHEN MATCHED AND EXISTS (
+    SELECT source.category, source.name, source.price_raw, source.rating_raw, source.reviews_raw
+    EXCEPT
+    SELECT target.category, target.name, target.price_raw, target.rating_raw, target.reviews_raw
+) THEN UPDATE SET
+    category = source.category, name = source.name, price_raw = source.price_raw,
+    rating_raw = source.rating_raw, reviews_raw = source.reviews_raw
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT (category, name, price_raw, rating_raw, reviews_raw, url)
+    VALUES (source.category, source.name, source.price_raw, source.rating_raw, source.reviews_raw, source.url)
+OUTPUT $action, inserted.category, deleted.category INTO @actions;
+
+SELECT COALESCE(SUM(CASE WHEN action = 'INSERT' THEN 1 ELSE 0 END), 0) AS inserted,
+       COALESCE(SUM(CASE WHEN action = 'UPDATE' THEN 1 ELSE 0 END), 0) AS updated
+FROM @actions;
+
+-- Categories whose summary rows the merge invalidated (a moved product touches both)
+SELECT new_category FROM @actions WHERE new_category IS NOT NULL
+UNION
+SELECT old_category FROM @actions WHERE old_category IS NOT NULL;
+"""
+
+DROP_REPORT_INDEX_SQL = f"DROP INDEX IF EXISTS {TOP_REVIEWED_INDEX} ON Products;"
+
+def batch_rows(df):
+    """
+    Turns a cleaned chunk into parameter tuples for the staging insert. Rows
+    without a usable url are dropped, since url is the upsert key.
+    """
+    df = df.reindex(columns=LOAD_COLUMNS)
+    df = df[df['url'].notna() & (df['url'].astype('string').str.len() <= URL_LENGTH)]
+    df = df.astype({'category': 'string', 'name': 'string', 'url': 'string'})
+    df['category'] = df['category'].str.slice(0, CATEGORY_LENGTH)
+    df['name'] = df['name'].str.slice(0, NAME_LENGTH)
+    return to_parameter_rows(df, LOAD_COLUMNS)
+
+def load_products(conn, batch_size=LOAD_BATCH_SIZE, rebuild_indexes=True):
+    """
+    Upserts the cleaned dataset into Products and returns a summary dict with
+    row counts and timings.
+    """
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_PRODUCTS_SQL)
+        conn.commit()
+
+        cursor.execute(CREATE_STAGING_SQL)
+        cursor.fast_executemany = True
+
+        staged = skipped = 0
+        for chunk in iter_cleaned(chunksize=batch_size, columns=LOAD_COLUMNS):
+            rows = batch_rows(chunk)
+            skipped += len(chunk) - len(rows)
+            if not rows:
+                continue
+            cursor.setinputsizes(STAGING_INPUT_SIZES)
+            cursor.executemany(INSERT_STAGING_SQL, rows)
+            staged += len(rows)
+            elapsed = time.perf_counter() - started
+            print(f"Staged {staged} rows ({staged / elapsed:,.0f} rows/s)")
+        staging_seconds = time.perf_counter() - started
+
+        if rebuild_indexes:
+            cursor.execute(DROP_REPORT_INDEX_SQL)
+
+        merge_started = time.perf_counter()
+        cursor.execute(MERGE_SQL)
+        inserted, updated = cursor.fetchone()
+        cursor.nextset()
+        touched_categories = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DROP TABLE #ProductsStaging;")
+        merge_seconds = time.perf_counter() - merge_started
+
+        # Refresh the materialized summary in the same transaction as the merge;
+        # only the touched categories unless it was already stale
+        status = summary_status(conn)
+        refresh_categories = touched_categories if status is not None and status['fresh'] else None
+        mark_products_changed(conn)
+        status = refresh_category_summary(conn, categories=refresh_categories)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    index_started = time.perf_counter()
+    ensure_report_indexes(conn)
+    index_seconds = time.perf_counter() - index_started
+
+    total_seconds = time.perf_counter() - started
+    summary = {
+        'staged': staged,
+        'skipped': skipped,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': staged - inserted - updated,
+        'staging_seconds': staging_seconds,
+        'merge_seconds': merge_seconds,
+        'index_seconds': index_seconds,
+        'total_seconds': total_seconds,
+        'rows_per_second': staged / total_seconds if total_seconds else 0.0,
+        'summary': status,
+    }
+    print(f"Loaded {staged} rows in {total_seconds:.1f}s ({summary['rows_per_second']:,.0f} rows/s): "
+          f"{inserted} inserted, {updated} updated, {summary['unchanged']} unchanged or duplicate, "
+          f"{skipped} skipped without a usable url")
+    print(f"Staging {staging_seconds:.1f}s, merge {merge_seconds:.1f}s, indexes {index_seconds:.1f}s")
+    print(f"Category summary refreshed for {status['refreshed_categories']} categories "
+          f"in {status['refresh_seconds']:.2f}s ({status['categories']} categories, {status['products']} products)")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the cleaned Banggood products into SQL Server.")
+    parser.add_argument("--server", default='DESKTOP-09847JI', help="SQL Server instance")
+    parser.add_argument("--database", default='BanggoodProducts', help="Database holding the Products table")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE, help="Rows sent per executemany call")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="Maintain the reporting indexes during the merge instead of rebuilding them afterwards")
+    parser.add_argument("--profile", choices=PROFILERS, help="Also dump a cProfile or sampling profile of the run")
+    args = parser.parse_args()
+    configure(profile=args.profile)
+
+    pool = ConnectionPool(connection_string(args.server, args.database), size=1)
+    try:
+        with stage('load', backend='sqlserver') as event, pool.lease() as conn:
+            summary = load_products(conn, args.batch_size, rebuild_indexes=not args.keep_indexes)
+            event.update(rows=summary['staged'], inserted=summary['inserted'], updated=summary['updated'])
+    finally:
+        pool.close()
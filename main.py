@@ -1,83 +1,66 @@
-import pyodbc
-import pandas as pd
+import argparse
 
-# Load the cleaned data into a DataFrame
-df = pd.read_csv("banggood_products_cleaned.csv")
+from backends import BACKENDS, DEFAULT_BACKEND, get_backend
+from instrumentation import PROFILERS, configure, stage
+from reports import TOP_N, ensure_report_indexes, run_category_report
 
-# SQL Server connection details
-server = 'DESKTOP-09847JI'  # e.g., 'localhost\SQLEXPRESS'
-database = 'BanggoodProducts'  # Your database name
+parser = argparse.ArgumentParser(description="Print the per-category product report.")
+parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                    help="Local SQLite copy of the cleaned data, or the SQL Server Products table")
+parser.add_argument('--server', default='DESKTOP-09847JI', help="SQL Server instance (sqlserver backend)")
+parser.add_argument('--database', default='BanggoodProducts', help="SQL Server database (sqlserver backend)")
+parser.add_argument('--top-n', type=int, default=TOP_N, help="Top reviewed products to list per category")
+parser.add_argument('--create-index', action='store_true',
+                    help="Create the (category, reviews_raw) index behind the top reviewed query if missing")
+parser.add_argument('--profile', choices=PROFILERS, help="Also dump a cProfile or sampling profile of the run")
+args = parser.parse_args()
+configure(profile=args.profile)
 
-# Establish the connection to SQL Server using Windows Authentication
-conn = pyodbc.connect(f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes')
-cursor = conn.cursor()
+if args.backend == 'sqlserver':
+    # Windows Authentication against the given server
+    backend = get_backend('sqlserver', server=args.server, database=args.database, size=1)
+else:
+    backend = get_backend(args.backend)
 
-# Establish the connection to SQL Server using Windows Authentication
-conn = pyodbc.connect(f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes')
-cursor = conn.cursor()
+with stage('report', backend=backend.dialect) as event, backend.lease() as conn:
+    if args.create_index:
+        ensure_report_indexes(conn, backend.dialect)
+
+    # Average price, average rating, product count and stock availability come from
+    # one grouped scan; the top reviewed products per category from the same round trip
+    report = run_category_report(conn, top_n=args.top_n, dialect=backend.dialect)
+    event['rows'] = len(report.summary) + len(report.top_reviewed)
+summary = report.summary
+
+if report.from_summary:
+    print("(Per-category metrics read from the materialized summary)\n")
+else:
+    print("(Per-category metrics computed from Products; the materialized summary is stale or missing)\n")
 
 # 1. Average price per category
-cursor.execute("""
-    SELECT category, 
-           AVG(price_raw) AS average_price
-    FROM Products
-    GROUP BY category;
-""")
-average_price_per_category = cursor.fetchall()
 print("Average Price per Category:")
-for row in average_price_per_category:
+for row in summary.itertuples():
     print(f"Category: {row.category}, Average Price: {row.average_price}")
 
 # 2. Average rating per category
-cursor.execute("""
-    SELECT category, 
-           AVG(rating_raw) AS average_rating
-    FROM Products
-    GROUP BY category;
-""")
-average_rating_per_category = cursor.fetchall()
 print("\nAverage Rating per Category:")
-for row in average_rating_per_category:
+for row in summary.itertuples():
     print(f"Category: {row.category}, Average Rating: {row.average_rating}")
 
 # 3. Product count per category
-cursor.execute("""
-    SELECT category, 
-           COUNT(*) AS product_count
-    FROM Products
-    GROUP BY category;
-""")
-product_count_per_category = cursor.fetchall()
 print("\nProduct Count per Category:")
-for row in product_count_per_category:
+for row in summary.itertuples():
     print(f"Category: {row.category}, Product Count: {row.product_count}")
 
-# 4. Top 5 reviewed items per category
-cursor.execute("""
-    SELECT category, 
-           name, 
-           reviews_raw
-    FROM Products
-    WHERE reviews_raw > 0
-    ORDER BY reviews_raw DESC;
-""")
-top_reviewed_products = cursor.fetchall()
-print("\nTop 5 Reviewed Products per Category:")
-for row in top_reviewed_products:
-    print(f"Category: {row.category}, Product: {row.name}, Reviews: {row.reviews_raw}")
+# 4. Top N reviewed items per category
+print(f"\nTop {args.top_n} Reviewed Products per Category:")
+for row in report.top_reviewed.itertuples():
+    print(f"Category: {row.category}, #{row.review_rank} Product: {row.name}, Reviews: {row.reviews_raw}")
 
 # 5. Stock availability percentage (Using reviews as proxy)
-cursor.execute("""
-    SELECT category, 
-           (COUNT(CASE WHEN reviews_raw > 0 THEN 1 END) / COUNT(*)) * 100 AS stock_availability_percentage
-    FROM Products
-    GROUP BY category;
-""")
-stock_availability = cursor.fetchall()
 print("\nStock Availability Percentage:")
-for row in stock_availability:
+for row in summary.itertuples():
     print(f"Category: {row.category}, Stock Availability Percentage: {row.stock_availability_percentage}%")
 
-# Close the connection
-cursor.close()
-conn.close()
\ No newline at end of file
+# Close the connection(s)
+backend.close()
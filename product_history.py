@@ -0,0 +1,262 @@
+# product_history.py
+# Price, rating and review history per product across crawls. Products are
+# identified by product_identity.product_key and numbered in a small identity
+# index (one row per product, with its latest values). Each crawl appends one
+# Parquet part holding only the products that are new or whose price, rating or
+# review count changed since they were last seen, so the history grows with
+# the changes instead of with a full snapshot per crawl.
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from clean_data import parse_price, parse_rating
+from product_identity import product_key, product_keys
+from product_sink import RAW_DATASET_DIR, list_crawls, read_part
+
+HISTORY_DIR = "banggood_products_history"
+IDENTITY_FILE = "identity.parquet"
+OBSERVATIONS_DIR = "observations"  # One part per recorded crawl, named after its crawl_id
+STAGED_PREFIX = "_"  # Parts not yet committed; pyarrow datasets skip files starting with '_'
+TRACKED_COLUMNS = ['price', 'rating', 'reviews']
+
+IDENTITY_SCHEMA = pa.schema([
+    ('product_id', pa.int64()),
+    ('product_key', pa.string()),
+    ('url', pa.string()),
+    ('category', pa.string()),
+    ('name', pa.string()),
+    ('first_seen', pa.timestamp('s')),
+    ('last_seen', pa.timestamp('s')),
+    ('price', pa.float32()),
+    ('rating', pa.float32()),
+    ('reviews', pa.int32()),
+])
+
+OBSERVATION_SCHEMA = pa.schema([
+    ('product_id', pa.int64()),
+    ('observed_at', pa.timestamp('s')),
+    ('price', pa.float32()),
+    ('rating', pa.float32()),
+    ('reviews', pa.int32()),
+])
+
+def _empty(schema):
+    return schema.empty_table().to_pandas()
+
+def crawl_time(crawl_id):
+    """When a ProductSink crawl started, from its crawl_id ('part-YYYYmmddHHMMSSffffff-pid-random')."""
+    started = crawl_id.split('-')[1]
+    # Crawls written before the microseconds were added
+    return pd.Timestamp(datetime.strptime(started, '%Y%m%d%H%M%S%f' if len(started) > 14 else '%Y%m%d%H%M%S'))
+
+def parse_observations(raw):
+    """Raw scraped rows (product_sink.RAW_COLUMNS) -> url, category, name and parsed tracked values."""
+    return pd.DataFrame({
+        'url': raw['url'],
+        'category': raw['category'] if 'category' in raw.columns else None,
+        'name': raw['name'] if 'name' in raw.columns else None,
+        'price': parse_price(raw['price_raw']).astype(np.float32),
+        'rating': parse_rating(raw['rating_raw']).astype(np.float32),
+        'reviews': pd.to_numeric(raw['reviews_raw'], errors='coerce').fillna(0).astype(np.int32),
+    })
+
+def _same(old, new):
+    # NaN equals NaN: a price that stays missing is not a change
+    return (old == new) | (old.isna() & new.isna())
+
+class ProductHistory:
+    """The history directory: the identity index plus one observations part per recorded crawl."""
+
+    def __init__(self, path=HISTORY_DIR):
+        self.path = path
+        self.identity_path = os.path.join(path, IDENTITY_FILE)
+        self.observations_dir = os.path.join(path, OBSERVATIONS_DIR)
+        os.makedirs(self.observations_dir, exist_ok=True)
+
+    def identity(self):
+        """One row per known product: its id, key and latest values."""
+        if not os.path.exists(self.identity_path):
+            return _empty(IDENTITY_SCHEMA)
+        return pq.read_table(self.identity_path).to_pandas()
+
+    def recorded_crawls(self):
+        """Crawls whose observations and identity update are both written (staged parts don't count)."""
+        return {name[:-len('.parquet')] for name in os.listdir(self.observations_dir)
+                if name.endswith('.parquet') and not name.startswith(STAGED_PREFIX)}
+
+    def identity_crawl(self):
+        """The crawl_id of the last crawl applied to the identity index, or None."""
+        if not os.path.exists(self.identity_path):
+            return None
+        crawl_id = (pq.read_schema(self.identity_path).metadata or {}).get(b'crawl_id')
+        return crawl_id.decode() if crawl_id else None
+
+    def _part_path(self, crawl_id, staged=False):
+        return os.path.join(self.observations_dir, f"{STAGED_PREFIX if staged else ''}{crawl_id}.parquet")
+
+    def _write(self, df, schema, path, metadata=None):
+        # Written aside and renamed, so readers never see a partial file
+        tmp_path = f"{path}.tmp"
+        table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def _next_id(self, identity):
+        # Also past any id in the history, so an id is never handed out twice
+        last = int(identity['product_id'].max()) if len(identity) else 0
+        if self.recorded_crawls():
+            ids = ds.dataset(self.observations_dir, format="parquet", schema=OBSERVATION_SCHEMA) \
+                .to_table(columns=['product_id']).column('product_id')
+            if len(ids):
+                last = max(last, pc.max(ids).as_py())
+        return last + 1
+
+    def record(self, observations, observed_at, crawl_id):
+        """
+        Records one crawl's observations (see parse_observations). Rows of the
+        same product are collapsed to the last one; only new and changed
+        products are appended to the history. Returns a summary dict, or None
+        when it only completed an interrupted recording of the same crawl.
+        """
+        if crawl_id in self.recorded_crawls():
+            raise ValueError(f"Crawl {crawl_id} is already recorded")
+        staged_path = self._part_path(crawl_id, staged=True)
+        if self.identity_crawl() == crawl_id and os.path.exists(staged_path):
+            # A previous attempt got as far as the identity rewrite; only the rename is missing
+            os.replace(staged_path, self._part_path(crawl_id))
+            print(f"Recorded crawl {crawl_id}: completed an interrupted recording")
+            return None
+        observed_at = pd.Timestamp(observed_at).floor('s')
+        observations = observations.assign(product_key=product_keys(observations['url']))
+        observations = observations[observations['product_key'].notna()]
+        seen = observations.drop_duplicates('product_key', keep='last')
+
+        identity = self.identity()
+        merged = seen.merge(identity[['product_key', 'product_id'] + TRACKED_COLUMNS], on='product_key', how='left',
+                            suffixes=('', '_last'))
+        is_new = merged['product_id'].isna().to_numpy()
+        unchanged = ~is_new
+        for column in TRACKED_COLUMNS:
+            unchanged &= _same(merged[f"{column}_last"], merged[column]).to_numpy()
+
+        next_id = self._next_id(identity)
+        merged.loc[is_new, 'product_id'] = np.arange(next_id, next_id + int(is_new.sum()))
+        merged['product_id'] = merged['product_id'].astype(np.int64)
+        merged['observed_at'] = observed_at
+
+        # The changes are staged under a name the readers and recorded_crawls() ignore,
+        # then the identity index is rewritten (tagged with this crawl_id), and only
+        # then is the part renamed into place. A failure before the identity rewrite
+        # leaves the crawl unrecorded, so it is recomputed from scratch next time; a
+        # failure after it is finished by the rename at the top of the next attempt.
+        changes = merged[~unchanged]
+        self._write(changes, OBSERVATION_SCHEMA, staged_path)
+
+        latest = merged.drop(columns=[f"{column}_last" for column in TRACKED_COLUMNS]).assign(last_seen=observed_at)
+        kept = identity[~identity['product_key'].isin(latest['product_key'])]
+        first_seen = identity.set_index('product_key')['first_seen']
+        latest['first_seen'] = latest['product_key'].map(first_seen).fillna(observed_at)
+        frames = [frame for frame in (kept, latest[IDENTITY_SCHEMA.names]) if len(frame)]
+        updated = pd.concat(frames, ignore_index=True) if frames else latest[IDENTITY_SCHEMA.names]
+        self._write(updated.sort_values('product_id'), IDENTITY_SCHEMA, self.identity_path,
+                    metadata={b'crawl_id': crawl_id.encode()})
+        os.replace(staged_path, self._part_path(crawl_id))
+
+        summary = {
+            'observed': len(observations),
+            'duplicates': len(observations) - len(seen),
+            'new': int(is_new.sum()),
+            'changed': int((~unchanged & ~is_new).sum()),
+            'unchanged': int(unchanged.sum()),
+        }
+        print(f"Recorded crawl {crawl_id}: {summary['new']} new, {summary['changed']} changed, "
+              f"{summary['unchanged']} unchanged products ({summary['duplicates']} duplicate rows dropped)")
+        return summary
+
+    def observations(self, product_ids=None, since=None, until=None):
+        """History rows (product_id, observed_at, price, rating, reviews), oldest first per product."""
+        if not self.recorded_crawls():
+            return _empty(OBSERVATION_SCHEMA)
+        condition = None
+        for part in (
+            ds.field('product_id').isin(pa.array(list(product_ids), pa.int64())) if product_ids is not None else None,
+            ds.field('observed_at') >= pa.scalar(pd.Timestamp(since), pa.timestamp('s')) if since is not None else None,
+            ds.field('observed_at') <= pa.scalar(pd.Timestamp(until), pa.timestamp('s')) if until is not None else None,
+        ):
+            if part is not None:
+                condition = part if condition is None else condition & part
+        dataset = ds.dataset(self.observations_dir, format="parquet", schema=OBSERVATION_SCHEMA)
+        df = dataset.to_table(filter=condition).to_pandas()
+        return df.sort_values(['product_id', 'observed_at'], ignore_index=True)
+
+    def product_history(self, url):
+        """Every recorded change of one product, looked up by any of its URLs."""
+        identity = self.identity()
+        match = identity.loc[identity['product_key'] == product_key(url), 'product_id']
+        if match.empty:
+            return _empty(OBSERVATION_SCHEMA)
+        return self.observations(product_ids=match.tolist())
+
+    def as_of(self, when):
+        """The catalog as it was at `when`: each product's last recorded values up to then."""
+        df = self.observations(until=when)
+        latest = df.drop_duplicates('product_id', keep='last')
+        identity = self.identity()[['product_id', 'product_key', 'url', 'category', 'name']]
+        return latest.merge(identity, on='product_id', how='left')
+
+def record_raw(raw_input=RAW_DATASET_DIR, history=None):
+    """
+    Records every crawl in a ProductSink directory that is not in the history
+    yet, oldest first; a single raw CSV/Parquet file counts as one crawl taken
+    at its modification time. Returns the number of crawls recorded.
+    """
+    history = history or ProductHistory()
+    columns = ['category', 'name', 'price_raw', 'rating_raw', 'reviews_raw', 'url']
+    if os.path.isdir(raw_input):
+        crawls = [(crawl_id, parts, crawl_time(crawl_id)) for crawl_id, parts in list_crawls(raw_input).items()]
+    else:
+        modified = os.path.getmtime(raw_input)
+        crawl_id = f"file-{os.path.basename(raw_input)}-{int(modified)}"
+        crawls = [(crawl_id, [raw_input], pd.Timestamp(modified, unit='s'))]
+
+    recorded = history.recorded_crawls()
+    last_seen = history.identity()['last_seen'].max()
+    count = 0
+    for crawl_id, parts, observed_at in crawls:
+        if crawl_id in recorded:
+            continue
+        if pd.notna(last_seen) and observed_at < last_seen:
+            print(f"Skipping crawl {crawl_id}: older than the latest recorded crawl ({last_seen})")
+            continue
+        started = time.perf_counter()
+        raw = pd.concat([read_part(part, columns) for part in parts], ignore_index=True)
+        history.record(parse_observations(raw), observed_at, crawl_id)
+        print(f"  ({len(raw)} rows in {time.perf_counter() - started:.1f}s)")
+        count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record crawls into, or query, the product history.")
+    parser.add_argument("--raw", default=RAW_DATASET_DIR, help="Crawl directory (or raw file) to record")
+    parser.add_argument("--history", default=HISTORY_DIR, help="History directory")
+    parser.add_argument("--product", metavar="URL", help="Print the history of one product instead of recording")
+    args = parser.parse_args()
+
+    history = ProductHistory(args.history)
+    if args.product:
+        print(history.product_history(args.product).to_string(index=False))
+    else:
+        recorded = record_raw(args.raw, history)
+        identity = history.identity()
+        print(f"Recorded {recorded} new crawls; {len(identity)} products known, "
+              f"{len(history.observations())} history rows")
@@ -0,0 +1,60 @@
+# product_identity.py
+# One key per product, however the scraper reached it. The same product is
+# listed under several subcategories and its links carry tracking parameters
+# (e.g. ?rmmds=category), so raw URLs are normalized to a canonical form and,
+# where the URL carries Banggood's numeric product id ("...-p-1234567.html"),
+# keyed by that id so a renamed slug is still the same product.
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import numpy as np
+import pandas as pd
+
+PRODUCT_ID_PATTERN = re.compile(r'-p-(\d+)\.html$', re.IGNORECASE)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonical_url(url):
+    """
+    The URL without query string and fragment, with scheme and host lowercased
+    and a default port dropped. None (or NaN) stays None.
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    netloc = host if parts.port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{parts.port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', '', ''))
+
+def product_key(url):
+    """'id:<product id>' when the URL has one, else its canonical URL; None without a URL."""
+    url = canonical_url(url)
+    if url is None:
+        return None
+    match = PRODUCT_ID_PATTERN.search(url)
+    return f"id:{match.group(1)}" if match else url
+
+def product_keys(urls):
+    """product_key for a Series of URLs, computed once per distinct URL."""
+    codes, uniques = pd.factorize(urls)
+    keys = np.array([product_key(url) for url in uniques] + [None], dtype=object)  # Last slot serves code -1
+    return pd.Series(keys[codes], index=urls.index, name='product_key')
+
+def key_hashes(keys):
+    """uint64 hashes of product keys, for compact in-memory dedup; missing keys hash to 0."""
+    hashes = pd.util.hash_array(keys.fillna('').to_numpy(dtype=object))
+    hashes[keys.isna().to_numpy()] = 0
+    return hashes
+
+def last_occurrences(hashes):
+    """
+    Boolean mask keeping the last row of every product (the newest when rows
+    are in crawl order). Rows without a key (hash 0) are always kept.
+    """
+    hashes = np.asarray(hashes)
+    keep = np.zeros(len(hashes), dtype=bool)
+    # np.unique reports first occurrences, so search the reversed array
+    _, first_in_reversed = np.unique(hashes[::-1], return_index=True)
+    keep[len(hashes) - 1 - first_in_reversed] = True
+    keep[hashes == 0] = True
+    return keep
@@ -0,0 +1,218 @@
+# product_sink.py
+# Streams scraped products to disk while the crawl runs. Products are buffered
+# and flushed in fixed-size batches; every batch becomes its own part file in
+# the output directory, written to a temporary name and renamed into place, so
+# readers (e.g. clean_data.py) only ever see complete batches, even mid-crawl.
+# A product seen twice in one crawl (e.g. listed under two subcategories) is
+# only written once, with its canonical URL (see product_identity.py).
+import collections
+import glob
+import itertools
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from product_identity import canonical_url, product_key
+
+RAW_DATASET_DIR = "banggood_products_raw"  # Part-file directory written by the crawler
+BATCH_SIZE = 500  # Products buffered before a batch is flushed to a part file
+FORMATS = ('csv', 'parquet')
+COMPLETE_SUFFIX = '.complete'  # Marker file of a crawl that finished without failed pages
+
+# Scraper field names -> column names expected by clean_data.py
+RAW_COLUMNS = {
+    'category': 'category',
+    'product_name': 'name',
+    'price': 'price_raw',
+    'rating': 'rating_raw',
+    'reviews_count': 'reviews_raw',
+    'url': 'url',
+}
+
+RAW_SCHEMA = pa.schema([
+    ('category', pa.string()),
+    ('name', pa.string()),
+    ('price_raw', pa.string()),
+    ('rating_raw', pa.float64()),
+    ('reviews_raw', pa.int64()),
+    ('url', pa.string()),
+])
+
+def products_to_frame(products):
+    """Converts scraper product dicts to a DataFrame with the raw column names."""
+    return pd.DataFrame(products, columns=list(RAW_COLUMNS)).rename(columns=RAW_COLUMNS)
+
+class ProductSink:
+    """Thread-safe, append-only writer of scraped products; one sink per crawl."""
+
+    def __init__(self, path=RAW_DATASET_DIR, fmt='csv', batch_size=BATCH_SIZE, dedupe=True):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown sink format '{fmt}', expected one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.dedupe = dedupe
+        self.rows_written = 0
+        self.parts_written = 0
+        self.duplicates_skipped = 0
+        self._buffer = []
+        self._buffered = 0  # Products ever buffered; a callback waits until rows_written reaches its mark
+        self._callbacks = collections.deque()  # (mark, callback), oldest first
+        self._seen = set()
+        self._lock = threading.Lock()
+        # Unique per sink so several crawls can append to the same directory, and
+        # sortable by start time (microseconds, so crawls of the same second keep their order)
+        self._prefix = f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._sequence = itertools.count(1)
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def crawl_id(self):
+        """Prefix shared by this sink's part files (see list_crawls)."""
+        return self._prefix
+
+    def _unseen(self, products):
+        # Canonical URLs, and the first record of each product key in this crawl
+        unseen = []
+        for product in products:
+            product = dict(product, url=canonical_url(product.get('url')))
+            key = product_key(product['url'])
+            if key is not None:
+                if key in self._seen:
+                    self.duplicates_skipped += 1
+                    continue
+                self._seen.add(key)
+            unseen.append(product)
+        return unseen
+
+    def write(self, products, on_written=None):
+        """
+        Buffers products and flushes every full batch to disk. on_written, if
+        given, is called once these products (and all written before them) are
+        in complete part files, e.g. to mark their page as done.
+        """
+        with self._lock:
+            products = self._unseen(products) if self.dedupe else products
+            self._buffer.extend(products)
+            self._buffered += len(products)
+            if on_written is not None:
+                self._callbacks.append((self._buffered, on_written))
+            while len(self._buffer) >= self.batch_size:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self._write_part(batch)
+            self._run_callbacks()
+
+    def after_written(self, callback):
+        """Calls callback once everything written to the sink so far is on disk."""
+        self.write([], on_written=callback)
+
+    def flush(self):
+        """Writes whatever is buffered, even if it is less than a full batch."""
+        with self._lock:
+            if self._buffer:
+                batch, self._buffer = self._buffer, []
+                self._write_part(batch)
+            self._run_callbacks()
+
+    def _run_callbacks(self):
+        while self._callbacks and self._callbacks[0][0] <= self.rows_written:
+            self._callbacks.popleft()[1]()
+
+    def _write_part(self, batch):
+        df = products_to_frame(batch)
+        final_path = os.path.join(self.path, f"{self._prefix}-{next(self._sequence):05d}.{self.fmt}")
+        tmp_path = f"{final_path}.tmp"
+
+        if self.fmt == 'parquet':
+            table = pa.Table.from_pandas(df, schema=RAW_SCHEMA, preserve_index=False)
+            pq.write_table(table, tmp_path)
+        else:
+            df.to_csv(tmp_path, index=False, encoding="utf-8")
+
+        # Atomic on the same filesystem: readers see either no part or a complete one
+        os.replace(tmp_path, final_path)
+        self.rows_written += len(df)
+        self.parts_written += 1
+
+    def mark_complete(self):
+        """
+        Flushes and marks this crawl as a full listing of the site (see
+        crawl_is_complete), so a product missing from it is really gone.
+        """
+        self.flush()
+        open(os.path.join(self.path, f"{self._prefix}{COMPLETE_SUFFIX}"), "w").close()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def list_parts(path=RAW_DATASET_DIR):
+    """Returns the complete part files of a sink directory in write order."""
+    parts = [p for fmt in FORMATS for p in glob.glob(os.path.join(path, f"part-*.{fmt}"))]
+    return sorted(parts, key=os.path.basename)
+
+def part_crawl_id(part_path):
+    """The crawl_id of the sink that wrote a part file."""
+    return os.path.basename(part_path).rsplit('-', 1)[0]
+
+def list_crawls(path=RAW_DATASET_DIR):
+    """{crawl_id: [part paths]} for a sink directory, oldest crawl first."""
+    crawls = {}
+    for part in list_parts(path):
+        crawls.setdefault(part_crawl_id(part), []).append(part)
+    return crawls
+
+def crawl_is_complete(path, crawl_id):
+    """True if the sink that wrote crawl_id was marked complete (ProductSink.mark_complete)."""
+    return os.path.exists(os.path.join(path, f"{crawl_id}{COMPLETE_SUFFIX}"))
+
+def read_part(part_path, columns=None):
+    if part_path.endswith('.parquet'):
+        return pd.read_parquet(part_path, columns=columns)
+    return pd.read_csv(part_path, usecols=columns)
+
+def read_products(path=RAW_DATASET_DIR, columns=None):
+    """
+    Reads scraped products from a sink directory (complete parts only, so this is
+    safe while a crawl is still writing) or from a single CSV/Parquet file.
+    """
+    if not os.path.isdir(path):
+        return read_part(path, columns)
+
+    frames = [read_part(part, columns) for part in list_parts(path)]
+    if not frames:
+        return pd.DataFrame(columns=columns or list(RAW_COLUMNS.values()))
+    return pd.concat(frames, ignore_index=True)
+
+def iter_part_chunks(part_path, chunksize, dtype=None):
+    """Yields a single part/file as DataFrames of at most chunksize rows."""
+    if part_path.endswith('.parquet'):
+        for batch in pq.ParquetFile(part_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(part_path, chunksize=chunksize, dtype=dtype)
+
+def raw_parts(path=RAW_DATASET_DIR):
+    """The files iter_products reads right now: a sink directory's complete parts, or the file itself."""
+    return list_parts(path) if os.path.isdir(path) else [path]
+
+def iter_products(path=RAW_DATASET_DIR, chunksize=100_000, dtype=None, parts=None):
+    """
+    Like read_products, but yields DataFrames of at most chunksize rows so the
+    raw data never has to fit in memory at once. dtype is passed to read_csv.
+    parts (from raw_parts) pins the files read, so several passes over a
+    directory a crawl is still writing to all see the same rows.
+    """
+    for part in parts if parts is not None else raw_parts(path):
+        yield from iter_part_chunks(part, chunksize, dtype)
@@ -0,0 +1,215 @@
+# reports.py
+# Per-category report shared by main.py and the Streamlit dashboard. One
+# grouped scan of Products yields average price, average rating, product count
+# and stock availability together, and the per-category top reviewed products
+# come back in the same round trip as a second result set. Queries exist per
+# SQL dialect ('sqlserver', 'sqlite'; see backends.py) and return the same frames.
+# When the materialized CategorySummary table (category_summary.py) matches the
+# loaded products, the per-category metrics are read from it instead of Products.
+from collections import namedtuple
+
+import pandas as pd
+
+from instrumentation import span
+
+TOP_N = 5  # Top reviewed products returned per category
+TOP_REVIEWED_INDEX = 'IX_Products_category_reviews'
+DIALECTS = ('sqlserver', 'sqlite')
+SUMMARY_TABLE = 'CategorySummary'
+REPORT_INFO_TABLE = 'ReportInfo'
+
+CategoryReport = namedtuple('CategoryReport', ['summary', 'top_reviewed', 'from_summary'])
+
+SUMMARY_COLUMNS = {
+    'category': 'string',
+    'average_price': 'float64',
+    'average_rating': 'float64',
+    'product_count': 'int64',
+    'stock_availability_percentage': 'float64',
+}
+TOP_REVIEWED_COLUMNS = {
+    'category': 'string',
+    'name': 'string',
+    'reviews_raw': 'int64',
+    'review_rank': 'int64',
+}
+
+# Per-category aggregates over Products; {where} narrows a summary refresh to
+# some categories. Also what CategorySummary stores, so both give the same values.
+SUMMARY_SELECT_SQL = {
+    'sqlserver': """
+SELECT category,
+       AVG(price_raw) AS average_price,
+       AVG(rating_raw) AS average_rating,
+       COUNT(*) AS product_count,
+       CAST(
+           100.0 * COUNT(CASE WHEN reviews_raw > 0 THEN 1 END)
+           / COUNT(*) AS DECIMAL(10,2)
+       ) AS stock_availability_percentage
+FROM Products
+{where}
+GROUP BY category
+""",
+    'sqlite': """
+SELECT category,
+       AVG(price_raw) AS average_price,
+       AVG(rating_raw) AS average_rating,
+       COUNT(*) AS product_count,
+       ROUND(100.0 * COUNT(CASE WHEN reviews_raw > 0 THEN 1 END) / COUNT(*), 2) AS stock_availability_percentage
+FROM Products
+{where}
+GROUP BY category
+""",
+}
+
+# The summary is fresh when it was refreshed for the products version the last load wrote
+SUMMARY_IS_FRESH_SQL = f"""
+SELECT COUNT(*)
+FROM {REPORT_INFO_TABLE} s
+JOIN {REPORT_INFO_TABLE} p ON p.info_value = s.info_value
+WHERE s.info_key = 'summary_version' AND p.info_key = 'products_version'
+"""
+
+SUMMARY_TABLE_SELECT_SQL = f"""
+SELECT category, average_price, average_rating, product_count, stock_availability_percentage
+FROM {SUMMARY_TABLE}
+"""
+
+# Three result sets: whether the summary table was used, the per-category
+# metrics and the top reviewed products. Names of tables that do not exist yet
+# are only resolved when their statement runs, so the batch works before the
+# first summary refresh.
+CATEGORY_REPORT_SQL = f"""
+SET NOCOUNT ON;
+
+DECLARE @from_summary BIT = 0;
+IF OBJECT_ID('{REPORT_INFO_TABLE}', 'U') IS NOT NULL AND OBJECT_ID('{SUMMARY_TABLE}', 'U') IS NOT NULL
+BEGIN
+    IF ({SUMMARY_IS_FRESH_SQL.strip()}) > 0
+        SET @from_summary = 1;
+END
+SELECT @from_summary AS from_summary;
+
+IF @from_summary = 1
+    {SUMMARY_TABLE_SELECT_SQL.strip()}
+    ORDER BY category;
+ELSE
+    {SUMMARY_SELECT_SQL['sqlserver'].format(where='').strip()}
+    ORDER BY category;
+
+SELECT c.category, t.name, t.reviews_raw,
+       ROW_NUMBER() OVER (PARTITION BY c.category ORDER BY t.reviews_raw DESC) AS review_rank
+FROM (SELECT DISTINCT category FROM Products) c
+CROSS APPLY (
+    SELECT TOP (?) p.name, p.reviews_raw
+    FROM Products p
+    WHERE p.category = c.category AND p.reviews_raw > 0
+    ORDER BY p.reviews_raw DESC
+) t
+ORDER BY c.category, review_rank;
+"""
+
+# Lets the per-category TOP (n) above be an index seek per category that stops
+# after n rows, instead of sorting every reviewed product
+TOP_REVIEWED_INDEX_SQL = f"""
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = '{TOP_REVIEWED_INDEX}' AND object_id = OBJECT_ID('Products'))
+    CREATE INDEX {TOP_REVIEWED_INDEX} ON Products (category, reviews_raw DESC) INCLUDE (name);
+"""
+
+# SQLite runs one statement per execute(); the queries still share one
+# connection, and the window function does the per-category cut. NOCASE
+# matches SQL Server's default case-insensitive category order.
+SQLITE_ORDER_BY = "ORDER BY category COLLATE NOCASE"
+
+SQLITE_TOP_REVIEWED_SQL = """
+SELECT category, name, reviews_raw, review_rank
+FROM (
+    SELECT category, name, reviews_raw,
+           ROW_NUMBER() OVER (PARTITION BY category ORDER BY reviews_raw DESC) AS review_rank
+    FROM Products
+    WHERE reviews_raw > 0
+) ranked
+WHERE review_rank <= ?
+ORDER BY category COLLATE NOCASE, review_rank;
+"""
+
+SQLITE_TOP_REVIEWED_INDEX_SQL = (
+    f"CREATE INDEX IF NOT EXISTS {TOP_REVIEWED_INDEX} ON Products (category, reviews_raw DESC, name);"
+)
+
+def _check_dialect(dialect):
+    if dialect not in DIALECTS:
+        raise ValueError(f"Unknown SQL dialect '{dialect}', expected one of {DIALECTS}")
+
+def ensure_report_indexes(conn, dialect='sqlserver'):
+    """Creates the index backing the top reviewed query if it does not exist yet."""
+    _check_dialect(dialect)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TOP_REVIEWED_INDEX_SQL if dialect == 'sqlserver' else SQLITE_TOP_REVIEWED_INDEX_SQL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+def table_exists(cursor, name, dialect='sqlserver'):
+    if dialect == 'sqlserver':
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", name)
+        return cursor.fetchone()[0] is not None
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def summary_is_fresh(cursor, dialect='sqlserver'):
+    """True if CategorySummary holds the aggregates of the currently loaded products."""
+    if not (table_exists(cursor, REPORT_INFO_TABLE, dialect) and table_exists(cursor, SUMMARY_TABLE, dialect)):
+        return False
+    cursor.execute(SUMMARY_IS_FRESH_SQL)
+    return cursor.fetchone()[0] > 0
+
+def _typed_frame(cursor, columns):
+    """Fetches the cursor's current result set as a DataFrame with fixed dtypes."""
+    rows = [tuple(row) for row in cursor.fetchall()]
+    names = [description[0] for description in cursor.description]
+    df = pd.DataFrame.from_records(rows, columns=names)
+    return df.astype({name: dtype for name, dtype in columns.items() if name in df.columns})
+
+def _fetch_category_report(cursor, top_n, dialect):
+    if dialect == 'sqlserver':
+        cursor.execute(CATEGORY_REPORT_SQL, top_n)
+        from_summary = bool(cursor.fetchone()[0])
+        cursor.nextset()
+        summary = _typed_frame(cursor, SUMMARY_COLUMNS)
+        cursor.nextset()
+        top_reviewed = _typed_frame(cursor, TOP_REVIEWED_COLUMNS)
+    else:
+        from_summary = summary_is_fresh(cursor, dialect)
+        if from_summary:
+            cursor.execute(f"{SUMMARY_TABLE_SELECT_SQL} {SQLITE_ORDER_BY}")
+        else:
+            cursor.execute(f"{SUMMARY_SELECT_SQL['sqlite'].format(where='')} {SQLITE_ORDER_BY}")
+        summary = _typed_frame(cursor, SUMMARY_COLUMNS)
+        cursor.execute(SQLITE_TOP_REVIEWED_SQL, (top_n,))
+        top_reviewed = _typed_frame(cursor, TOP_REVIEWED_COLUMNS)
+    return summary, top_reviewed, from_summary
+
+def run_category_report(conn, top_n=TOP_N, dialect='sqlserver'):
+    """
+    Runs the combined report in one round trip and returns a CategoryReport of
+    two DataFrames: `summary` (one row per category) and `top_reviewed` (up to
+    top_n rows per category, ranked by reviews). `dialect` is the connection's
+    SQL dialect. The summary comes from the materialized CategorySummary table
+    when it is fresh (`from_summary`), otherwise from a grouped scan of Products.
+    """
+    _check_dialect(dialect)
+    top_n = int(top_n)
+    if top_n < 1:
+        raise ValueError(f"top_n must be at least 1, got {top_n}")
+    cursor = conn.cursor()
+    try:
+        with span('query', 'category_report', dialect=dialect, top_n=top_n) as event:
+            summary, top_reviewed, from_summary = _fetch_category_report(cursor, top_n, dialect)
+            event['rows'] = len(summary) + len(top_reviewed)
+            event['from_summary'] = from_summary
+    finally:
+        cursor.close()
+    return CategoryReport(summary, top_reviewed, from_summary)
@@ -0,0 +1,133 @@
+# resource_pool.py
+# Generic pool of expensive, reusable resources (headless browsers, database
+# connections) leased to concurrent tasks. The pool handles the slots, lease
+# waits, reuse and statistics; driver_pool.py and db_pool.py only say how a
+# resource is created, checked and closed.
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+class ResourcePool:
+    """
+    Leases pooled resources, blocking while all `size` are in use. Subclasses
+    implement _create_resource() and may override the health-check hooks.
+    """
+
+    kind = 'resource'  # Used in error messages
+    broken_errors = (Exception,)  # Errors raised during a lease that retire the resource
+
+    def __init__(self, size, lease_timeout):
+        self.size = size
+        self.lease_timeout = lease_timeout
+        # LIFO hands out the most recently returned resource first, so spare ones age out
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.in_use = 0
+        self.leases = 0
+        self.created = 0
+        self.recycled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _create_resource(self):
+        raise NotImplementedError
+
+    def _is_usable(self, pooled):
+        """Checked before an idle resource is handed out again."""
+        return True
+
+    def _release(self, pooled):
+        """Called when a lease ends without error; False retires the resource."""
+        return True
+
+    def _should_recycle(self, pooled):
+        return False
+
+    def _create(self):
+        pooled = self._create_resource()
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def _discard(self, pooled):
+        pooled.close()
+        with self._lock:
+            self.recycled += 1
+
+    def _checkout(self):
+        """Returns a usable idle resource, or a new one if none is left."""
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create()
+            if self._is_usable(pooled):
+                return pooled
+            self._discard(pooled)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Yields a pooled resource, blocking until one is free."""
+        if self._closed:
+            raise RuntimeError(f"{type(self).__name__} is closed")
+
+        timeout = self.lease_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No {self.kind} became free within {timeout}s")
+        waited = time.perf_counter() - started
+
+        with self._lock:
+            self.in_use += 1
+            self.leases += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+        pooled = None
+        broken = False
+        try:
+            pooled = self._checkout()
+            yield pooled
+        except self.broken_errors:
+            # The resource may be crashed or mid-transaction; do not hand it out again
+            broken = True
+            raise
+        finally:
+            if pooled is not None:
+                if not broken:
+                    broken = not self._release(pooled)
+                if broken or self._closed or self._should_recycle(pooled):
+                    self._discard(pooled)
+                else:
+                    self._idle.put(pooled)
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        """Returns a snapshot of pool usage and lease wait times (seconds)."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'leases': self.leases,
+                'created': self.created,
+                'recycled': self.recycled,
+                'wait_total': self.wait_total,
+                'wait_avg': self.wait_total / self.leases if self.leases else 0.0,
+                'wait_max': self.wait_max,
+            }
+
+    def close(self):
+        """Closes every idle resource; leased ones are closed when they are returned."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
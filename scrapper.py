@@ -6,64 +6,592 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from cssselect import GenericTranslator
+from lxml import etree, html as lxml_html
 from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+import functools
+import json
+import os
+import re
+import requests
 import time
 
-from config import BASE_URL, IMPLICIT_WAIT_TIME, SELECTORS
+from crawl_state import content_hash
+from instrumentation import span
 
-def initialize_driver():
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HTTP_TIMEOUT = 20  # Seconds to wait for a static HTML response
+HTTP_POOL_SIZE = 10  # Keep-alive connections kept open per host
+DEFAULT_EXTRACTOR = 'lxml'  # Extraction engine used by PageFetcher (see EXTRACTORS)
+UNCHANGED = object()  # Marker for a page whose content matches the crawl state
+DRIVER_PATH_CACHE = ".chromedriver_path.json"  # Resolved chromedriver binary, cached on disk
+DRIVER_PATH_MAX_AGE = 7 * 24 * 3600  # Re-run the driver-manager version lookup after a week
+
+def site_config():
+    """
+    The project's config.py (BASE_URL, SELECTORS, ...), which is not checked in.
+    Imported on first use, so the extractors also run without it when given
+    explicit selectors and a base URL (e.g. on synthetic_catalog.py pages).
+    """
+    import config
+    return config
+
+def resolve_driver_path(cache_file=DRIVER_PATH_CACHE, max_age=DRIVER_PATH_MAX_AGE):
+    """
+    Returns the chromedriver binary path, running ChromeDriverManager().install()
+    only when the cached path is missing, stale or no longer on disk.
+    """
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f)
+        if os.path.exists(cached['path']) and time.time() - cached['resolved_at'] < max_age:
+            return cached['path']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    path = ChromeDriverManager().install()
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({'path': path, 'resolved_at': time.time()}, f)
+    os.replace(tmp_file, cache_file)
+    return path
+
+def initialize_driver(headless=False):
     """Initializes and returns the Selenium WebDriver."""
     options = webdriver.ChromeOptions()
-    # options.add_argument('--headless') # Uncomment for headless mode (no browser window)
+    if headless:
+        options.add_argument('--headless=new')
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+    options.add_argument(f'user-agent={USER_AGENT}')
     
-    service = Service(ChromeDriverManager().install())
+    service = Service(resolve_driver_path())
     driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(IMPLICIT_WAIT_TIME)
+    driver.implicitly_wait(site_config().IMPLICIT_WAIT_TIME)
     
     return driver
 
-def extract_product_data(product_item, category_name):
+def create_http_session(pool_size=HTTP_POOL_SIZE):
+    """Creates a requests Session backed by a pooled keep-alive connection adapter."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+    })
+    return session
+
+class PageFetcher:
+    """
+    Fetches listing pages as documents parsed by an extraction engine (see EXTRACTORS).
+
+    With a session, pages are downloaded over plain HTTP first and Chrome is only
+    used when SELECTORS['product_container'] is missing from the static HTML
+    (i.e. the listing is rendered client-side). Browser renders lease a warm
+    instance from driver_pool when one is given; otherwise a driver is created
+    lazily with initialize_driver, so a crawl that never needs it never starts one.
+
+    With a crawl state (crawl_state.CrawlState) pages are requested conditionally
+    and fetch() returns None, without parsing, when the page is unchanged since
+    the previous crawl. Hash and validators of the last fetch are kept in
+    last_fetch; a fetcher is meant to be used by one worker thread.
+    """
+
+    def __init__(self, session=None, driver=None, driver_factory=initialize_driver, driver_pool=None,
+                 extractor=None, state=None):
+        self.session = session
+        self.extractor = extractor if extractor is not None else get_extractor()
+        self.state = state
+        self.last_fetch = {}
+        self._driver = driver
+        self._owns_driver = False
+        self._driver_factory = driver_factory
+        self.driver_pool = driver_pool
+        self.http_pages = 0
+        self.browser_pages = 0
+        self.unchanged_pages = 0
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            print("Static HTML is not enough, starting Selenium driver...")
+            self._driver = self._driver_factory()
+            self._owns_driver = True
+        return self._driver
+
+    def fetch_static(self, url):
+        """
+        Downloads a page over HTTP. Returns the parsed page, None if unusable,
+        or UNCHANGED if the crawl state says it has not changed.
+        """
+        headers = self.state.conditional_headers(url) if self.state is not None else None
+        try:
+            response = self.session.get(url, timeout=HTTP_TIMEOUT, headers=headers)
+            if response.status_code == 304:
+                return UNCHANGED
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"HTTP fetch failed for {url}: {e}")
+            return None
+
+        page_hash = content_hash(response.content)
+        self.last_fetch = {
+            'content_hash': page_hash,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        if self.state is not None and self.state.is_unchanged(url, page_hash):
+            return UNCHANGED
+
+        doc = self.extractor.parse(response.text)
+        if not self.extractor.has_products(doc):
+            return None
+        return doc
+
+    def fetch_rendered(self, url):
+        """Loads a page in a Selenium driver and parses the rendered source."""
+        if self.driver_pool is None:
+            page_source = render_page(self.driver, url)
+        else:
+            with self.driver_pool.lease() as lease:
+                lease.pages += 1
+                page_source = render_page(lease.driver, url)
+
+        page_hash = content_hash(page_source)
+        self.last_fetch = {'content_hash': page_hash, 'etag': None, 'last_modified': None}
+        if self.state is not None and self.state.is_unchanged(url, page_hash):
+            return UNCHANGED
+        return self.extractor.parse(page_source)
+
+    def fetch(self, url):
+        """
+        Returns the parsed page, preferring static HTML over a browser render,
+        or None when the crawl state shows the page is unchanged.
+        """
+        self.last_fetch = {}
+        doc = None
+        if self.session is not None:
+            doc = self.fetch_static(url)
+            if doc is not None and doc is not UNCHANGED:
+                self.http_pages += 1
+
+        if doc is None:
+            doc = self.fetch_rendered(url)
+            if doc is not UNCHANGED:
+                self.browser_pages += 1
+
+        if doc is UNCHANGED:
+            self.unchanged_pages += 1
+            return None
+        return doc
+
+    def close(self):
+        """Quits the driver if this fetcher started it."""
+        if self._owns_driver and self._driver is not None:
+            self._driver.quit()
+        self._driver = None
+        self._owns_driver = False
+
+def render_page(driver, url):
+    """Loads a URL in the driver, waits for the product list and returns the page source."""
+    driver.get(url)
+
+    # Wait for the main product container to load to ensure dynamic content is ready
+    # NOTE: Verify this selector (SELECTORS['product_container']) on the site
+    WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, site_config().SELECTORS['product_container']))
+    )
+
+    return driver.page_source
+
+def build_product_record(category_name, name_text, price_text, rating_attr, reviews_text, href, base_url=None):
+    """
+    Normalizes the raw field values of one product card into the output dict.
+    Text/attribute arguments are None when the element was not found; relative
+    links are resolved against base_url (default: config.BASE_URL).
+    Shared by every extraction engine so their output stays identical.
+    """
+    name = name_text.strip() if name_text is not None else "N/A"
+    price = price_text.strip() if price_text is not None else "N/A"
+    
+    # Rating is often in a custom attribute on Banggood
+    rating_str = rating_attr if rating_attr else "N/A"
+    
+    # Clean reviews count
+    reviews_str = reviews_text.strip().replace('(', '').replace(')', '').replace(',', '') if reviews_text is not None else "0"
+    
+    url_suffix = href if name_text is not None else ""
+    url = urljoin(base_url or site_config().BASE_URL, url_suffix)
+
+    return {
+        'category': category_name,
+        'product_name': name,
+        'price': price,
+        'rating': float(rating_str) if rating_str != "N/A" else None,
+        'reviews_count': int(reviews_str.replace('+', '').strip()) if reviews_str.replace('N/A', '0').strip().isdigit() else 0,
+        'url': url,
+    }
+
+def extract_product_data(product_item, category_name, selectors=None, base_url=None):
     """
     Extracts required data fields from a single product HTML element (using BeautifulSoup).
     """
     try:
-        # Use SELECTORS from config
-        name_tag = product_item.select_one(SELECTORS['product_name'])
-        price_tag = product_item.select_one(SELECTORS['product_price'])
-        rating_tag = product_item.select_one(SELECTORS['product_rating'])
-        reviews_tag = product_item.select_one(SELECTORS['product_reviews'])
-
-        name = name_tag.text.strip() if name_tag else "N/A"
-        price = price_tag.text.strip() if price_tag else "N/A"
-        
-        # Rating is often in a custom attribute on Banggood
-        rating_str = rating_tag.get('data-rating') if rating_tag and rating_tag.get('data-rating') else "N/A"
-        
-        # Clean reviews count
-        reviews_str = reviews_tag.text.strip().replace('(', '').replace(')', '').replace(',', '') if reviews_tag else "0"
-        
-        url_suffix = name_tag.get('href') if name_tag else ""
-        url = urljoin(BASE_URL, url_suffix)
-
-        return {
-            'category': category_name,
-            'product_name': name,
-            'price': price,
-            'rating': float(rating_str) if rating_str != "N/A" else None,
-            'reviews_count': int(reviews_str.replace('+', '').strip()) if reviews_str.replace('N/A', '0').strip().isdigit() else 0,
-            'url': url,
-        }
+        # Use SELECTORS from config unless others are given
+        selectors = selectors if selectors is not None else site_config().SELECTORS
+        name_tag = product_item.select_one(selectors['product_name'])
+        price_tag = product_item.select_one(selectors['product_price'])
+        rating_tag = product_item.select_one(selectors['product_rating'])
+        reviews_tag = product_item.select_one(selectors['product_reviews'])
+
+        return build_product_record(
+            category_name,
+            name_tag.text if name_tag else None,
+            price_tag.text if price_tag else None,
+            rating_tag.get('data-rating') if rating_tag else None,
+            reviews_tag.text if reviews_tag else None,
+            name_tag.get('href') if name_tag else None,
+            base_url,
+        )
     except Exception as e:
         # print(f"Error extracting data for an item: {e}") # Uncomment for debugging
         return None
 
-def scrape_category_with_pagination(driver, start_url, category_name, max_pages=5):
+def extract_page_products(soup, category_name, selectors=None, base_url=None):
+    """Extracts every product card on a parsed listing page."""
+    selectors = selectors if selectors is not None else site_config().SELECTORS
+    products = []
+    for container in soup.select(selectors['product_container']):
+        product_data = extract_product_data(container, category_name, selectors, base_url)
+        if product_data:
+            products.append(product_data)
+    return products
+
+def scrape_listing_page(fetcher, url, category_name, rate_limiter=None, sink=None):
     """
-    Scrapes a category across multiple pages using Selenium for navigation.
+    Fetches a single listing page. Returns (parsed page, products).
+
+    With a crawl state on the fetcher, pages already fetched by the current
+    crawl (when resuming) or unchanged since the last crawl are not parsed:
+    they come back as (None, the products stored for them), and their
+    pagination is read from the state. Their products are re-emitted so the
+    output of every crawl lists every product, not just the changed pages.
+
+    With a sink (see product_sink.ProductSink) the products are also written
+    to it, and the page is only recorded in the crawl state once the sink has
+    them on disk, so a crash never leaves a page done whose products were lost.
+    """
+    state = fetcher.state
+    if state is not None and state.is_done(url):
+        products = state.stored_products(url)
+        if sink is not None:
+            sink.write(products)
+        return None, products
+
+    if rate_limiter is not None:
+        rate_limiter.wait(url)
+    with span('page', url, category=category_name) as event:
+        browser_pages = fetcher.browser_pages
+        started = time.perf_counter()
+        doc = fetcher.fetch(url)
+        event['fetch_seconds'] = round(time.perf_counter() - started, 6)
+        if doc is None:
+            event['source'] = 'unchanged'
+            products = state.stored_products(url) if state is not None else []
+            event['rows'] = len(products)
+            mark = functools.partial(state.mark_unchanged, url) if state is not None else None
+            if sink is not None:
+                sink.write(products, on_written=mark)
+            elif mark is not None:
+                mark()
+            return None, products
+        event['source'] = 'browser' if fetcher.browser_pages > browser_pages else 'http'
+
+        started = time.perf_counter()
+        products = fetcher.extractor.extract_products(doc, category_name)
+        event['extract_seconds'] = round(time.perf_counter() - started, 6)
+        event['rows'] = len(products)
+    record = None
+    if state is not None:
+        # Bound now: the fetcher's last_fetch belongs to the next page by the time the sink flushes
+        record = functools.partial(
+            state.record_page,
+            url, category_name, fetcher.last_fetch.get('content_hash'), products,
+            next_url=fetcher.extractor.next_page_url(doc, url),
+            etag=fetcher.last_fetch.get('etag'),
+            last_modified=fetcher.last_fetch.get('last_modified'),
+        )
+    if sink is not None:
+        sink.write(products, on_written=record)
+    elif record is not None:
+        record()
+    return doc, products
+
+def find_next_page_url(soup, current_url, selectors=None):
+    """Returns the absolute URL of the 'Next Page' link on a parsed page, or None."""
+    selectors = selectors if selectors is not None else site_config().SELECTORS
+    next_button = soup.select_one(selectors['next_page_button'])
+    if next_button and next_button.get('href'):
+        return urljoin(current_url, next_button.get('href'))
+    return None
+
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+def find_page_number_links(soup, current_url, selectors=None):
     """
+    Returns {page number: absolute url} for the numbered pagination links, which
+    are looked up around the 'Next Page' button so unrelated numeric links are ignored.
+    """
+    selectors = selectors if selectors is not None else site_config().SELECTORS
+    container = soup.select_one(selectors['next_page_button'])
+    for _ in range(3):
+        if container is None or container.parent is None:
+            break
+        container = container.parent
+
+        links = {}
+        for link in container.select('a[href]'):
+            text = link.get_text(strip=True)
+            if text.isdigit():
+                links.setdefault(int(text), urljoin(current_url, link['href']))
+        if links:
+            return links
+    return {}
+
+def infer_page_url_pattern(page_links):
+    """
+    Finds the number in the page URLs that tracks the page number.
+    Returns (prefix, suffix) so that page N is prefix + str(N) + suffix, or None.
+    """
+    if len(page_links) < 2:
+        return None
+
+    pages = sorted(page_links.items())
+    first_page, first_url = pages[0]
+    for match in _NUMBER_PATTERN.finditer(first_url):
+        if int(match.group()) != first_page:
+            continue
+        prefix, suffix = first_url[:match.start()], first_url[match.end():]
+        if all(url == f"{prefix}{page}{suffix}" for page, url in pages):
+            return prefix, suffix
+    return None
+
+# --- Extraction engines ---
+
+class SoupExtractor:
+    """Reference engine: BeautifulSoup on the pure-Python html.parser backend."""
+
+    name = 'soup'
+
+    def __init__(self, selectors=None, base_url=None):
+        self.selectors = selectors if selectors is not None else site_config().SELECTORS
+        self.base_url = base_url or site_config().BASE_URL
+
+    def parse(self, page_html):
+        return BeautifulSoup(page_html, 'html.parser')
+
+    def has_products(self, doc):
+        return doc.select_one(self.selectors['product_container']) is not None
+
+    def extract_products(self, doc, category_name):
+        return extract_page_products(doc, category_name, self.selectors, self.base_url)
+
+    def next_page_url(self, doc, current_url):
+        return find_next_page_url(doc, current_url, self.selectors)
+
+    def page_number_links(self, doc, current_url):
+        return find_page_number_links(doc, current_url, self.selectors)
+
+class LxmlExtractor:
+    """
+    Fast engine: parses the page once with the C-backed lxml HTML parser and
+    compiles the selectors (default: config.SELECTORS) to XPath up front. Each
+    field selector is evaluated once per page and its matches are assigned to
+    their enclosing product card, so the cost no longer grows with four CSS
+    queries per card.
+    """
+
+    name = 'lxml'
+    FIELDS = ('product_name', 'product_price', 'product_rating', 'product_reviews')
+
+    def __init__(self, selectors=None, base_url=None):
+        selectors = selectors if selectors is not None else site_config().SELECTORS
+        self.base_url = base_url or site_config().BASE_URL
+        translator = GenericTranslator()
+        compile_css = lambda css: etree.XPath(translator.css_to_xpath(css))
+        self._container = compile_css(selectors['product_container'])
+        self._fields = [compile_css(selectors[field]) for field in self.FIELDS]
+        self._next_button = compile_css(selectors['next_page_button'])
+
+    def parse(self, page_html):
+        if isinstance(page_html, str) and page_html.lstrip().startswith('<?xml'):
+            # lxml refuses str input that carries its own encoding declaration
+            page_html = page_html.encode('utf-8')
+        try:
+            return lxml_html.document_fromstring(page_html)
+        except etree.ParserError:
+            # Empty or whitespace-only body: no products, like an empty soup
+            return lxml_html.document_fromstring('<html></html>')
+
+    def has_products(self, doc):
+        return bool(self._container(doc))
+
+    def extract_products(self, doc, category_name):
+        cards = self._container(doc)
+        card_index = {card: i for i, card in enumerate(cards)}
+        matches = [[None] * len(self._fields) for _ in cards]
+
+        for field_index, field_xpath in enumerate(self._fields):
+            # Matches come back in document order, so the first one kept per
+            # card is the same element select_one would return
+            for element in field_xpath(doc):
+                for ancestor in element.iterancestors():
+                    i = card_index.get(ancestor)
+                    if i is not None:
+                        if matches[i][field_index] is None:
+                            matches[i][field_index] = element
+                        break
+
+        products = []
+        for name_el, price_el, rating_el, reviews_el in matches:
+            try:
+                product_data = build_product_record(
+                    category_name,
+                    name_el.text_content() if name_el is not None else None,
+                    price_el.text_content() if price_el is not None else None,
+                    rating_el.get('data-rating') if rating_el is not None else None,
+                    reviews_el.text_content() if reviews_el is not None else None,
+                    name_el.get('href') if name_el is not None else None,
+                    self.base_url,
+                )
+            except Exception:
+                continue
+            products.append(product_data)
+        return products
+
+    def next_page_url(self, doc, current_url):
+        buttons = self._next_button(doc)
+        if buttons and buttons[0].get('href'):
+            return urljoin(current_url, buttons[0].get('href'))
+        return None
+
+    def page_number_links(self, doc, current_url):
+        buttons = self._next_button(doc)
+        container = buttons[0] if buttons else None
+        for _ in range(3):
+            if container is None or container.getparent() is None:
+                break
+            container = container.getparent()
+
+            links = {}
+            for link in container.iterdescendants('a'):
+                text = link.text_content().strip()
+                if text.isdigit() and link.get('href'):
+                    links.setdefault(int(text), urljoin(current_url, link.get('href')))
+            if links:
+                return links
+        return {}
+
+EXTRACTORS = {
+    SoupExtractor.name: SoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+_extractor_instances = {}
+
+def get_extractor(name=None):
+    """Returns the (shared) extraction engine registered under name."""
+    name = name or DEFAULT_EXTRACTOR
+    if name not in _extractor_instances:
+        if name not in EXTRACTORS:
+            raise ValueError(f"Unknown extractor '{name}', expected one of {sorted(EXTRACTORS)}")
+        _extractor_instances[name] = EXTRACTORS[name]()
+    return _extractor_instances[name]
+
+def check_extractor_parity(page_html, category_name, reference='soup', candidate='lxml', selectors=None,
+                           base_url=None):
+    """
+    Runs two engines on the same page HTML and returns the records where they
+    disagree as (position, reference record, candidate record) tuples.
+    An empty list means the candidate engine is a drop-in replacement.
+    selectors and base_url default to config.py's.
+    """
+    if selectors is None and base_url is None:
+        reference_engine = get_extractor(reference)
+        candidate_engine = get_extractor(candidate)
+    else:
+        reference_engine = EXTRACTORS[reference](selectors, base_url)
+        candidate_engine = EXTRACTORS[candidate](selectors, base_url)
+    expected = reference_engine.extract_products(reference_engine.parse(page_html), category_name)
+    actual = candidate_engine.extract_products(candidate_engine.parse(page_html), category_name)
+
+    mismatches = [(i, a, b) for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    for i in range(min(len(expected), len(actual)), max(len(expected), len(actual))):
+        mismatches.append((i, expected[i] if i < len(expected) else None, actual[i] if i < len(actual) else None))
+    return mismatches
+
+def plan_pagination(doc, start_url, max_pages, extractor=None):
+    """
+    Builds the full list of listing page URLs (page 1 first, at most max_pages)
+    from the first page, so the remaining pages can be fetched concurrently.
+
+    Returns None when the page list cannot be inferred; callers should then
+    follow the 'Next Page' links one by one instead.
+
+    The list ends at the highest numbered link on the page. When the links only
+    show a window ("1 2 3 4 5 Next", no last page) that is not the real last
+    page, so callers should keep following 'Next Page' from the last planned
+    page while fewer than max_pages were planned.
+    """
+    if extractor is None:
+        extractor = get_extractor()
+    if max_pages <= 1 or extractor.next_page_url(doc, start_url) is None:
+        return [start_url]
+
+    page_links = {page: url for page, url in extractor.page_number_links(doc, start_url).items() if page >= 2}
+    if not page_links:
+        return None
+
+    pattern = infer_page_url_pattern(page_links)
+    last_page = min(max(page_links), max_pages)
+    # Pages hidden behind an ellipsis (e.g. "1 2 3 ... 50") come from the URL pattern
+    page_urls = [start_url]
+    for page in range(2, last_page + 1):
+        if page in page_links:
+            page_urls.append(page_links[page])
+        elif pattern is not None:
+            prefix, suffix = pattern
+            page_urls.append(f"{prefix}{page}{suffix}")
+        else:
+            return None
+    return page_urls
+
+def scrape_category_with_pagination(driver, start_url, category_name, max_pages=5, fetcher=None, rate_limiter=None,
+                                    sink=None, raise_errors=False):
+    """
+    Scrapes a category across multiple pages.
+
+    By default every page is loaded through the Selenium driver. Pass a PageFetcher
+    built with create_http_session() to download pages over HTTP and only fall back
+    to the browser when the static HTML has no product containers.
+
+    When a shared rate_limiter (see crawler.HostRateLimiter) is given it paces the
+    requests instead of the fixed sleep between pages.
+
+    When a sink (see product_sink.ProductSink) is given each page's products are
+    written to it as soon as the page is parsed instead of being collected, and
+    the returned list is empty.
+
+    A page that fails ends the category. With raise_errors the error is then
+    re-raised, so a crawler can count the category as failed instead of
+    treating it as complete.
+    """
+    if fetcher is None:
+        fetcher = PageFetcher(driver=driver)
+
     all_products = []
     current_page = 1
     current_url = start_url
@@ -72,50 +600,36 @@ def scrape_category_with_pagination(driver, start_url, category_name, max_pages=
         print(f"Fetching Page {current_page} for {category_name}: {current_url}")
         
         try:
-            driver.get(current_url)
-            
-            # Wait for the main product container to load to ensure dynamic content is ready
-            # NOTE: Verify this selector (SELECTORS['product_container']) on the site
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, SELECTORS['product_container']))
-            )
+            soup, products = scrape_listing_page(fetcher, current_url, category_name, rate_limiter, sink)
             
-            # Use BeautifulSoup to parse the fully loaded page source
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            product_containers = soup.select(SELECTORS['product_container']) 
-            
-            if not product_containers:
+            if soup is None:
+                # Already fetched by this crawl or unchanged since the last one
+                if sink is None:
+                    all_products.extend(products)
+                next_page_url = fetcher.state.next_page_url(current_url)
+            elif not products:
                 print("No product containers found. Check selectors.")
                 break
-                
-            for container in product_containers:
-                product_data = extract_product_data(container, category_name)
-                if product_data:
-                    all_products.append(product_data)
+            else:
+                if sink is None:
+                    all_products.extend(products)
 
-            # --- Pagination Logic ---
-            next_page_url = None
-            try:
-                # Find the 'Next Page' button using Selenium's element finding
-                next_button = driver.find_element(By.CSS_SELECTOR, SELECTORS['next_page_button'])
-                if next_button and next_button.get_attribute('href'):
-                    next_page_url = next_button.get_attribute('href')
-                
-            except Exception:
-                # This exception means the next button selector was not found (end of pagination)
-                pass
+                # --- Pagination Logic ---
+                next_page_url = fetcher.extractor.next_page_url(soup, current_url)
 
             if next_page_url and current_page < max_pages:
                 current_url = next_page_url
                 current_page += 1
-                time.sleep(2) # Be polite and wait between page loads
+                if rate_limiter is None:
+                    time.sleep(2) # Be polite and wait between page loads
             else:
                 current_url = None # Stop the loop
                 print("Reached last page or max pages limit.")
                 
         except Exception as e:
             print(f"An error occurred during scraping page {current_page}: {e}")
+            if raise_errors:
+                raise
             break
             
-    return all_products
\ No newline at end of file
+    return all_products
@@ -1,8 +1,16 @@
+from contextlib import contextmanager
+
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
-import pyodbc
+
+import charts
+from data_layer import SharedDataset
+from features import ensure_features
+from filter_index import FilterIndex
+from instrumentation import span
+from backends import get_backend
+from reports import TOP_N, run_category_report
 
 # =========================
 # BASIC PAGE CONFIG
@@ -23,15 +31,43 @@ st.markdown(
     """
 )
 
+# Render and query times of this rerun, listed in the timings panel at the bottom
+# (and appended to the pipeline log like every other stage's events)
+section_timings = []
+
+@contextmanager
+def timed(kind, name, **fields):
+    with span(kind, name, **fields) as event:
+        yield event
+    section_timings.append(event)
+
 # =========================
 # LOAD DATA
 # =========================
-@st.cache_data
-def load_data():
-    df = pd.read_csv("banggood_products_cleaned.csv")
-    return df
-
-df = load_data()
+DASHBOARD_COLUMNS = ["category", "name", "price_raw", "rating_raw", "reviews_raw", "url", "price_to_rating"]
+
+def add_derived_columns(df):
+    # clean_data.py stores the derived features; only output from before they
+    # existed needs them computed, once per dataset version
+    return ensure_features(df, ["price_to_rating"])
+
+# One memory-mapped copy of the cleaned data shared by every session and rerun;
+# it reloads in the background when clean_data.py writes a new version
+@st.cache_resource
+def get_shared_dataset():
+    return SharedDataset(columns=DASHBOARD_COLUMNS, prepare=add_derived_columns)
+
+def checked_snapshot(snapshot, data_version):
+    # Cached results are keyed by data_version, so they must be built from that
+    # very snapshot: the rerun's own, never a newer one a reload swapped in since
+    if snapshot.version != data_version:
+        raise RuntimeError(f"Snapshot version {snapshot.version} does not match {data_version}")
+    return snapshot
+
+# The whole rerun works on one snapshot, even if a reload lands meanwhile
+snapshot = get_shared_dataset().snapshot()
+data_version = snapshot.version
+df = snapshot.df
 
 # Make sure expected columns exist
 required_cols = {"category", "name", "price_raw", "rating_raw", "reviews_raw", "url"}
@@ -45,11 +81,12 @@ if missing:
 # =========================
 st.sidebar.header("Filters")
 
-categories = ["All"] + sorted(df["category"].dropna().unique().tolist())
+filter_index = snapshot.derived("filter_index", FilterIndex)
+
+categories = ["All"] + filter_index.categories
 selected_category = st.sidebar.selectbox("Select Category", categories)
 
-min_price = float(df["price_raw"].min())
-max_price = float(df["price_raw"].max())
+min_price, max_price = (float(bound) for bound in filter_index.price_bounds)
 price_range = st.sidebar.slider(
     "Price range",
     min_value=round(min_price, 2),
@@ -57,8 +94,7 @@ price_range = st.sidebar.slider(
     value=(round(min_price, 2), round(max_price, 2))
 )
 
-min_rating = float(df["rating_raw"].min())
-max_rating = float(df["rating_raw"].max())
+min_rating, max_rating = (float(bound) for bound in filter_index.rating_bounds)
 rating_range = st.sidebar.slider(
     "Rating range",
     min_value=round(min_rating, 2),
@@ -66,18 +102,16 @@ rating_range = st.sidebar.slider(
     value=(round(min_rating, 2), round(max_rating, 2))
 )
 
-# Apply filters
-filtered_df = df.copy()
-
-if selected_category != "All":
-    filtered_df = filtered_df[filtered_df["category"] == selected_category]
-
-filtered_df = filtered_df[
-    (filtered_df["price_raw"] >= price_range[0]) &
-    (filtered_df["price_raw"] <= price_range[1]) &
-    (filtered_df["rating_raw"] >= rating_range[0]) &
-    (filtered_df["rating_raw"] <= rating_range[1])
-]
+# Apply filters: binary search on the price-sorted category partition, then
+# only the matching rows are copied out of df
+with timed("filter", "Sidebar filters") as event:
+    filtered_df = filter_index.filter(
+        df,
+        category=None if selected_category == "All" else selected_category,
+        price_range=price_range,
+        rating_range=rating_range,
+    )
+    event['rows'] = len(filtered_df)
 
 st.subheader("📄 Filtered Data Preview")
 st.write(f"Rows after filtering: {len(filtered_df)}")
@@ -91,106 +125,106 @@ st.header("🧪 Part 3 – Exploratory Data Analysis")
 
 sns.set(style="whitegrid")
 
+# Charts are drawn once per data version (and filter state, for the charts of
+# the filtered rows) and served as cached PNGs; a section renders only while
+# its toggle is on. The rerun's snapshot is passed as _snapshot, which
+# st.cache_data leaves out of the cache key.
+FILTERED_CHARTS = {
+    "rating_vs_price": charts.rating_vs_price,
+    "price_vs_reviews": charts.price_vs_reviews,
+}
+
+@st.cache_data(max_entries=64)
+def top_reviewed_table(data_version, _snapshot):
+    return charts.top_reviewed_products(checked_snapshot(_snapshot, data_version).df)
+
+@st.cache_data(max_entries=64)
+def best_value_table(data_version, _snapshot):
+    return charts.best_value_products(checked_snapshot(_snapshot, data_version).df)
+
+@st.cache_data(max_entries=64)
+def render_chart(chart, data_version, _snapshot):
+    if chart == "price_boxplot":
+        fig = charts.price_boxplot(checked_snapshot(_snapshot, data_version).df)
+    elif chart == "top_reviewed":
+        fig = charts.top_reviewed_bar(top_reviewed_table(data_version, _snapshot))
+    elif chart == "best_value":
+        fig = charts.best_value_bar(best_value_table(data_version, _snapshot))
+    else:
+        raise ValueError(f"Unknown chart '{chart}'")
+    return charts.figure_png(fig)
+
+@st.cache_data(max_entries=64)
+def render_filtered_chart(chart, data_version, category, price_range, rating_range, scatter_mode, _snapshot):
+    # The rows and the index over them come from the same snapshot
+    snapshot = checked_snapshot(_snapshot, data_version)
+    rows = snapshot.derived("filter_index", FilterIndex).filter(snapshot.df, category, price_range, rating_range)
+    return charts.figure_png(FILTERED_CHARTS[chart](rows, scatter_mode))
+
+# Above charts.SCATTER_ROW_LIMIT filtered rows, scatter plots draw a
+# per-category sample (Auto) or a density instead of every product
+SCATTER_MODE_LABELS = {
+    "Auto (sample large data)": "auto",
+    "Density (hexbin)": "hexbin",
+    "All points (slow on large data)": "points",
+}
+scatter_mode = SCATTER_MODE_LABELS[
+    st.sidebar.selectbox(f"Scatter plots above {charts.SCATTER_ROW_LIMIT:,} rows", list(SCATTER_MODE_LABELS))
+]
+
+filter_state = (
+    None if selected_category == "All" else selected_category,
+    tuple(price_range),
+    tuple(rating_range),
+    scatter_mode,
+)
+
 # 1. Price distribution per category (boxplot)
 st.subheader("1️⃣ Price Distribution per Category")
 
-fig1, ax1 = plt.subplots(figsize=(10, 5))
-sns.boxplot(
-    data=df,
-    x="category",
-    y="price_raw",
-    ax=ax1
-)
-ax1.set_title("Price Distribution per Category")
-ax1.set_xlabel("Category")
-ax1.set_ylabel("Price")
-plt.setp(ax1.get_xticklabels(), rotation=45, ha="right")
-st.pyplot(fig1)
+if st.toggle("Show chart", value=True, key="show_price_boxplot"):
+    with timed("render", "1. Price distribution"):
+        st.image(render_chart("price_boxplot", data_version, snapshot))
 
 # 2. Rating vs Price correlation (colored by category)
 st.subheader("2️⃣ Rating vs Price Correlation (Colored by Category)")
 
-fig2, ax2 = plt.subplots(figsize=(10, 5))
-sns.scatterplot(
-    data=filtered_df,
-    x="price_raw",
-    y="rating_raw",
-    hue="category",
-    ax=ax2
-)
-ax2.set_title("Rating vs Price Correlation")
-ax2.set_xlabel("Price")
-ax2.set_ylabel("Rating")
-ax2.legend(title="Category", bbox_to_anchor=(1.05, 1), loc="upper left")
-st.pyplot(fig2)
+if st.toggle("Show chart", value=True, key="show_rating_vs_price"):
+    with timed("render", "2. Rating vs price"):
+        st.image(render_filtered_chart("rating_vs_price", data_version, *filter_state, snapshot))
 
 # 3. Top reviewed products (top 10)
 st.subheader("3️⃣ Top Reviewed Products (Top 10)")
 
 if "reviews_raw" in df.columns:
-    top_reviewed = df.sort_values(by="reviews_raw", ascending=False).head(10)
-    fig3, ax3 = plt.subplots(figsize=(10, 5))
-    sns.barplot(
-        data=top_reviewed,
-        x="reviews_raw",
-        y="name",
-        ax=ax3
-    )
-    ax3.set_title("Top 10 Reviewed Products")
-    ax3.set_xlabel("Number of Reviews")
-    ax3.set_ylabel("Product Name")
-    st.pyplot(fig3)
+    if st.toggle("Show chart", value=True, key="show_top_reviewed"):
+        with timed("render", "3. Top reviewed"):
+            st.image(render_chart("top_reviewed", data_version, snapshot))
 
-    st.write("Top reviewed products table:")
-    st.dataframe(top_reviewed[["category", "name", "price_raw", "rating_raw", "reviews_raw", "url"]])
+            top_reviewed = top_reviewed_table(data_version, snapshot)
+            st.write("Top reviewed products table:")
+            st.dataframe(top_reviewed[["category", "name", "price_raw", "rating_raw", "reviews_raw", "url"]])
 else:
     st.warning("Column 'reviews_raw' not found in data. Skipping this analysis.")
 
 # 4. Best value metric per category (price_to_rating)
 st.subheader("4️⃣ Best Value Products (Lowest Price per Rating)")
 
-if "price_to_rating" not in df.columns:
-    df["price_to_rating"] = df["price_raw"] / df["rating_raw"]
+if st.toggle("Show chart", value=True, key="show_best_value"):
+    with timed("render", "4. Best value"):
+        st.image(render_chart("best_value", data_version, snapshot))
 
-best_value = (
-    df.sort_values(by="price_to_rating", ascending=True)
-      .groupby("category")
-      .head(5)
-)
-
-fig4, ax4 = plt.subplots(figsize=(10, 6))
-sns.barplot(
-    data=best_value,
-    x="price_to_rating",
-    y="name",
-    hue="category",
-    ax=ax4
-)
-ax4.set_title("Best Value Products (Lowest Price per Rating) – Top 5 per Category")
-ax4.set_xlabel("Price per Rating")
-ax4.set_ylabel("Product Name")
-st.pyplot(fig4)
-
-st.write("Best value products table:")
-st.dataframe(best_value[["category", "name", "price_raw", "rating_raw", "price_to_rating", "url"]])
+        best_value = best_value_table(data_version, snapshot)
+        st.write("Best value products table:")
+        st.dataframe(best_value[["category", "name", "price_raw", "rating_raw", "price_to_rating", "url"]])
 
 # 5. Price vs Reviews (popularity proxy)
 st.subheader("5️⃣ Price vs Reviews (Popularity Proxy)")
 
 if "reviews_raw" in df.columns:
-    fig5, ax5 = plt.subplots(figsize=(10, 5))
-    sns.scatterplot(
-        data=filtered_df,
-        x="price_raw",
-        y="reviews_raw",
-        hue="category",
-        ax=ax5
-    )
-    ax5.set_title("Price vs Number of Reviews")
-    ax5.set_xlabel("Price")
-    ax5.set_ylabel("Number of Reviews")
-    ax5.legend(title="Category", bbox_to_anchor=(1.05, 1), loc="upper left")
-    st.pyplot(fig5)
+    if st.toggle("Show chart", value=True, key="show_price_vs_reviews"):
+        with timed("render", "5. Price vs reviews"):
+            st.image(render_filtered_chart("price_vs_reviews", data_version, *filter_state, snapshot))
 else:
     st.warning("Column 'reviews_raw' not found in data. Skipping this analysis.")
 
@@ -201,115 +235,83 @@ st.header("🧮 Part 5 – SQL Aggregated Analysis")
 
 st.markdown(
     """
-    You can optionally connect to your **SQL Server** database  
-    and run the aggregated queries (average price, rating, counts, etc.).
+    You can optionally run the aggregated queries (average price, rating, counts, etc.)  
+    on a local SQLite copy of the cleaned data, or connect to your **SQL Server** database.
     """
 )
 
-use_sql = st.checkbox("🔌 Connect to SQL Server for aggregated metrics")
+@st.cache_resource
+def get_report_backend(name, **options):
+    # One backend (and connection pool) per set of settings, shared by every session and rerun
+    return get_backend(name, **options)
+
+use_sql = st.checkbox("🔌 Run SQL aggregated metrics")
 
 if use_sql:
-    st.subheader("SQL Server Connection Settings")
+    backend_name = st.radio("Database", ["Local (SQLite)", "SQL Server"])
+
+    backend_options = {}
+    if backend_name == "SQL Server":
+        st.subheader("SQL Server Connection Settings")
+
+        server = st.text_input("Server name", value="localhost\\SQLEXPRESS")
+        database = st.text_input("Database name", value="BanggoodProducts")
+
+        auth_type = st.radio("Authentication type", ["Windows (Trusted_Connection)", "SQL Login"])
 
-    server = st.text_input("Server name", value="localhost\\SQLEXPRESS")
-    database = st.text_input("Database name", value="BanggoodProducts")
+        username = password = None
+        if auth_type == "SQL Login":
+            username = st.text_input("SQL Username", value="", type="default")
+            password = st.text_input("SQL Password", value="", type="password")
 
-    auth_type = st.radio("Authentication type", ["Windows (Trusted_Connection)", "SQL Login"])
+        backend_options = {'server': server, 'database': database, 'username': username, 'password': password}
 
-    username = password = None
-    if auth_type == "SQL Login":
-        username = st.text_input("SQL Username", value="", type="default")
-        password = st.text_input("SQL Password", value="", type="password")
+    top_n = st.number_input("Top reviewed products per category", min_value=1, max_value=100, value=TOP_N, step=1)
 
     if st.button("Connect and Run Aggregated Queries"):
         try:
-            if auth_type == "Windows (Trusted_Connection)":
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={server};DATABASE={database};Trusted_Connection=yes"
-                )
+            backend = get_report_backend('sqlserver' if backend_name == "SQL Server" else 'sqlite', **backend_options)
+
+            # One grouped scan for the per-category metrics, plus the per-category
+            # top reviewed products in the same round trip, on a warm pooled connection
+            with timed("query", "Part 5 aggregated queries", backend=backend.dialect) as event, \
+                    backend.lease() as conn:
+                report = run_category_report(conn, top_n=top_n, dialect=backend.dialect)
+                event['rows'] = len(report.summary) + len(report.top_reviewed)
+
+            summary = report.summary
+            if report.from_summary:
+                st.caption("Per-category metrics read from the materialized summary table.")
             else:
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={server};DATABASE={database};UID={username};PWD={password}"
-                )
-
-            conn = pyodbc.connect(conn_str)
-
-            # 1. Average price per category
-            avg_price = pd.read_sql_query(
-                """
-                SELECT category,
-                       AVG(price_raw) AS average_price
-                FROM Products
-                GROUP BY category;
-                """,
-                conn
-            )
-
-            # 2. Average rating per category
-            avg_rating = pd.read_sql_query(
-                """
-                SELECT category,
-                       AVG(rating_raw) AS average_rating
-                FROM Products
-                GROUP BY category;
-                """,
-                conn
-            )
-
-            # 3. Product count per category
-            product_count = pd.read_sql_query(
-                """
-                SELECT category,
-                       COUNT(*) AS product_count
-                FROM Products
-                GROUP BY category;
-                """,
-                conn
-            )
-
-            # 4. Top 5 reviewed items (global top 5)
-            top5_reviewed = pd.read_sql_query(
-                """
-                SELECT TOP 5 category, name, reviews_raw
-                FROM Products
-                WHERE reviews_raw IS NOT NULL
-                ORDER BY reviews_raw DESC;
-                """,
-                conn
-            )
-
-            # 5. Stock availability percentage (reviews > 0 as proxy)
-            stock_availability = pd.read_sql_query(
-                """
-                SELECT category,
-                       CAST(
-                           100.0 * COUNT(CASE WHEN reviews_raw > 0 THEN 1 END)
-                           / COUNT(*) AS DECIMAL(10,2)
-                       ) AS stock_availability_percentage
-                FROM Products
-                GROUP BY category;
-                """,
-                conn
-            )
-
-            conn.close()
+                st.caption("Per-category metrics computed from Products (materialized summary stale or missing).")
 
             st.subheader("1️⃣ Average Price per Category (SQL)")
-            st.dataframe(avg_price)
+            st.dataframe(summary[["category", "average_price"]])
 
             st.subheader("2️⃣ Average Rating per Category (SQL)")
-            st.dataframe(avg_rating)
+            st.dataframe(summary[["category", "average_rating"]])
 
             st.subheader("3️⃣ Product Count per Category (SQL)")
-            st.dataframe(product_count)
+            st.dataframe(summary[["category", "product_count"]])
 
-            st.subheader("4️⃣ Top 5 Reviewed Products (SQL)")
-            st.dataframe(top5_reviewed)
+            st.subheader(f"4️⃣ Top {top_n} Reviewed Products per Category (SQL)")
+            st.dataframe(report.top_reviewed)
 
             st.subheader("5️⃣ Stock Availability Percentage (SQL)")
-            st.dataframe(stock_availability)
+            st.dataframe(summary[["category", "stock_availability_percentage"]])
 
         except Exception as e:
-            st.error(f"Error connecting to SQL Server or running queries: {e}")
+            st.error(f"Error connecting to the database or running queries: {e}")
+
+# =========================
+# TIMINGS
+# =========================
+# Cached charts show up as near-zero render times; a slow row is a cache miss
+with st.expander("⏱️ Render and query times (this run)"):
+    if section_timings:
+        timings = pd.DataFrame(section_timings)
+        timings["milliseconds"] = (timings["seconds"] * 1000).round(1)
+        st.dataframe(timings.reindex(columns=["event", "name", "milliseconds", "rows"]), hide_index=True)
+        st.caption(f"Total {timings['seconds'].sum():.2f}s; every event is also appended to the pipeline log.")
+    else:
+        st.write("No sections rendered.")
@@ -0,0 +1,288 @@
+# synthetic_catalog.py
+# A fake Banggood catalog for benchmarks: any number of products spread over a
+# few categories, as raw CSV rows (the columns clean_data.py reads) or as
+# paginated listing pages served over HTTP to scrapper.py. Every field is a
+# hash of the product id, so a product looks the same in the CSV, in its
+# listing page and across runs, and nothing has to be held in memory.
+import argparse
+import html
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse
+
+import numpy as np
+import pandas as pd
+
+from product_sink import RAW_COLUMNS
+
+PRODUCTS_PER_PAGE = 60  # Cards on one listing page, like the real site
+CSV_CHUNK_SIZE = 500_000  # Rows generated and written at a time
+PAGE_LINKS_AROUND = 2  # Numbered page links shown either side of the current page
+SYNTHETIC_BASE_URL = "https://www.banggood.example"
+CATEGORY_NAMES = (
+    "Phones", "Laptops", "Tablets", "Smart Watches", "Headphones", "Cameras",
+    "Drones", "Lighting", "Tools", "Home Appliances", "Toys", "Outdoor",
+)
+MISSING_PRICE_RATE = 0.01
+MISSING_RATING_RATE = 0.05
+
+# Markup of the generated listing pages; pass these to scrapper.LxmlExtractor
+SYNTHETIC_SELECTORS = {
+    'product_container': 'div.product-card',
+    'product_name': 'a.product-title',
+    'product_price': 'span.price',
+    'product_rating': 'span.rating',
+    'product_reviews': 'span.reviews',
+    'next_page_button': 'a.next-page',
+}
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+def _uniform(ids, salt):
+    """splitmix64 of (id, salt) as floats in [0, 1): the same id always gets the same value."""
+    with np.errstate(over='ignore'):
+        x = np.asarray(ids, dtype=np.uint64) * _GOLDEN + np.uint64(salt) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+class SyntheticCatalog:
+    """
+    Product i belongs to category i % categories; a category's products are
+    listed in id order, PRODUCTS_PER_PAGE to a page. With window_pagination
+    the page links only show the pages around the current one (no first or
+    last page, no ellipsis).
+    """
+
+    def __init__(self, products, categories=len(CATEGORY_NAMES), per_page=PRODUCTS_PER_PAGE, seed=0,
+                 base_url=SYNTHETIC_BASE_URL, window_pagination=False):
+        if products < 1 or categories < 1 or per_page < 1:
+            raise ValueError("products, categories and per_page must be positive")
+        self.products = products
+        self.per_page = per_page
+        self.seed = seed
+        self.base_url = base_url
+        self.window_pagination = window_pagination
+        self.category_names = [CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i + 1}"
+                               for i in range(min(categories, products))]
+        self.category_slugs = [slugify(name) for name in self.category_names]
+
+    def category_size(self, category):
+        count = len(self.category_names)
+        return self.products // count + (1 if category < self.products % count else 0)
+
+    def pages(self, category):
+        return -(-self.category_size(category) // self.per_page)
+
+    def total_pages(self):
+        return sum(self.pages(category) for category in range(len(self.category_names)))
+
+    def page_path(self, category, page):
+        return f"/category/{self.category_slugs[category]}/page-{page}.html"
+
+    def product_ids(self, category, page):
+        """Ids of the products on one listing page (page numbers start at 1)."""
+        first = (page - 1) * self.per_page
+        last = min(page * self.per_page, self.category_size(category))
+        return category + np.arange(first, max(first, last), dtype=np.int64) * len(self.category_names)
+
+    def product_fields(self, ids):
+        """The raw fields of the given products as arrays; missing prices/ratings are NaN."""
+        ids = np.asarray(ids, dtype=np.int64)
+        salt = self.seed * 8
+        price = np.round(0.99 + np.expm1(_uniform(ids, salt) * 7.0), 2)
+        price[_uniform(ids, salt + 1) < MISSING_PRICE_RATE] = np.nan
+        rating = np.round(1.0 + 4.0 * _uniform(ids, salt + 2) ** 0.4, 1)
+        rating[_uniform(ids, salt + 3) < MISSING_RATING_RATE] = np.nan
+        reviews = np.floor(np.expm1(_uniform(ids, salt + 4) ** 2 * 10.0)).astype(np.int64)
+        return {'category': ids % len(self.category_names), 'price': price, 'rating': rating, 'reviews': reviews}
+
+    def product_names(self, ids, categories):
+        return [f"{self.category_names[c]} model {i}" for i, c in zip(ids.tolist(), categories.tolist())]
+
+    def product_paths(self, ids, categories):
+        return [f"/p/{self.category_slugs[c]}-{i}.html" for i, c in zip(ids.tolist(), categories.tolist())]
+
+    def raw_frame(self, ids):
+        """Products as the scraper would store them (product_sink.RAW_COLUMNS)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        fields = self.product_fields(ids)
+        categories = fields['category']
+        price = pd.Series(fields['price'])
+        price_text = ("US$" + price.map("{:,.2f}".format)).where(price.notna(), "N/A")
+        return pd.DataFrame({
+            'category': pd.Categorical.from_codes(categories, self.category_names).astype(object),
+            'name': self.product_names(ids, categories),
+            'price_raw': price_text,
+            'rating_raw': fields['rating'],
+            'reviews_raw': fields['reviews'],
+            'url': [urljoin(self.base_url, path) for path in self.product_paths(ids, categories)],
+        }, columns=list(RAW_COLUMNS.values()))
+
+    def iter_raw_chunks(self, chunksize=CSV_CHUNK_SIZE):
+        for start in range(0, self.products, chunksize):
+            yield self.raw_frame(np.arange(start, min(start + chunksize, self.products), dtype=np.int64))
+
+    def write_raw_csv(self, path, chunksize=CSV_CHUNK_SIZE):
+        """Writes the whole catalog as one raw CSV, chunk by chunk; returns the row count."""
+        tmp_path = f"{path}.tmp"
+        rows = 0
+        for chunk in self.iter_raw_chunks(chunksize):
+            chunk.to_csv(tmp_path, mode="w" if rows == 0 else "a", header=rows == 0, index=False, encoding="utf-8")
+            rows += len(chunk)
+        os.replace(tmp_path, path)
+        return rows
+
+    def _pagination_html(self, category, page):
+        pages = self.pages(category)
+        shown = set(range(max(1, page - PAGE_LINKS_AROUND), min(pages, page + PAGE_LINKS_AROUND) + 1))
+        if not self.window_pagination:
+            shown |= {1, pages}
+        parts = []
+        previous = min(shown) - 1
+        for number in sorted(shown):
+            if number > previous + 1:
+                parts.append('<span class="ellipsis">...</span>')
+            if number == page:
+                parts.append(f'<span class="current">{number}</span>')
+            else:
+                parts.append(f'<a href="{self.page_path(category, number)}">{number}</a>')
+            previous = number
+        if page < pages:
+            parts.append(f'<a class="next-page" href="{self.page_path(category, page + 1)}">Next</a>')
+        return '<div class="pagination">' + ''.join(parts) + '</div>'
+
+    def listing_page_html(self, category, page):
+        """One listing page in SYNTHETIC_SELECTORS markup, or None past the last page."""
+        if not 0 <= category < len(self.category_names) or not 1 <= page <= self.pages(category):
+            return None
+        ids = self.product_ids(category, page)
+        fields = self.product_fields(ids)
+        names = self.product_names(ids, fields['category'])
+        paths = self.product_paths(ids, fields['category'])
+
+        cards = []
+        for name, path, price, rating, reviews in zip(names, paths, fields['price'].tolist(),
+                                                      fields['rating'].tolist(), fields['reviews'].tolist()):
+            price_html = f'<span class="price">US${price:,.2f}</span>' if price == price else ''
+            rating_html = f'<span class="rating" data-rating="{rating}"></span>' if rating == rating else ''
+            cards.append(
+                f'<div class="product-card"><a class="product-title" href="{path}">{html.escape(name)}</a>'
+                f'{price_html}{rating_html}<span class="reviews">({reviews:,})</span></div>'
+            )
+        title = html.escape(self.category_names[category])
+        return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title} - page {page}</title></head>'
+                f'<body><h1>{title}</h1><div class="product-list">{"".join(cards)}</div>'
+                f'{self._pagination_html(category, page)}</body></html>')
+
+    def parse_page_path(self, path):
+        """(category, page) for a listing page path, or None."""
+        match = re.fullmatch(r'/category/([a-z0-9-]+)/page-(\d+)\.html', path)
+        if match is None or match.group(1) not in self.category_slugs:
+            return None
+        return self.category_slugs.index(match.group(1)), int(match.group(2))
+
+    def write_listing_pages(self, directory, max_pages=None):
+        """Writes listing pages as static files under directory (first max_pages per category)."""
+        written = 0
+        for category in range(len(self.category_names)):
+            pages = self.pages(category) if max_pages is None else min(max_pages, self.pages(category))
+            for page in range(1, pages + 1):
+                path = os.path.join(directory, *self.page_path(category, page).strip('/').split('/'))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(self.listing_page_html(category, page))
+                written += 1
+        return written
+
+class CatalogServer:
+    """
+    Local stand-in for the listing pages: serves a SyntheticCatalog over HTTP
+    from a background thread. start_urls() has the shape of config.CATEGORIES.
+    """
+
+    def __init__(self, catalog, host="127.0.0.1", port=0):
+        self.catalog = catalog
+        self.requests_served = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real site behind requests' pool
+
+            def do_GET(self):
+                target = catalog.parse_page_path(urlparse(self.path).path)
+                body = catalog.listing_page_html(*target) if target is not None else None
+                if body is None:
+                    self.send_error(404)
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                server.requests_served += 1
+
+            def log_message(self, format, *args):
+                pass  # One line per page would drown the benchmark output
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="catalog-server")
+        self._thread.start()
+        return self
+
+    def start_urls(self):
+        return {name: [self.url + self.catalog.page_path(category, 1)]
+                for category, name in enumerate(self.catalog.category_names)}
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Banggood catalog.")
+    parser.add_argument("--products", type=int, default=10_000, help="Number of products")
+    parser.add_argument("--categories", type=int, default=len(CATEGORY_NAMES), help="Number of categories")
+    parser.add_argument("--seed", type=int, default=0, help="Changes every generated value")
+    parser.add_argument("--raw-csv", metavar="PATH", help="Write the catalog as a raw CSV for clean_data.py")
+    parser.add_argument("--html-dir", metavar="DIR", help="Write listing pages as static HTML files")
+    parser.add_argument("--max-pages", type=int, default=None, help="Listing pages written per category")
+    parser.add_argument("--serve", action="store_true", help="Serve the listing pages until interrupted")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --serve")
+    args = parser.parse_args()
+
+    catalog = SyntheticCatalog(args.products, args.categories, seed=args.seed)
+    if args.raw_csv:
+        print(f"Wrote {catalog.write_raw_csv(args.raw_csv):,} products to {args.raw_csv}")
+    if args.html_dir:
+        print(f"Wrote {catalog.write_listing_pages(args.html_dir, args.max_pages):,} listing pages to {args.html_dir}")
+    if args.serve:
+        server = CatalogServer(catalog, port=args.port).start()
+        print(f"Serving {catalog.total_pages():,} listing pages at {server.url}, e.g.")
+        for name, urls in server.start_urls().items():
+            print(f"  {name}: {urls[0]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.close()
@@ -0,0 +1,72 @@
+import pandas as pd
+
+import clean_data
+from clean_data import clean_streaming
+from product_sink import ProductSink
+
+def product(number, price="US$10.00"):
+    return {'category': 'Phones', 'product_name': f"Phone {number}", 'price': price, 'rating': 4.0,
+            'reviews_count': 3, 'url': f"https://www.banggood.com/Phone-{number}-p-{number}.html"}
+
+def test_parts_added_between_the_passes_are_left_for_the_next_run(tmp_path, monkeypatch):
+    raw_dir = str(tmp_path / "raw")
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(1), product(2)])
+
+    scan_raw = clean_data.scan_raw
+
+    def scan_then_crawl(*args, **kwargs):
+        stats = scan_raw(*args, **kwargs)
+        # A crawl writes a new part (an updated duplicate of product 1) during pass 2
+        with ProductSink(raw_dir) as sink:
+            sink.write([product(1, "US$99.00"), product(3)])
+        return stats
+
+    monkeypatch.setattr(clean_data, 'scan_raw', scan_then_crawl)
+    output = tmp_path / "cleaned.csv"
+    stats = clean_streaming(raw_dir, output_file=str(output), parquet_file=None, state_file=None)
+
+    cleaned = pd.read_csv(output)
+    assert stats['rows_written'] == 2
+    assert sorted(cleaned['price_raw']) == [10.0, 10.0]
+
+def test_incremental_clean_matches_a_full_clean_of_the_latest_crawl(tmp_path):
+    raw_dir, full_dir = str(tmp_path / "raw"), str(tmp_path / "full")
+    output, state = str(tmp_path / "cleaned.csv"), str(tmp_path / "state.parquet")
+    paths = dict(output_file=output, parquet_file=str(tmp_path / "cleaned.parquet"), state_file=state)
+
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(1), product(2), product(3), dict(product(4), rating=None)])
+        sink.mark_complete()
+    clean_data.clean_incremental(raw_dir, **paths)
+
+    # Product 1 is gone, 2 changed, 3 and 4 are unchanged and 5 is new
+    second_crawl = [product(2, "US$12.50"), product(3), dict(product(4), rating=None), product(5, None)]
+    for path in (raw_dir, full_dir):
+        with ProductSink(path) as sink:
+            sink.write(second_crawl)
+            sink.mark_complete()
+    summary = clean_data.clean_incremental(raw_dir, **paths)
+
+    full_output = str(tmp_path / "full.csv")
+    clean_streaming(full_dir, output_file=full_output, parquet_file=None, state_file=None)
+    incremental = pd.read_csv(output).sort_values('url', ignore_index=True)
+    full = pd.read_csv(full_output).sort_values('url', ignore_index=True)
+    assert (summary['added'], summary['changed'], summary['deleted'], summary['unchanged']) == (1, 1, 1, 2)
+    pd.testing.assert_frame_equal(incremental[full.columns], full, check_exact=False, rtol=1e-12)
+
+def test_incremental_clean_keeps_rows_missing_from_an_unfinished_crawl(tmp_path):
+    raw_dir = str(tmp_path / "raw")
+    paths = dict(output_file=str(tmp_path / "cleaned.csv"), parquet_file=str(tmp_path / "cleaned.parquet"),
+                 state_file=str(tmp_path / "state.parquet"))
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(1), product(2)])
+        sink.mark_complete()
+    clean_data.clean_incremental(raw_dir, **paths)
+
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(2, "US$12.50")])
+    summary = clean_data.clean_incremental(raw_dir, **paths)
+
+    assert summary['deleted'] == 0
+    assert summary['rows'] == 2
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from crawl_state import CrawlState
+from crawler import HostRateLimiter, TokenBucket, crawl_categories
+from product_sink import ProductSink, read_products
+from scrapper import LxmlExtractor
+from synthetic_catalog import SYNTHETIC_SELECTORS, CatalogServer, SyntheticCatalog
+
+@pytest.fixture(scope="module")
+def catalog_server():
+    with CatalogServer(SyntheticCatalog(600, categories=2, per_page=50)) as server:
+        yield server
+
+def crawl(server, output_dir, state, max_pages=4):
+    extractor = LxmlExtractor(SYNTHETIC_SELECTORS, base_url=server.catalog.base_url)
+    state.begin_crawl()
+    with ProductSink(str(output_dir)) as sink:
+        crawl_categories(categories=server.start_urls(), max_pages=max_pages, workers=4, requests_per_second=1000,
+                         extractor=extractor, sink=sink, state=state)
+    return read_products(str(output_dir))
+
+def test_unchanged_pages_are_written_again(catalog_server, tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    first = crawl(catalog_server, tmp_path / "first", state)
+    second = crawl(catalog_server, tmp_path / "second", state)
+    summary = state.summary()
+    state.close()
+
+    assert len(first) == 2 * 4 * 50
+    assert summary['changed'] == 0 and summary['unchanged'] == 8
+    assert sorted(second['url']) == sorted(first['url'])
+
+def test_windowed_pagination_is_crawled_past_the_planned_pages(tmp_path):
+    catalog = SyntheticCatalog(1000, categories=1, per_page=50, window_pagination=True)
+    with CatalogServer(catalog) as server:
+        state = CrawlState(str(tmp_path / "state.sqlite"))
+        products = crawl(server, tmp_path / "raw", state, max_pages=8)
+        state.close()
+
+    # Pages 4-8 are only reachable by following Next from the last planned page
+    assert len(products) == 8 * 50
+    assert products['url'].nunique() == 8 * 50
+
+def test_concurrent_acquires_are_spaced_at_the_rate():
+    rate, callers = 20, 8
+    bucket = TokenBucket(rate, capacity=1)
+    waits = []
+    threads = [threading.Thread(target=lambda: waits.append(bucket.acquire())) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The first caller takes the one banked token, each later one waits 1/rate longer
+    assert sorted(waits) == pytest.approx([i / rate for i in range(callers)], abs=0.01)
+
+def test_rate_limiter_keeps_one_bucket_per_host():
+    limiter = HostRateLimiter(requests_per_second=10, burst=1)
+    assert limiter.wait("https://www.banggood.com/a.html") == 0
+    # Another host has its own budget; the same host (any case) shares it
+    assert limiter.wait("https://img.banggood.com/b.jpg") == 0
+    assert limiter.wait("https://WWW.banggood.com/c.html") == pytest.approx(0.1, abs=0.01)
+    assert limiter.bucket_for("https://www.banggood.com/") is not limiter.bucket_for("https://img.banggood.com/")
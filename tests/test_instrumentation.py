@@ -0,0 +1,27 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from instrumentation import in_stage, recent_events, span, stage
+
+def setup_module():
+    instrumentation.configure(log_path='')
+
+def log_span(name):
+    with span('test', name):
+        pass
+
+def test_spans_of_other_threads_are_not_attributed_to_this_stage():
+    with stage('outer'):
+        thread = threading.Thread(target=log_span, args=('other thread',))
+        thread.start()
+        thread.join()
+        log_span('same thread')
+    events = {event['name']: event for event in recent_events('test')}
+    assert 'stage' not in events['other thread']
+    assert events['same thread']['stage'] == 'outer'
+
+def test_in_stage_carries_the_stage_into_workers():
+    with stage('crawl'), ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(in_stage(log_span), ['worker task']))
+    assert recent_events('test')[-1]['stage'] == 'crawl'
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from product_history import STAGED_PREFIX, ProductHistory, record_raw
+from product_sink import ProductSink
+
+def product(number, price="US$10.00"):
+    return {'category': 'Phones', 'product_name': f"Phone {number}", 'price': price, 'rating': 4.0,
+            'reviews_count': 3, 'url': f"https://www.banggood.com/Phone-{number}-p-{number}.html"}
+
+def test_record_raw_keeps_only_new_and_changed_products(tmp_path):
+    raw_dir = str(tmp_path / "raw")
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(1), product(2), product(3)])
+    # Product 1 dropped out, 2 changed price, 3 is unchanged and 4 is new
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(2, "US$12.50"), product(3), product(4)])
+    history = ProductHistory(str(tmp_path / "history"))
+
+    assert record_raw(raw_dir, history) == 2
+    assert record_raw(raw_dir, history) == 0
+    assert len(history.identity()) == 4
+    assert len(history.observations()) == 3 + 2
+    assert sorted(history.product_history(product(2)['url'])['price']) == [10.0, 12.5]
+    assert len(history.product_history(product(3)['url'])) == 1
+
+def test_record_raw_completes_an_interrupted_recording(tmp_path, monkeypatch):
+    raw_dir = str(tmp_path / "raw")
+    with ProductSink(raw_dir) as sink:
+        sink.write([product(1), product(2)])
+    history = ProductHistory(str(tmp_path / "history"))
+
+    replace = os.replace
+
+    def crash_before_commit(src, dst):
+        # The staged part's rename is the last step of record()
+        if os.path.basename(src).startswith(STAGED_PREFIX) and src.endswith('.parquet'):
+            raise OSError("interrupted")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', crash_before_commit)
+    with pytest.raises(OSError):
+        record_raw(raw_dir, history)
+    monkeypatch.undo()
+    assert history.recorded_crawls() == set()
+    assert len(history.observations()) == 0
+
+    assert record_raw(raw_dir, history) == 1
+    assert len(history.recorded_crawls()) == 1
+    assert sorted(history.observations()['product_id']) == [1, 2]
@@ -0,0 +1,20 @@
+from product_sink import ProductSink, list_crawls, read_products
+
+def product(number):
+    return {'category': 'Phones', 'product_name': f"Phone {number}", 'price': 'US$1.00', 'rating': 4.0,
+            'reviews_count': 1, 'url': f"https://www.banggood.com/Phone-{number}-p-{number}.html"}
+
+def test_sinks_opened_back_to_back_keep_their_own_parts(tmp_path):
+    for first in (1, 3):
+        with ProductSink(str(tmp_path), batch_size=1) as sink:
+            sink.write([product(first), product(first + 1)])
+
+    assert len(read_products(str(tmp_path))) == 4
+    assert [len(parts) for parts in list_crawls(str(tmp_path)).values()] == [2, 2]
+
+def test_on_written_waits_for_the_part_file(tmp_path):
+    written = []
+    with ProductSink(str(tmp_path), batch_size=3) as sink:
+        sink.write([product(1), product(2)], on_written=lambda: written.append('page'))
+        assert written == []
+    assert written == ['page']
@@ -0,0 +1,47 @@
+import pytest
+
+from scrapper import LxmlExtractor, check_extractor_parity, plan_pagination
+from synthetic_catalog import SYNTHETIC_SELECTORS, SyntheticCatalog
+
+CATALOG = SyntheticCatalog(500, categories=3, per_page=60)
+
+@pytest.mark.parametrize("category, page", [(0, 1), (1, 2), (2, CATALOG.pages(2))])
+def test_lxml_extractor_matches_soup(category, page):
+    page_html = CATALOG.listing_page_html(category, page)
+    assert check_extractor_parity(page_html, CATALOG.category_names[category], selectors=SYNTHETIC_SELECTORS,
+                                  base_url=CATALOG.base_url) == []
+
+def test_fixture_page_has_products():
+    # Guards the parity test against both engines extracting nothing
+    extractor = LxmlExtractor(SYNTHETIC_SELECTORS, base_url=CATALOG.base_url)
+    products = extractor.extract_products(extractor.parse(CATALOG.listing_page_html(0, 1)), CATALOG.category_names[0])
+    assert len(products) == len(CATALOG.product_ids(0, 1))
+
+@pytest.mark.parametrize("page_html", ["", "  \n\t"])
+def test_empty_page_has_no_products(page_html):
+    extractor = LxmlExtractor(SYNTHETIC_SELECTORS, base_url=CATALOG.base_url)
+    assert not extractor.has_products(extractor.parse(page_html))
+    assert check_extractor_parity(page_html, CATALOG.category_names[0], selectors=SYNTHETIC_SELECTORS,
+                                  base_url=CATALOG.base_url) == []
+
+def plan(catalog, category, max_pages):
+    extractor = LxmlExtractor(SYNTHETIC_SELECTORS, base_url=catalog.base_url)
+    start_url = catalog.base_url + catalog.page_path(category, 1)
+    return plan_pagination(extractor.parse(catalog.listing_page_html(category, 1)), start_url, max_pages, extractor)
+
+def page_urls(catalog, category, pages):
+    return [catalog.base_url + catalog.page_path(category, page) for page in range(1, pages + 1)]
+
+def test_plan_fills_pages_hidden_behind_the_ellipsis():
+    catalog = SyntheticCatalog(2000, categories=1, per_page=50)  # 40 pages: "1 2 3 ... 40 Next"
+    assert plan(catalog, 0, max_pages=25) == page_urls(catalog, 0, 25)
+    assert plan(catalog, 0, max_pages=100) == page_urls(catalog, 0, 40)
+
+def test_plan_stops_at_the_end_of_a_page_window():
+    # "1 2 3 Next": the plan ends at page 3 and the crawler follows Next from there
+    catalog = SyntheticCatalog(2000, categories=1, per_page=50, window_pagination=True)
+    assert plan(catalog, 0, max_pages=25) == page_urls(catalog, 0, 3)
+
+def test_plan_of_a_single_page_category():
+    catalog = SyntheticCatalog(40, categories=1, per_page=50)
+    assert plan(catalog, 0, max_pages=5) == page_urls(catalog, 0, 1)
@@ -22,71 +22,273 @@
 #     # ... add other categories/urls (5 categories, 5-10 subcategories total)
 # }
 
-import pandas as pd
+# The five exploratory charts of the cleaned data. Run without arguments to
+# show them in interactive windows, or with --batch DIR to render them headless
+# (whole dataset plus one report per category) to PNG/SVG files and an index
+# page. The data is loaded and aggregated once per report in this process; the
+# rendering is spread over a process pool that only receives each chart's
+# (small) aggregated data.
+import argparse
+import html
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
+from matplotlib import cbook
 
-# Load the cleaned data into a DataFrame
-df = pd.read_csv("banggood_products_cleaned.csv")
+from charts import best_value_products, stratified_sample
+from dataset import load_cleaned
+from instrumentation import PROFILERS, configure, log_event, stage
 
-# Set the style for seaborn plots
-sns.set(style="whitegrid")
+REPORT_COLUMNS = ['category', 'name', 'price_raw', 'rating_raw', 'reviews_raw', 'price_to_rating']
+BATCH_OUTPUT_DIR = "banggood_reports"
+BATCH_FORMATS = ('png', 'svg')
+MAX_BOX_FLIERS = 1000  # Outlier markers drawn per box; large categories have far more
+ALL_SCOPE = "All products"
 
-# 1. Price Distribution per Category
-plt.figure(figsize=(10, 6))
-sns.boxplot(x='category', y='price_raw', data=df)
-plt.title('Price Distribution per Category')
-plt.xticks(rotation=90)  # Rotate x-axis labels for better readability
-plt.show()  # Show the plot
+CHART_TITLES = {
+    'price_distribution': 'Price Distribution per Category',
+    'rating_vs_price': 'Rating vs Price Correlation',
+    'top_reviewed': 'Top Reviewed Products',
+    'best_value': 'Best Value Metric per Category',
+    'price_vs_reviews': 'Stock Availability Analysis (Price vs Reviews)',
+}
 
-# 2. Rating vs Price Correlation with Color Differentiation by Category
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x='price_raw', y='rating_raw', data=df, hue='category', palette='tab20', s=100, edgecolor='black')
+def prepare_report(df, seed=0):
+    """
+    Aggregates one report's data (whole dataset or one category) into small
+    per-chart payloads, so rendering cost does not depend on the row count.
+    """
+    # Box statistics instead of raw prices; fliers thinned to a sample
+    boxes = []
+    for category, group in df.groupby('category', observed=True):
+        prices = group['price_raw'].dropna().to_numpy()
+        if not len(prices):
+            continue
+        stats = cbook.boxplot_stats(prices, labels=[category])[0]
+        if len(stats['fliers']) > MAX_BOX_FLIERS:
+            stats['fliers'] = np.random.default_rng(seed).choice(stats['fliers'], MAX_BOX_FLIERS, replace=False)
+        boxes.append(stats)
 
-# Add title and labels
-plt.title('Rating vs Price Correlation')
-plt.xlabel('Price')
-plt.ylabel('Rating')
+    # Large catalogs are plotted from a per-category sample so scatter plots stay quick to draw
+    scatter = stratified_sample(df[['category', 'price_raw', 'rating_raw', 'reviews_raw']], seed=seed)
 
-# Show the plot with legend for different categories
-plt.legend(title='Category', bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.show()  # Show the plot
+    # Best value metric: price per rating unit, as stored by clean_data.py
+    best_value = best_value_products(df)[['category', 'name', 'price_to_rating']]
 
-# 3. Top Reviewed Products (Corrected)
-top_reviewed_products = df[['name', 'reviews_raw']].sort_values(by='reviews_raw', ascending=False).head(10)
+    return {
+        'price_distribution': {'boxes': boxes},
+        'rating_vs_price': {'rows': scatter[['category', 'price_raw', 'rating_raw']], 'total': len(df)},
+        'top_reviewed': {'rows': df[['name', 'reviews_raw']].sort_values(by='reviews_raw', ascending=False).head(10)},
+        'best_value': {'rows': best_value},
+        'price_vs_reviews': {'rows': scatter[['price_raw', 'reviews_raw']], 'total': len(df)},
+    }
 
-# Create a horizontal bar plot to make it easier to read long product names
-plt.figure(figsize=(10, 6))
-sns.barplot(x='reviews_raw', y='name', data=top_reviewed_products, palette='viridis')
+def _sample_note(data):
+    rows = len(data['rows'])
+    return f" ({rows:,} of {data['total']:,} products, sampled)" if data['total'] > rows else ""
 
-# Add a title and labels
-plt.title('Top Reviewed Products')
-plt.xlabel('Number of Reviews')
-plt.ylabel('Product Name')
+def _marker_style(data):
+    # Big edged markers only while every product is drawn
+    return {'s': 8, 'linewidth': 0} if data['total'] > len(data['rows']) else {'s': 100, 'edgecolor': 'black'}
 
-# Rotate x-axis labels for better readability (if necessary)
-plt.xticks(rotation=45)
+# 1. Price Distribution per Category
+def plot_price_distribution(data):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if data['boxes']:
+        ax.bxp(data['boxes'], patch_artist=True,
+               boxprops={'facecolor': sns.color_palette()[0]}, medianprops={'color': 'black'})
+    ax.set_title(CHART_TITLES['price_distribution'])
+    ax.set_xlabel('category')
+    ax.set_ylabel('price_raw')
+    plt.setp(ax.get_xticklabels(), rotation=90)  # Rotate x-axis labels for better readability
+    return fig
 
-# Show the plot
-plt.show()
+# 2. Rating vs Price Correlation with Color Differentiation by Category
+def plot_rating_vs_price(data):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.scatterplot(x='price_raw', y='rating_raw', data=data['rows'], hue='category', palette='tab20', ax=ax,
+                    **_marker_style(data))
+    ax.set_title(CHART_TITLES['rating_vs_price'] + _sample_note(data))
+    ax.set_xlabel('Price')
+    ax.set_ylabel('Rating')
+    # Legend for different categories
+    if ax.get_legend() is not None:
+        ax.legend(title='Category', bbox_to_anchor=(1.05, 1), loc='upper left')
+    return fig
 
+# 3. Top Reviewed Products
+def plot_top_reviewed(data):
+    # Horizontal bars make long product names easier to read
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(x='reviews_raw', y='name', data=data['rows'], hue='name', palette='viridis', legend=False, ax=ax)
+    ax.set_title(CHART_TITLES['top_reviewed'])
+    ax.set_xlabel('Number of Reviews')
+    ax.set_ylabel('Product Name')
+    plt.setp(ax.get_xticklabels(), rotation=45)
+    return fig
 
 # 4. Best Value Metric per Category (Price-to-Rating ratio)
-df['best_value_metric'] = df['price_raw'] / df['rating_raw']  # Best value metric: price per rating unit
-best_value = df[['category', 'name', 'best_value_metric']].sort_values(by='best_value_metric').groupby('category').head(5)
-plt.figure(figsize=(10, 6))
-sns.barplot(x='best_value_metric', y='name', hue='category', data=best_value)
-plt.title('Best Value Metric per Category')
-plt.xlabel('Best Value Metric (Price per Rating)')
-plt.ylabel('Product Name')
-plt.show()  # Show the plot
+def plot_best_value(data):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(x='price_to_rating', y='name', hue='category', data=data['rows'], ax=ax)
+    ax.set_title(CHART_TITLES['best_value'])
+    ax.set_xlabel('Best Value Metric (Price per Rating)')
+    ax.set_ylabel('Product Name')
+    return fig
 
 # 5. Stock Availability Analysis (This can be assumed based on reviews and price if no stock data)
 # Here we focus on identifying products with high reviews and relatively low price.
 # Let's assume "stock availability" relates to popularity (high reviews) and good value (low price).
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x='price_raw', y='reviews_raw', data=df)
-plt.title('Stock Availability Analysis (Price vs Reviews)')
-plt.xlabel('Price')
-plt.ylabel('Number of Reviews')
-plt.show()  # Show the plot
+def plot_price_vs_reviews(data):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.scatterplot(x='price_raw', y='reviews_raw', data=data['rows'], ax=ax)
+    ax.set_title(CHART_TITLES['price_vs_reviews'] + _sample_note(data))
+    ax.set_xlabel('Price')
+    ax.set_ylabel('Number of Reviews')
+    return fig
+
+CHARTS = {
+    'price_distribution': plot_price_distribution,
+    'rating_vs_price': plot_rating_vs_price,
+    'top_reviewed': plot_top_reviewed,
+    'best_value': plot_best_value,
+    'price_vs_reviews': plot_price_vs_reviews,
+}
+
+def show_report(df):
+    """Shows the five charts one after another in interactive windows."""
+    report = prepare_report(df)
+    for chart, plot in CHARTS.items():
+        plot(report[chart])
+        plt.show()  # Show the plot
+
+def _init_render_worker():
+    # Worker processes never open windows
+    matplotlib.use("Agg")
+    sns.set(style="whitegrid")
+
+def render_chart_files(chart, data, base_path, formats):
+    """Renders one chart to base_path.<fmt> for each format; returns (paths, seconds)."""
+    started = time.perf_counter()
+    fig = CHARTS[chart](data)
+    paths = []
+    try:
+        for fmt in formats:
+            path = f"{base_path}.{fmt}"
+            fig.savefig(path, format=fmt, dpi=100, bbox_inches='tight')
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    return paths, time.perf_counter() - started
+
+def scope_slug(scope):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(scope)).strip('-').lower() or 'category'
+
+def scope_slugs(scopes):
+    """
+    {scope: directory/anchor name}, unique even when two scopes slug the same
+    (e.g. "A & B" and "A B"): later ones get a numeric suffix.
+    """
+    slugs = {}
+    used = set()
+    for scope in scopes:
+        base = slug = scope_slug(scope)
+        suffix = 2
+        while slug in used:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        used.add(slug)
+        slugs[scope] = slug
+    return slugs
+
+def write_index(output_dir, rendered, slugs=None):
+    """Writes index.html linking every report; rendered maps scope -> {chart: [paths]}."""
+    slugs = slugs or scope_slugs(rendered)
+    sections = []
+    for scope, charts in rendered.items():
+        items = []
+        for chart, paths in charts.items():
+            relative = [os.path.relpath(path, output_dir).replace(os.sep, '/') for path in paths]
+            image = next((path for path in relative if path.endswith('.png')), relative[0])
+            links = ' '.join(f'<a href="{html.escape(path)}">{path.rsplit(".", 1)[-1].upper()}</a>' for path in relative)
+            items.append(f'<figure><img src="{html.escape(image)}" width="640">'
+                         f'<figcaption>{html.escape(CHART_TITLES[chart])} {links}</figcaption></figure>')
+        sections.append(f'<section id="{slugs[scope]}"><h2>{html.escape(str(scope))}</h2>{"".join(items)}</section>')
+
+    contents = ''.join(f'<li><a href="#{slugs[scope]}">{html.escape(str(scope))}</a></li>' for scope in rendered)
+    page = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Banggood product reports</title></head><body>'
+        f'<h1>Banggood product reports</h1><p>Generated {time.strftime("%Y-%m-%d %H:%M:%S")}</p>'
+        f'<ul>{contents}</ul>{"".join(sections)}</body></html>'
+    )
+    index_path = os.path.join(output_dir, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return index_path
+
+def render_batch(df, output_dir=BATCH_OUTPUT_DIR, formats=('png',), workers=None):
+    """
+    Renders every chart for the whole dataset and for each category into
+    output_dir across a process pool, then writes index.html. Returns its path.
+    """
+    started = time.perf_counter()
+    reports = {ALL_SCOPE: prepare_report(df)}
+    for category, group in df.groupby('category', observed=True):
+        reports[category] = prepare_report(group)
+    print(f"Aggregated {len(df):,} rows into {len(reports)} reports in {time.perf_counter() - started:.1f}s")
+
+    rendered = {scope: {} for scope in reports}
+    slugs = scope_slugs(reports)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+        futures = {}
+        for scope, report in reports.items():
+            scope_dir = os.path.join(output_dir, slugs[scope])
+            os.makedirs(scope_dir, exist_ok=True)
+            for chart in CHARTS:
+                future = executor.submit(render_chart_files, chart, report[chart],
+                                         os.path.join(scope_dir, chart), formats)
+                futures[future] = (scope, chart)
+
+        render_seconds = 0.0
+        for future, (scope, chart) in futures.items():
+            paths, seconds = future.result()
+            rendered[scope][chart] = paths
+            render_seconds += seconds
+            log_event({'event': 'render', 'name': chart, 'scope': scope, 'seconds': round(seconds, 6)})
+
+    index_path = write_index(output_dir, rendered, slugs)
+    print(f"Rendered {len(futures)} charts ({render_seconds:.1f}s of rendering) "
+          f"in {time.perf_counter() - started:.1f}s; index at {index_path}")
+    return index_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot the cleaned Banggood products.")
+    parser.add_argument("--batch", nargs='?', const=BATCH_OUTPUT_DIR, metavar="DIR",
+                        help=f"Render headless reports to DIR (default {BATCH_OUTPUT_DIR}) instead of showing windows")
+    parser.add_argument("--formats", nargs='+', choices=BATCH_FORMATS, default=['png'], help="Batch output formats")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: one per CPU)")
+    parser.add_argument("--profile", choices=PROFILERS, help="Also dump a cProfile or sampling profile of the run")
+    args = parser.parse_args()
+    configure(profile=args.profile)
+
+    if args.batch:
+        matplotlib.use("Agg")
+
+    # Load the cleaned data into a DataFrame (typed Parquet copy first, only the columns plotted)
+    df = load_cleaned(columns=REPORT_COLUMNS)
+
+    # Set the style for seaborn plots
+    sns.set(style="whitegrid")
+
+    if args.batch:
+        with stage('render', formats=args.formats) as event:
+            render_batch(df, args.batch, args.formats, args.workers)
+            event['rows'] = len(df)
+    else:
+        show_report(df)